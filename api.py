@@ -0,0 +1,175 @@
+import hashlib
+import os
+from decimal import Decimal
+from flask import Blueprint, Response, request, session, jsonify
+from utils import get_walkability_values, get_saved_addresses_page
+from walkstore import get_walkability_store
+from percentiles import get_percentile_tables
+from loader import current_dataset_version
+from get_census_block import get_block_group_geoid, NOT_FOUND_MESSAGE
+from cache import TTLCache
+
+API_VERSION = "v1"
+# Per-GEOID responses only change with the dataset, so browsers and reverse proxies may keep them
+API_MAX_AGE = int(os.getenv("API_MAX_AGE", "300"))  # browsers
+API_SHARED_MAX_AGE = int(os.getenv("API_SHARED_MAX_AGE", "86400"))  # reverse proxies / CDNs
+
+api_bp = Blueprint("api", __name__, url_prefix=f"/api/{API_VERSION}")
+
+# dataset_versions is only read when no walkability store is installed
+_version_cache = TTLCache(max_size=1, ttl=int(os.getenv("DATASET_VERSION_TTL", "30")))
+
+
+def dataset_version():
+    """
+    Returns the version of the walkability data being served.
+
+    Taken from the memory-mapped store when installed (it is stamped by the loader),
+    otherwise from the dataset_versions table, cached briefly.
+
+    Returns:
+        int: The dataset version, or 0 if none is known.
+    """
+    store = get_walkability_store()
+    if store is not None:
+        return store.dataset_version
+    version = _version_cache.get("version")
+    if version is None:
+        version = current_dataset_version() or 0
+        _version_cache.set("version", version)
+    return version
+
+
+def block_group_etag(census_block):
+    """
+    Strong ETag for a block group's body: it changes when the dataset version or the percentile tables do.
+    """
+    tables = get_percentile_tables()
+    tables_digest = tables.digest if tables else "none"
+    key = f"{API_VERSION}:{dataset_version()}:{tables_digest}:{census_block}"
+    return hashlib.sha256(key.encode("ascii")).hexdigest()[:32]
+
+
+def _public(response, etag):
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = API_MAX_AGE
+    response.cache_control.s_maxage = API_SHARED_MAX_AGE
+    return response
+
+
+def _not_modified(etag):
+    # Answer a matching conditional request without building the body
+    return _public(Response(status=304), etag)
+
+
+def _no_store(response, status):
+    response.status_code = status
+    response.cache_control.no_store = True
+    return response
+
+
+def _block_group_body(census_block):
+    values = get_walkability_values(census_block)
+    if "error" in values:
+        return None
+    values = {key: float(value) if isinstance(value, Decimal) else value for key, value in values.items()}
+    tables = get_percentile_tables()
+    return {
+        "census_block": census_block,
+        "walkability": values,
+        "percentiles": tables.context(census_block, values) if tables else None,
+        "dataset_version": dataset_version(),
+    }
+
+
+@api_bp.route("/blockgroups/<census_block>", methods=["GET"])
+def block_group(census_block):
+    """
+    Returns the walkability values and percentile ranks for one block group GEOID.
+
+    Responses carry a strong ETag derived from the dataset version and the percentile
+    tables, and are public, so a reverse proxy can answer repeats without reaching the app.
+
+    Args:
+        census_block (str): The 12-digit block group GEOID.
+
+    Returns:
+        Response: JSON, 304 for a matching If-None-Match, or 400/404.
+    """
+    if len(census_block) != 12 or not census_block.isdigit():
+        return _no_store(jsonify({"error": "census_block must be a 12-digit GEOID."}), 400)
+    etag = block_group_etag(census_block)
+    if etag in request.if_none_match:
+        return _not_modified(etag)
+    body = _block_group_body(census_block)
+    if body is None:
+        # Not cached: a failed query is indistinguishable from a missing row here
+        return _no_store(jsonify({"error": "No walkability data found for this block group."}), 404)
+    return _public(jsonify(body), etag)
+
+
+@api_bp.route("/lookup", methods=["GET"])
+def lookup_address():
+    """
+    Resolves an address to its block group and returns that block group's data.
+
+    Query args: street, city, state. Nothing is saved. The response names the
+    per-GEOID resource in Content-Location and shares its ETag.
+
+    Args:
+        None
+
+    Returns:
+        Response: JSON, 304 for a matching If-None-Match, or 400/404/503.
+    """
+    street, city, state = (request.args.get(name, "").strip() for name in ("street", "city", "state"))
+    if not (street and city and state):
+        return _no_store(jsonify({"error": "street, city and state are required."}), 400)
+    census_block = get_block_group_geoid(street, city, state)
+    if not census_block.isdigit():
+        # Not found is a property of the address; anything else (timeouts, outages) is transient
+        status = 404 if census_block == NOT_FOUND_MESSAGE else 503
+        return _no_store(jsonify({"error": census_block}), status)
+    etag = block_group_etag(census_block)
+    if etag in request.if_none_match:
+        return _not_modified(etag)
+    body = _block_group_body(census_block)
+    if body is None:
+        return _no_store(jsonify({"error": "No walkability data found for the provided address."}), 404)
+    response = _public(jsonify(body), etag)
+    response.headers["Content-Location"] = f"{api_bp.url_prefix}/blockgroups/{census_block}"
+    return response
+
+
+@api_bp.route("/searches", methods=["GET"])
+def saved_searches():
+    """
+    Returns one page of the logged-in user's saved searches.
+
+    Query args match /addresses/user/page: city, state, attribute, sorting, cursor, limit.
+    The ETag is computed from the body, so an unchanged page revalidates with a 304.
+
+    Args:
+        None
+
+    Returns:
+        Response: JSON, 304 for a matching If-None-Match, or 401.
+    """
+    user_id = session.get("user_id")
+    if user_id is None:
+        return _no_store(jsonify({"error": "Login required."}), 401)
+    city_filter = request.args.get("city") or None
+    state_filter = request.args.get("state") or None
+    page = get_saved_addresses_page(user_id, request.args.get("attribute", "NatWalkInd"), city_filter, state_filter,
+                                    request.args.get("sorting"), cursor=request.args.get("cursor"),
+                                    limit=request.args.get("limit", type=int))
+    for address in page["addresses"]:
+        if address["value"] is not None:
+            address["value"] = float(address["value"])  # Decimal isn't JSON serializable
+    page["dataset_version"] = dataset_version()
+    response = jsonify(page)
+    response.add_etag()  # strong ETag from the body
+    response.cache_control.private = True
+    response.cache_control.no_cache = True  # always revalidate; a 304 still saves the body
+    return response.make_conditional(request)
@@ -0,0 +1,188 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from get_census_block import get_block_group_geoid
+from geocache import normalize_address
+from utils import get_walkability_values_bulk, WALKABILITY_COLUMNS
+
+# Cache hits resolve immediately; misses are throttled to Nominatim's rate limit inside get_block_group_geoid
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+# Resolved rows are sent once this many are ready, or once the oldest has waited this long, so a
+# slow batch still writes to the connection regularly and proxies don't time it out
+BATCH_FLUSH_ROWS = int(os.getenv("BATCH_FLUSH_ROWS", "25"))
+BATCH_FLUSH_SECONDS = float(os.getenv("BATCH_FLUSH_SECONDS", "5"))
+BATCH_MAX_ROWS = int(os.getenv("BATCH_MAX_ROWS", "20000"))
+
+# processed/total carry the progress in the stream itself: the row's position in the output and the batch size
+RESULT_FIELDS = ["street", "city", "state", "census_block"] + WALKABILITY_COLUMNS + ["error", "processed", "total"]
+
+
+def read_addresses(stream):
+    """
+    Reads and deduplicates addresses from a CSV with street, city and state columns.
+
+    Args:
+        stream (file): A text stream containing the CSV (header names are case-insensitive).
+
+    Returns:
+        list: Unique address dictionaries with street, city and state keys, in first-seen order.
+
+    Raises:
+        ValueError: If a required column is missing or the file has too many rows.
+    """
+    reader = csv.DictReader(stream)
+    columns = {name.strip().lower(): name for name in (reader.fieldnames or [])}
+    missing = [name for name in ("street", "city", "state") if name not in columns]
+    if missing:
+        raise ValueError(f"CSV is missing required column(s): {', '.join(missing)}")
+
+    addresses = {}
+    for count, row in enumerate(reader, start=1):
+        if count > BATCH_MAX_ROWS:
+            raise ValueError(f"CSV has more than {BATCH_MAX_ROWS} rows.")
+        address = {name: (row.get(columns[name]) or "").strip() for name in ("street", "city", "state")}
+        if not all(address.values()):
+            continue
+        addresses.setdefault(normalize_address(address["street"], address["city"], address["state"]), address)
+    return list(addresses.values())
+
+
+def _resolve(address):
+    geoid = get_block_group_geoid(address["street"], address["city"], address["state"])
+    if isinstance(geoid, str) and geoid.isdigit():
+        return dict(address, census_block=geoid)
+    return dict(address, census_block=None, error=geoid)
+
+
+def lookup_addresses(addresses, concurrency=BATCH_CONCURRENCY, flush_rows=BATCH_FLUSH_ROWS,
+                     flush_seconds=BATCH_FLUSH_SECONDS, progress=None):
+    """
+    Resolves addresses to block groups concurrently and attaches walkability values.
+
+    Results are yielded in completion order, in small groups: as soon as flush_rows
+    are resolved or the oldest resolved row has waited flush_seconds, with a single
+    WalkabilityIndex query per group. Each row carries processed and total, so
+    clients can show progress from the stream itself.
+
+    Args:
+        addresses (list): Address dictionaries from read_addresses().
+        concurrency (int): Maximum number of lookups in flight.
+        flush_rows (int): Resolved rows that trigger a flush.
+        flush_seconds (float): Longest a resolved row waits before it is sent.
+        progress (function): Optional callback called with (done, total) after each flush.
+
+    Yields:
+        dict: One result per address with the RESULT_FIELDS keys.
+    """
+    total = len(addresses)
+    done = 0
+    pending = []
+
+    def flush():
+        nonlocal done
+        values = get_walkability_values_bulk(r["census_block"] for r in pending if r["census_block"])
+        for result in pending:
+            row = values.get(result["census_block"]) if result["census_block"] else None
+            if row:
+                result.update({key: float(value) if value is not None else None for key, value in row.items()})
+            elif result["census_block"]:
+                result["error"] = "No walkability data found for the given census block."
+            done += 1
+            result.update(processed=done, total=total)
+            yield {field: result.get(field) for field in RESULT_FIELDS}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(_resolve, address): address for address in addresses}
+        not_done = set(futures)
+        oldest = None  # when the oldest unsent row was resolved
+        try:
+            while not_done:
+                timeout = None if oldest is None else max(0.0, oldest + flush_seconds - time.monotonic())
+                finished, not_done = wait(not_done, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    try:
+                        pending.append(future.result())
+                    except Exception as e:
+                        print(f"Error resolving address in batch: {str(e)}")
+                        address = futures[future]
+                        pending.append(dict(address, census_block=None, error=f"An error occurred: {str(e)}"))
+                if pending and oldest is None:
+                    oldest = time.monotonic()
+                if pending and (len(pending) >= flush_rows or time.monotonic() - oldest >= flush_seconds):
+                    yield from flush()
+                    pending = []
+                    oldest = None
+                    if progress:
+                        progress(done, total)
+            if pending:
+                yield from flush()
+                if progress:
+                    progress(done, total)
+        finally:
+            # The client went away (or the batch finished): don't keep geocoding for nobody
+            for future in not_done:
+                future.cancel()
+
+
+def format_results(results, fmt="csv", fields=RESULT_FIELDS):
+    """
+    Serializes results as CSV or NDJSON text, one chunk per row.
+
+    Args:
+        results (iterable): Result dictionaries from lookup_addresses().
+        fmt (str): "csv" or "ndjson".
+        fields (list): CSV column order.
+
+    Yields:
+        str: The header (for CSV) followed by one line per result.
+    """
+    if fmt == "ndjson":
+        for result in results:
+            yield json.dumps(result) + "\n"
+        return
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    for result in results:
+        writer.writerow(result)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def main(argv=None):
+    """
+    Command line entry point: python batch.py addresses.csv [--format ndjson] [--output out.csv]
+    """
+    parser = argparse.ArgumentParser(description="Bulk walkability lookup for a CSV of addresses.")
+    parser.add_argument("input", help="CSV file with street, city and state columns")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    parser.add_argument("--output", help="Output file (defaults to stdout)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    args = parser.parse_args(argv)
+
+    with open(args.input, newline="") as f:
+        addresses = read_addresses(f)
+    print(f"Resolving {len(addresses)} unique addresses...", file=sys.stderr)
+
+    def report(done, total):
+        print(f"Processed {done}/{total} addresses", file=sys.stderr)
+
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        for line in format_results(lookup_addresses(addresses, args.concurrency, progress=report), args.format):
+            out.write(line)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Compares meta_data row-lock waits for inline counter upserts versus the
+write-behind CounterBuffer in counters.py.
+
+Every thread counts searches for the same few "hot" addresses. The inline mode
+runs one upsert per search inside a short transaction (held open for --hold-ms to
+stand in for the rest of save_search); the buffered mode adds to a CounterBuffer
+that flushes batched upserts. InnoDB's Innodb_row_lock_waits and
+Innodb_row_lock_time status counters are sampled before and after each run.
+
+Usage (against a scratch walkdatadb, configured through the usual .env):
+    DB_POOL_SIZE=16 python benchmarks/bench_counters.py --threads 16 --increments 200 --hot 3
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+from db import get_connection
+from counters import CounterBuffer
+
+CITY = "Benchville"
+
+
+def lock_status():
+    rows = utils.execute_query("SHOW GLOBAL STATUS WHERE Variable_name IN ('Innodb_row_lock_waits', 'Innodb_row_lock_time')")
+    return {row["Variable_name"]: int(row["Value"]) for row in rows}
+
+
+def inline_increment(street, hold):
+    with get_connection() as connection:
+        cursor = connection.cursor()
+        try:
+            connection.start_transaction()
+            cursor.execute("""
+                INSERT INTO meta_data (street, city, state, search_count) VALUES (%s, %s, 'WI', 1)
+                ON DUPLICATE KEY UPDATE search_count = search_count + 1
+            """, (street, CITY))
+            time.sleep(hold)
+            connection.commit()
+        finally:
+            cursor.close()
+
+
+def run(label, increment, threads, increments, hot, finish=None):
+    def worker(n):
+        for i in range(increments):
+            increment(f"{(n + i) % hot} Hot St")
+
+    before = lock_status()
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    if finish:
+        finish()
+    wall = time.perf_counter() - started
+    after = lock_status()
+    total = threads * increments
+    print(f"{label:>9}: {total} increments in {wall:.2f}s ({total / wall:.0f}/s), "
+          f"row lock waits {after['Innodb_row_lock_waits'] - before['Innodb_row_lock_waits']}, "
+          f"row lock time {after['Innodb_row_lock_time'] - before['Innodb_row_lock_time']} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--increments", type=int, default=200, help="increments per thread")
+    parser.add_argument("--hot", type=int, default=3, help="number of distinct hot addresses")
+    parser.add_argument("--hold-ms", type=float, default=2.0, help="extra time each inline transaction stays open")
+    args = parser.parse_args()
+
+    try:
+        run("inline", lambda street: inline_increment(street, args.hold_ms / 1000), args.threads, args.increments, args.hot)
+        buffer = CounterBuffer(flush_interval=0.5)
+        run("buffered", lambda street: buffer.add((street, CITY, "WI"), 1, 0),
+            args.threads, args.increments, args.hot, finish=buffer.flush)
+        print(f"buffered flushes: {buffer.stats['flushes']}, rows written: {buffer.stats['rows']}")
+    finally:
+        utils.execute_query("DELETE FROM meta_data WHERE city = %s", (CITY,))
+
+
+if __name__ == "__main__":
+    main()
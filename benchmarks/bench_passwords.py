@@ -0,0 +1,86 @@
+"""
+Measures password verification throughput: bcrypt inline on request threads versus
+the bounded process pool in passwords.py, reported as logins/sec overall and per core.
+
+No database is needed; each simulated login is one bcrypt check of a stored hash.
+While the logins run, a second set of threads does a small pure-Python task to show
+how much request-thread CPU is left for lookups.
+
+Usage:
+    python benchmarks/bench_passwords.py --threads 16 --logins 20 --rounds 12 --workers 2
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bcrypt
+from passwords import PasswordHasher
+
+
+def background_work(stop, counter):
+    # Stand-in for request threads that need the GIL (template rendering, JSON, ...)
+    while not stop.is_set():
+        sum(i * i for i in range(2000))
+        counter[0] += 1
+
+
+def run(label, hasher, stored_hash, threads, logins, cores):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(logins):
+            start = time.perf_counter()
+            valid, _ = hasher.check("correct horse battery staple", stored_hash)
+            elapsed = time.perf_counter() - start
+            assert valid
+            with lock:
+                latencies.append(elapsed)
+
+    stop = threading.Event()
+    counter = [0]
+    side = threading.Thread(target=background_work, args=(stop, counter))
+    side.start()
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    wall = time.perf_counter() - started
+    stop.set()
+    side.join()
+    latencies.sort()
+    rate = len(latencies) / wall
+    print(f"{label:>8}: {len(latencies)} logins in {wall:.2f}s ({rate:.1f}/s, {rate / cores:.1f}/s per core), "
+          f"p50 {statistics.median(latencies) * 1000:.0f} ms, p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f} ms, "
+          f"side work {counter[0] / wall:.0f} iterations/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16, help="concurrent login threads")
+    parser.add_argument("--logins", type=int, default=20, help="logins per thread")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost of the stored hash")
+    parser.add_argument("--workers", type=int, default=2, help="password pool processes")
+    args = parser.parse_args()
+
+    stored_hash = bcrypt.hashpw(b"correct horse battery staple", bcrypt.gensalt(args.rounds))
+    cores = os.cpu_count() or 1
+    print(f"bcrypt cost {args.rounds}, {cores} cores, {args.threads} threads x {args.logins} logins")
+
+    run("inline", PasswordHasher(workers=0, rounds=args.rounds), stored_hash, args.threads, args.logins, cores)
+    hasher = PasswordHasher(workers=args.workers, max_pending=args.threads, rounds=args.rounds)
+    try:
+        run("pool", hasher, stored_hash, args.threads, args.logins, min(cores, args.workers))
+    finally:
+        hasher.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Compares the old multi-connection save_search with the transactional one.
+
+Every worker thread saves distinct addresses for the same user at the same time,
+which is the case where MAX(search_id)+1 used to race. Geocoding is bypassed by
+pointing every address at an existing WalkabilityIndex row.
+
+Usage (against a scratch walkdatadb, configured through the usual .env):
+    DB_POOL_SIZE=16 python benchmarks/bench_save_search.py --threads 16 --saves 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mysql.connector
+import utils
+from db import get_connection
+
+
+def legacy_save_search(user_id, street, city, state, census_block):
+    # The pre-transaction flow: separate connections for the duplicate check,
+    # walkability read, MAX(search_id) and the insert/meta_data update.
+    exists = utils.execute_query(
+        "SELECT COUNT(*) FROM searches WHERE user_id = %s AND street = %s AND city = %s AND state = %s",
+        (user_id, street, city, state))[0]["COUNT(*)"]
+    utils.execute_query(
+        f"SELECT {', '.join(utils.WALKABILITY_COLUMNS)} FROM WalkabilityIndex WHERE census_block = %s",
+        (census_block,))
+    if exists:
+        return True
+    result = utils.execute_query("SELECT MAX(search_id) AS m FROM searches WHERE user_id = %s", (user_id,))
+    new_id = (result[0]["m"] or 0) + 1
+    with get_connection() as connection:
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                "INSERT INTO searches (user_id, search_id, street, city, state, census_block) VALUES (%s, %s, %s, %s, %s, %s)",
+                (user_id, new_id, street, city, state, census_block))
+            cursor.execute(
+                "INSERT INTO meta_data (street, city, state, search_count) VALUES (%s, %s, %s, 1) "
+                "ON DUPLICATE KEY UPDATE search_count = search_count + 1", (street, city, state))
+            connection.commit()
+            return True
+        except mysql.connector.IntegrityError:
+            connection.rollback()
+            return False
+        finally:
+            cursor.close()
+
+
+def run(label, save, user_id, census_block, threads, saves):
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+    run_id = uuid.uuid4().hex[:8]
+
+    def worker(n):
+        for i in range(saves):
+            start = time.perf_counter()
+            ok = save(user_id, f"{run_id}-{n}-{i} Bench St", "Benchville", "WI", census_block)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if not ok or isinstance(ok, str):
+                    failures.append(ok)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    wall = time.perf_counter() - started
+    latencies.sort()
+    print(f"{label:>14}: {len(latencies)} saves in {wall:.2f}s "
+          f"({len(latencies) / wall:.1f}/s), p50 {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms, failed saves {len(failures)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--saves", type=int, default=50, help="saves per thread")
+    args = parser.parse_args()
+
+    block = utils.execute_query("SELECT census_block FROM WalkabilityIndex LIMIT 1")
+    if not block:
+        sys.exit("WalkabilityIndex is empty; load the dataset first.")
+    census_block = block[0]["census_block"]
+
+    username = f"bench_{uuid.uuid4().hex[:8]}"
+    utils.execute_query("INSERT INTO users (username, name, email, password) VALUES (%s, %s, %s, %s)",
+                        (username, "Benchmark", f"{username}@example.com", "x"))
+    user_id = utils.execute_query("SELECT id FROM users WHERE username = %s", (username,))[0]["id"]
+
+    def current_save(user_id, street, city, state, census_block):
+        return utils.save_search(user_id, street, city, state)
+
+    utils.get_block_group_geoid = lambda street, city, state: census_block
+    try:
+        run("legacy", legacy_save_search, user_id, census_block, args.threads, args.saves)
+        run("transactional", current_save, user_id, census_block, args.threads, args.saves)
+    finally:
+        utils.execute_query("DELETE FROM searches WHERE user_id = %s", (user_id,))
+        utils.execute_query("DELETE FROM meta_data WHERE city = 'Benchville'")
+        utils.execute_query("DELETE FROM users WHERE id = %s", (user_id,))
+
+
+if __name__ == "__main__":
+    main()
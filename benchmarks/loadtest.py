@@ -0,0 +1,313 @@
+"""
+Load test for the lookup, save and saved-addresses paths of web.app.
+
+Starts the stub geocoders (stub_servers.py), serves web.app on a local threaded
+server against a database seeded by seed_db.py, and drives each route at every
+--concurrency level for --duration seconds. For each (route, concurrency) it
+reports throughput, p50/p95/p99 latency and MySQL round trips per request (the
+server's Questions counter before and after the run, so use a scratch MySQL
+instance). Results are written as JSON; pass an earlier file as --baseline to
+print the change.
+
+Routes:
+    lookup  guest POST /addresses/lookup for a fresh address (geocode + walkability read)
+    save    logged-in POST /addresses/lookup for a fresh address (geocode + save_search)
+    saved   GET /addresses/user/page for a seeded user
+    api     GET /api/v1/blockgroups/<geoid> for a seeded block group
+
+Usage (connection settings from the usual .env):
+    python benchmarks/seed_db.py --database walkbench --reset
+    python benchmarks/loadtest.py --database walkbench --concurrency 1,4,16 --duration 15 --latency-ms 80
+    python benchmarks/loadtest.py ... --baseline benchmarks/results/loadtest-20260101-120000.json
+To load an app served elsewhere (e.g. gunicorn started with the stub_servers.py environment), pass --url.
+"""
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from seed_db import BENCH_PASSWORD, SAVED_ADDRESSES, bench_address, block_group_geoids
+from stub_servers import add_stub_arguments, start_stubs, stub_settings
+
+ROUTES = ("lookup", "save", "saved", "api")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+LOOKUP_OK_MARKER = 'class="walkability-container"'  # only rendered when a lookup found data
+
+
+def percentile(sorted_values, p):
+    """
+    Nearest-rank percentile of an ascending list.
+    """
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(p / 100 * len(sorted_values)) - 1))]
+
+
+class QuestionCounter:
+    """
+    Reads MySQL's global Questions counter (statements received from all clients).
+    """
+
+    def __init__(self, database):
+        import mysql.connector
+        from db import DB_CONFIG
+        self.connection = mysql.connector.connect(**dict(DB_CONFIG, database=database))
+
+    def read(self):
+        cursor = self.connection.cursor()
+        cursor.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+        value = int(cursor.fetchone()[1])
+        cursor.close()
+        return value
+
+
+def serve_app(env):
+    """
+    Imports web.app with env applied and serves it on a free local port.
+
+    Returns:
+        str: The base URL.
+    """
+    os.environ.update(env)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # no access log line per request
+    from werkzeug.serving import make_server
+    from web import app
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="web-app", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+class Driver:
+    """
+    Issues requests for one route from many threads, each with its own HTTP session.
+    """
+
+    def __init__(self, base_url, users, geoids, seed):
+        self.base_url = base_url
+        self.users = users
+        self.geoids = geoids
+        self.seed = seed
+        # Fresh addresses for lookups and saves: never saved before and not in the geocode cache
+        self._addresses = itertools.count(SAVED_ADDRESSES + int(time.time() * 1000) % 10**9)
+        self._address_lock = threading.Lock()
+
+    def _next_address(self):
+        with self._address_lock:
+            return bench_address(next(self._addresses))
+
+    def session(self, worker, logged_in):
+        import requests
+        session = requests.Session()
+        if logged_in:
+            username = f"bench_user_{worker % self.users}"
+            response = session.post(f"{self.base_url}/login", data={"username": username, "password": BENCH_PASSWORD})
+            if response.status_code != 200 or "session" not in session.cookies:
+                raise RuntimeError(f"Could not log in as {username} (HTTP {response.status_code})")
+        return session
+
+    def request(self, route, session, rng):
+        """
+        Sends one request for route.
+
+        Returns:
+            bool: True if the response was a success.
+        """
+        if route in ("lookup", "save"):
+            street, city, state = self._next_address()
+            response = session.post(f"{self.base_url}/addresses/lookup",
+                                    data={"street": street, "city": city, "state": state})
+            return response.status_code == 200 and LOOKUP_OK_MARKER in response.text
+        if route == "saved":
+            response = session.get(f"{self.base_url}/addresses/user/page",
+                                   params={"limit": 50, "sorting": rng.choice(["High", "Low"])})
+            return response.status_code == 200 and "addresses" in response.json()
+        response = session.get(f"{self.base_url}/api/v1/blockgroups/{rng.choice(self.geoids)}")
+        return response.status_code == 200
+
+    def run(self, route, concurrency, duration, questions=None):
+        """
+        Drives route with concurrency threads for duration seconds.
+
+        Returns:
+            dict: The result row for this (route, concurrency).
+        """
+        sessions = [self.session(worker, logged_in=route in ("save", "saved")) for worker in range(concurrency)]
+        latencies = []
+        errors = [0]
+        lock = threading.Lock()
+        start_barrier = threading.Barrier(concurrency + 1)
+
+        def worker(n):
+            rng = random.Random(f"{self.seed}-{route}-{concurrency}-{n}")
+            local_latencies = []
+            local_errors = 0
+            start_barrier.wait()
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    ok = self.request(route, sessions[n], rng)
+                except Exception:
+                    ok = False
+                local_latencies.append(time.perf_counter() - started)
+                local_errors += not ok
+            with lock:
+                latencies.extend(local_latencies)
+                errors[0] += local_errors
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+        for t in threads:
+            t.start()
+        before = questions.read() if questions else None
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        start_barrier.wait()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - started
+        # One extra Questions increment is the first read itself
+        round_trips = questions.read() - before - 1 if questions else None
+        for session in sessions:
+            session.close()
+
+        latencies.sort()
+        count = len(latencies)
+        return {
+            "route": route,
+            "concurrency": concurrency,
+            "requests": count,
+            "errors": errors[0],
+            "duration_s": round(wall, 3),
+            "throughput_rps": round(count / wall, 2) if wall else 0.0,
+            "latency_ms": {
+                "p50": _ms(percentile(latencies, 50)),
+                "p95": _ms(percentile(latencies, 95)),
+                "p99": _ms(percentile(latencies, 99)),
+                "mean": _ms(sum(latencies) / count if count else None),
+                "max": _ms(latencies[-1] if latencies else None),
+            },
+            "db_round_trips_per_request": round(round_trips / count, 2) if questions and count else None,
+        }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """
+    Prints throughput and p95 changes against an earlier results file.
+    """
+    with open(baseline_path) as f:
+        report = json.load(f)
+    baseline = {(row["route"], row["concurrency"]): row for row in report["results"]}
+    print(f"\nChange against {baseline_path} (commit {report.get('git_commit')}):")
+    for row in results:
+        old = baseline.get((row["route"], row["concurrency"]))
+        if old is None:
+            continue
+        rps = _change(old["throughput_rps"], row["throughput_rps"])
+        p95 = _change(old["latency_ms"]["p95"], row["latency_ms"]["p95"])
+        print(f"{row['route']:>7} x{row['concurrency']:<4} throughput {rps:>8}   p95 {p95:>8}")
+
+
+def _change(old, new):
+    if not old or new is None:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="walkbench", help="database seeded by seed_db.py")
+    parser.add_argument("--users", type=int, default=50, help="as passed to seed_db.py")
+    parser.add_argument("--routes", default=",".join(ROUTES), help=f"comma-separated subset of {','.join(ROUTES)}")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated levels, run in order")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per route and concurrency level")
+    parser.add_argument("--url", help="load an already running app instead of starting one")
+    parser.add_argument("--no-db-stats", action="store_true", help="skip the MySQL Questions counter")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/loadtest-<time>.json)")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    routes = [route.strip() for route in args.routes.split(",") if route.strip()]
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(sorted(unknown))}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    os.environ["DB_NAME"] = args.database  # before db.py reads its configuration
+    stubs = None
+    base_url = args.url
+    if base_url is None:
+        nominatim, census, env = start_stubs(args.block_groups, args.seed, **stub_settings(args))
+        stubs = (nominatim, census)
+        scratch = tempfile.mkdtemp(prefix="walkbench-")
+        env.update({
+            # Fresh caches and session store per run, so every run starts cold in the same way
+            "GEOCODE_CACHE_PATH": os.path.join(scratch, "geocode_cache.sqlite3"),
+            "RATE_LIMIT_PATH": os.path.join(scratch, "ratelimit.sqlite3"),
+            "SESSION_BACKEND": "sqlite",
+            "SESSION_PATH": os.path.join(scratch, "sessions.sqlite3"),
+            "SECRET_KEY": os.getenv("SECRET_KEY") or "loadtest",
+            "BCRYPT_ROUNDS": "4",  # matches the seeded hashes, so logins don't trigger rehashing
+            "DB_POOL_SIZE": os.getenv("DB_POOL_SIZE") or str(max(levels) + 2),
+            "SQL_LOG_SAMPLE_RATE": os.getenv("SQL_LOG_SAMPLE_RATE") or "0",
+        })
+        base_url = serve_app(env)
+    questions = None if args.no_db_stats else QuestionCounter(args.database)
+
+    driver = Driver(base_url, args.users, block_group_geoids(args.block_groups, args.seed), args.seed)
+    results = []
+    for route in routes:
+        for concurrency in levels:
+            row = driver.run(route, concurrency, args.duration, questions)
+            results.append(row)
+            latency = row["latency_ms"]
+            print(f"{route:>7} x{concurrency:<4} {row['requests']:>7} requests  {row['throughput_rps']:>9.1f}/s  "
+                  f"p50 {latency['p50']} ms  p95 {latency['p95']} ms  p99 {latency['p99']} ms  "
+                  f"errors {row['errors']}  db round trips/request {row['db_round_trips_per_request']}")
+
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {
+            "database": args.database, "routes": routes, "concurrency": levels, "duration_s": args.duration,
+            "url": args.url, "users": args.users, "block_groups": args.block_groups, "seed": args.seed,
+            "stubs": stub_settings(args) if stubs else None,
+        },
+        "upstream_requests": {"nominatim": stubs[0].config.stats, "census": stubs[1].config.stats} if stubs else None,
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"loadtest-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
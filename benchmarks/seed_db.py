@@ -0,0 +1,207 @@
+"""
+Creates and seeds a scratch MySQL database for the load test (loadtest.py).
+
+The tables are created from the CREATE TABLE / CREATE INDEX statements in the
+README, so the benchmark schema is exactly the documented one. The stored
+procedures the app calls (GetUserName, AddUser, GetUserCredentials) are added too.
+Data is generated from --seed, so two runs with the same arguments produce
+identical databases, and the stub geocoders (stub_servers.py) resolve the
+generated addresses to the seeded block groups.
+
+Usage (connection settings from the usual .env; the user needs CREATE/DROP):
+    python benchmarks/seed_db.py --database walkbench --block-groups 20000 --users 50 --searches 200 --reset
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+README_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "README.md")
+DEFAULT_SEED = 564
+BENCH_PASSWORD = "bench-password"
+BENCH_BCRYPT_ROUNDS = 4  # the load test measures the lookup paths, not bcrypt
+# Saved searches use addresses below this index; the load test geocodes fresh ones above it
+SAVED_ADDRESSES = 100000
+# (city, state, state FIPS) for generated addresses
+CITIES = [
+    ("Madison", "WI", "55"), ("Milwaukee", "WI", "55"), ("Chicago", "IL", "17"), ("Minneapolis", "MN", "27"),
+    ("Seattle", "WA", "53"), ("Portland", "OR", "41"), ("Denver", "CO", "08"), ("Austin", "TX", "48"),
+    ("Boston", "MA", "25"), ("New York", "NY", "36"), ("Philadelphia", "PA", "42"), ("Atlanta", "GA", "13"),
+    ("Miami", "FL", "12"), ("Phoenix", "AZ", "04"), ("San Diego", "CA", "06"), ("Columbus", "OH", "39"),
+]
+TITLES = {
+    "intersection_density": "Intersection Density",
+    "transit_access": "Proximity to Transit",
+    "job_housing_mix": "Employment and Household Mix",
+    "population_employment_density": "Population and Employment Density",
+    "NatWalkInd": "National Walkability Index",
+}
+PROCEDURES = [
+    "CREATE PROCEDURE GetUserName(IN p_user_id INT) SELECT name FROM users WHERE id = p_user_id",
+    """CREATE PROCEDURE AddUser(IN p_username VARCHAR(50), IN p_name VARCHAR(100), IN p_email VARCHAR(100),
+                                IN p_password VARCHAR(255))
+       INSERT INTO users (username, name, email, password) VALUES (p_username, p_name, p_email, p_password)""",
+    "CREATE PROCEDURE GetUserCredentials(IN p_username VARCHAR(50)) SELECT id, password FROM users WHERE username = p_username",
+]
+
+
+def readme_ddl(path=README_PATH):
+    """
+    Returns the CREATE TABLE and CREATE INDEX statements documented in the README, in order.
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    return [" ".join(statement.split()) for statement in re.findall(r"^CREATE (?:TABLE|INDEX) .*?;", text, re.M | re.S)]
+
+
+def block_group_geoids(count, seed=DEFAULT_SEED):
+    """
+    Returns count distinct 12-digit block group GEOIDs, deterministically from seed.
+
+    State FIPS codes cycle through CITIES; county, tract and block group digits are random.
+    """
+    rng = random.Random(seed)
+    geoids = []
+    seen = set()
+    while len(geoids) < count:
+        state_fips = CITIES[len(geoids) % len(CITIES)][2]
+        geoid = f"{state_fips}{rng.randrange(1, 200):03d}{rng.randrange(100, 999999):06d}{rng.randrange(1, 10)}"
+        if geoid not in seen:
+            seen.add(geoid)
+            geoids.append(geoid)
+    return geoids
+
+
+def bench_address(i):
+    """
+    Returns the (street, city, state) of generated address number i.
+    """
+    city, state, _ = CITIES[i % len(CITIES)]
+    return f"{i} Bench St", city, state
+
+
+def address_geoid(i, geoids):
+    """
+    Returns the block group that generated address number i resolves to.
+    """
+    return geoids[i % len(geoids)]
+
+
+def address_index(query):
+    """
+    Recovers i from a geocoder query for bench_address(i), or None for any other address.
+    """
+    match = re.match(r"\s*(\d+) Bench St\b", query)
+    return int(match.group(1)) if match else None
+
+
+def _walkability_rows(geoids, rng):
+    for geoid in geoids:
+        ranked = [rng.randint(1, 20) for _ in range(4)]
+        nat_walk_ind = round((ranked[0] + ranked[1] + 2 * ranked[2] + 2 * ranked[3]) / 6 + rng.uniform(-0.5, 0.5), 2)
+        yield (*ranked, min(max(nat_walk_ind, 1.0), 20.0), geoid)
+
+
+def _insert_many(cursor, table, columns, rows, batch_rows=2000):
+    rows = list(rows)
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    for start in range(0, len(rows), batch_rows):
+        batch = rows[start:start + batch_rows]
+        cursor.execute(f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([placeholders] * len(batch))}",
+                       [value for row in batch for value in row])
+
+
+def seed_database(database, block_groups, users, searches, seed=DEFAULT_SEED, reset=False):
+    """
+    Creates the schema in database and fills it with generated data.
+
+    Args:
+        database (str): Database name; created if missing. DB_NAME must name it too (main() sets it),
+                        since the rollups are refreshed through the app's connection pool.
+        block_groups (int): WalkabilityIndex rows.
+        users (int): Users bench_user_0 .. bench_user_{users-1}, all with BENCH_PASSWORD.
+        searches (int): Saved searches per user.
+        seed (int): Random seed for every generated value.
+        reset (bool): Drop the database first.
+
+    Returns:
+        dict: Row counts.
+    """
+    import bcrypt
+    import mysql.connector
+    from db import DB_CONFIG
+
+    config = dict(DB_CONFIG, database=None)
+    connection = mysql.connector.connect(**config)
+    cursor = connection.cursor()
+    if reset:
+        cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}`")
+    cursor.execute(f"USE `{database}`")
+    for statement in readme_ddl():
+        table = re.match(r"CREATE (?:TABLE|INDEX) (\w+)", statement).group(1)
+        try:
+            cursor.execute(statement)
+        except mysql.connector.Error as e:
+            if e.errno in (1050, 1061):  # table / index already exists
+                sys.exit(f"{table} already exists in {database}; run with --reset for a clean database")
+            raise
+    for procedure in PROCEDURES:
+        name = re.match(r"CREATE PROCEDURE (\w+)", procedure).group(1)
+        cursor.execute(f"DROP PROCEDURE IF EXISTS {name}")
+        cursor.execute(procedure)
+
+    rng = random.Random(seed)
+    geoids = block_group_geoids(block_groups, seed)
+    _insert_many(cursor, "WalkabilityIndex",
+                 ["intersection_density", "transit_access", "job_housing_mix", "population_employment_density",
+                  "NatWalkInd", "census_block"], _walkability_rows(geoids, rng))
+    _insert_many(cursor, "walkability_titles", ["key_name", "display_name"], TITLES.items())
+
+    # One hash for everyone: bcrypt at the minimum cost, so seeding takes seconds
+    password = bcrypt.hashpw(BENCH_PASSWORD.encode("utf-8"), bcrypt.gensalt(BENCH_BCRYPT_ROUNDS)).decode("utf-8")
+    _insert_many(cursor, "users", ["username", "name", "email", "password"],
+                 [(f"bench_user_{u}", f"Bench User {u}", f"bench_user_{u}@example.com", password) for u in range(users)])
+    cursor.execute("SELECT id FROM users WHERE username LIKE 'bench\\_user\\_%' ORDER BY id")
+    user_ids = [row[0] for row in cursor.fetchall()]
+    saved = []
+    for user_id in user_ids:
+        for search_id, i in enumerate(rng.sample(range(SAVED_ADDRESSES), min(searches, SAVED_ADDRESSES)), start=1):
+            street, city, state = bench_address(i)
+            saved.append((user_id, search_id, street, city, state, address_geoid(i, geoids)))
+    _insert_many(cursor, "searches", ["user_id", "search_id", "street", "city", "state", "census_block"], saved)
+    cursor.execute("INSERT INTO dataset_versions (version, source, row_count) VALUES (%s, %s, %s)",
+                   (int(time.time()), f"seed_db.py --seed {seed}", len(geoids)))
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+    # Rollups go through the app's own refresh so they match what the loader would produce
+    from rollups import refresh_rollups
+    refresh_rollups()
+    return {"block_groups": len(geoids), "users": len(user_ids), "searches": len(saved)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="walkbench")
+    parser.add_argument("--block-groups", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--searches", type=int, default=200, help="saved searches per user")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--reset", action="store_true", help="drop and recreate the database")
+    args = parser.parse_args()
+
+    os.environ["DB_NAME"] = args.database  # before db.py reads its configuration
+    started = time.perf_counter()
+    counts = seed_database(args.database, args.block_groups, args.users, args.searches, args.seed, args.reset)
+    print(f"Seeded {args.database} in {time.perf_counter() - started:.1f}s: "
+          f"{counts['block_groups']} block groups, {counts['users']} users, {counts['searches']} saved searches")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Local stand-ins for Nominatim and the Census coordinates geocoder.
+
+Both answer the requests geoclient.py makes, after a configurable
+delay and with configurable error and "not found" rates, so load tests exercise the
+geocoding path without touching (or being rate limited by) the real services.
+Addresses generated by seed_db.bench_address(i) geocode to a point that encodes i,
+and the Census stub maps that point back to the block group seeded for address i.
+
+Run them on their own and point an app at them:
+    python benchmarks/stub_servers.py --latency-ms 80 --jitter-ms 40 --error-rate 0.01 --block-groups 20000
+    NOMINATIM_URL=http://127.0.0.1:8801 CENSUS_GEOCODER_URL=http://127.0.0.1:8802/geocoder NOMINATIM_RATE=100000 gunicorn web:app
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from seed_db import DEFAULT_SEED, address_geoid, address_index, block_group_geoids
+
+LON_ORIGIN = -60.0  # generated points sit on a line west of here, 1e-6 degrees apart
+
+
+class StubConfig:
+    """
+    Latency and failure settings shared by one stub server's handler threads.
+    """
+
+    def __init__(self, latency_ms=50.0, jitter_ms=0.0, error_rate=0.0, not_found_rate=0.0, seed=DEFAULT_SEED):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.not_found_rate = not_found_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "not_found": 0}
+
+    def draw(self):
+        """
+        Sleeps for one response delay and decides the outcome.
+
+        Returns:
+            str: "error", "not_found" or "ok".
+        """
+        with self._lock:
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            roll = self._rng.random()
+            outcome = "error" if roll < self.error_rate else \
+                "not_found" if roll < self.error_rate + self.not_found_rate else "ok"
+            self.stats["requests"] += 1
+            if outcome != "ok":
+                self.stats["errors" if outcome == "error" else "not_found"] += 1
+        time.sleep(delay)
+        return outcome
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real services
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        outcome = self.server.config.draw()
+        if outcome == "error":
+            self._send_json(503, {"error": "stub upstream error"})
+            return
+        self._send_json(200, self.respond(url.path, params, outcome == "not_found"))
+
+    def respond(self, path, params, not_found):
+        raise NotImplementedError
+
+
+class NominatimHandler(_StubHandler):
+    # GET /search?q=...&format=jsonv2&limit=1
+    def respond(self, path, params, not_found):
+        i = address_index(params.get("q", ""))
+        if not_found or i is None:
+            return []
+        return [{"lat": "40.0", "lon": f"{LON_ORIGIN - i / 1e6:.6f}", "display_name": params["q"]}]
+
+
+class CensusHandler(_StubHandler):
+    # GET <path>?x=lon&y=lat&benchmark=...&vintage=...&format=json
+    def respond(self, path, params, not_found):
+        try:
+            i = round((LON_ORIGIN - float(params["x"])) * 1e6)
+        except (KeyError, ValueError):
+            not_found = True
+        blocks = [] if not_found else [{"GEOID": address_geoid(i, self.server.geoids) + "001"}]
+        return {"result": {"geographies": {"2020 Census Blocks": blocks}}}
+
+
+def start_stub(handler, config, port=0, geoids=None):
+    """
+    Starts a stub server on a daemon thread.
+
+    Args:
+        handler: NominatimHandler or CensusHandler.
+        config (StubConfig): Latency and failure settings.
+        port (int): Port to bind on 127.0.0.1; 0 picks a free one.
+        geoids (list): Seeded block groups (Census stub only).
+
+    Returns:
+        ThreadingHTTPServer: The running server; its base URL is http://127.0.0.1:<server.server_port>.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.config = config
+    server.geoids = geoids
+    threading.Thread(target=server.serve_forever, name=f"{handler.__name__}-stub", daemon=True).start()
+    return server
+
+
+def start_stubs(block_groups, seed=DEFAULT_SEED, nominatim_port=0, census_port=0, **settings):
+    """
+    Starts both stubs with the same latency and failure settings.
+
+    Args:
+        block_groups (int): Must match the --block-groups the database was seeded with.
+        seed (int): Must match the seed the database was seeded with.
+        nominatim_port (int): Port for the Nominatim stub; 0 picks a free one.
+        census_port (int): Port for the Census stub; 0 picks a free one.
+        **settings: latency_ms, jitter_ms, error_rate and not_found_rate for StubConfig.
+
+    Returns:
+        tuple: (nominatim server, census server, environment variables pointing the app at them).
+    """
+    geoids = block_group_geoids(block_groups, seed)
+    nominatim = start_stub(NominatimHandler, StubConfig(seed=seed, **settings), nominatim_port)
+    census = start_stub(CensusHandler, StubConfig(seed=seed + 1, **settings), census_port, geoids)
+    env = {
+        "NOMINATIM_URL": f"http://127.0.0.1:{nominatim.server_port}",
+        "CENSUS_GEOCODER_URL": f"http://127.0.0.1:{census.server_port}/geocoder/geographies/coordinates",
+        "NOMINATIM_RATE": "100000",  # the stub has no usage policy to respect
+    }
+    return nominatim, census, env
+
+
+def add_stub_arguments(parser):
+    """
+    Adds the stub latency and failure options to an argument parser.
+    """
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="mean upstream response time")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="response time varies uniformly by +/- this much")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of upstream requests answered with a 503")
+    parser.add_argument("--not-found-rate", type=float, default=0.0, help="share of geocodes that find nothing")
+    parser.add_argument("--block-groups", type=int, default=20000, help="as passed to seed_db.py")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="as passed to seed_db.py")
+
+
+def stub_settings(args):
+    return {"latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate, "not_found_rate": args.not_found_rate}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_stub_arguments(parser)
+    parser.add_argument("--nominatim-port", type=int, default=8801)
+    parser.add_argument("--census-port", type=int, default=8802)
+    args = parser.parse_args()
+
+    nominatim, census, env = start_stubs(args.block_groups, args.seed, args.nominatim_port, args.census_port,
+                                         **stub_settings(args))
+    for name, value in env.items():
+        print(f"{name}={value}")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"nominatim {nominatim.config.stats}, census {census.config.stats}")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+
+# Optional: pyshp is only needed to build an index from TIGER/Line shapefiles.
+try:
+    import shapefile
+except ImportError:
+    shapefile = None
+
+BLOCKGROUP_INDEX_PATH = os.getenv("BLOCKGROUP_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "blockgroups.bgidx"))
+GRID_CELL_SIZE = float(os.getenv("BLOCKGROUP_GRID_CELL_SIZE", "0.05"))  # degrees
+
+_MAGIC = b"BGIX"
+_VERSION = 2
+# magic, version, features, rings, points, occupied cells, cell entries, grid columns, grid rows,
+# min lon, min lat, cell size
+_HEADER = struct.Struct("<4sIIIIIIIIddd")
+GEOID_LENGTH = 12
+
+
+def _iter_geojson(path):
+    with open(path) as f:
+        data = json.load(f)
+    for feature in data.get("features", []):
+        props = feature.get("properties") or {}
+        geoid = props.get("GEOID") or props.get("GEOID20") or props.get("GEOIDFQ", "")[-GEOID_LENGTH:]
+        geometry = feature.get("geometry") or {}
+        if geometry.get("type") == "Polygon":
+            rings = geometry["coordinates"]
+        elif geometry.get("type") == "MultiPolygon":
+            rings = [ring for polygon in geometry["coordinates"] for ring in polygon]
+        else:
+            continue
+        yield geoid, rings
+
+
+def _iter_shapefile(path):
+    if shapefile is None:
+        raise RuntimeError("pyshp is required to read shapefiles: pip install pyshp")
+    with shapefile.Reader(path) as reader:
+        fields = [field[0] for field in reader.fields[1:]]
+        geoid_field = "GEOID" if "GEOID" in fields else "GEOID20"
+        for shape_record in reader.iterShapeRecords():
+            shape = shape_record.shape
+            geoid = shape_record.record[geoid_field]
+            parts = list(shape.parts) + [len(shape.points)]
+            rings = [shape.points[parts[i]:parts[i + 1]] for i in range(len(parts) - 1)]
+            yield geoid, rings
+
+
+def iter_block_groups(path):
+    """
+    Yields (geoid, rings) pairs from a TIGER/Line shapefile or a GeoJSON file.
+
+    Args:
+        path (str): Path to a .shp, .geojson or .json file of block group polygons.
+
+    Yields:
+        tuple: The 12-digit GEOID and a list of rings, each a list of (lon, lat) points.
+    """
+    if path.lower().endswith(".shp") or path.lower().endswith(".zip"):
+        return _iter_shapefile(path)
+    return _iter_geojson(path)
+
+
+def _pad(f):
+    # Keep every section 8-byte aligned so it can be cast to doubles from the mmap
+    remainder = f.tell() % 8
+    if remainder:
+        f.write(b"\0" * (8 - remainder))
+
+
+def _ring_boxes(ring):
+    # A ring spanning more than half the globe crosses the antimeridian (e.g. in the Aleutians):
+    # split its box into the part east of -180 and the part west of 180 instead of covering the whole grid
+    xs = [p[0] for p in ring]
+    ys = [p[1] for p in ring]
+    min_y, max_y = min(ys), max(ys)
+    if max(xs) - min(xs) <= 180:
+        return [(min(xs), min_y, max(xs), max_y)]
+    return [(min(x for x in xs if x >= 0), min_y, 180.0, max_y),
+            (-180.0, min_y, max(x for x in xs if x < 0), max_y)]
+
+
+def build_index(source_paths, out_path, cell_size=GRID_CELL_SIZE):
+    """
+    Builds a compact, memory-mappable point-in-polygon index of block groups.
+
+    The file stores every polygon's rings and bounding box plus a uniform grid that
+    maps each cell to the block groups with a ring whose bounding box overlaps it.
+    Only occupied cells are stored (sorted by cell number), so sparse or very wide
+    extents such as Alaska and the territories cost nothing for their empty cells.
+
+    Args:
+        source_paths (list): Shapefile or GeoJSON paths (e.g. one TIGER file per state).
+        out_path (str): Where to write the index.
+        cell_size (float): Grid cell size in degrees.
+
+    Returns:
+        int: The number of block groups indexed.
+    """
+    geoids = []
+    bboxes = array("d")
+    feature_rings = array("I", [0])
+    ring_points = array("I", [0])
+    points = array("d")
+    boxes = []  # (feature, min lon, min lat, max lon, max lat) per ring
+
+    for path in source_paths:
+        for geoid, rings in iter_block_groups(path):
+            geoid = str(geoid)
+            if len(geoid) != GEOID_LENGTH or not rings:
+                continue
+            min_x = min_y = float("inf")
+            max_x = max_y = float("-inf")
+            for ring in rings:
+                if not ring:
+                    continue
+                boxes.extend((len(geoids), *box) for box in _ring_boxes(ring))
+                for x, y in ((p[0], p[1]) for p in ring):
+                    points.append(x)
+                    points.append(y)
+                    min_x, max_x = min(min_x, x), max(max_x, x)
+                    min_y, max_y = min(min_y, y), max(max_y, y)
+                ring_points.append(len(points) // 2)
+            feature_rings.append(len(ring_points) - 1)
+            bboxes.extend((min_x, min_y, max_x, max_y))
+            geoids.append(geoid.encode("ascii"))
+
+    n_features = len(geoids)
+    if n_features == 0:
+        raise ValueError("No block group polygons found in the given sources.")
+
+    grid_min_x = min(box[1] for box in boxes)
+    grid_min_y = min(box[2] for box in boxes)
+    cols = int((max(box[3] for box in boxes) - grid_min_x) / cell_size) + 1
+    rows = int((max(box[4] for box in boxes) - grid_min_y) / cell_size) + 1
+    cells = {}  # cell number -> features, for occupied cells only
+    for i, min_x, min_y, max_x, max_y in boxes:
+        for row in range(int((min_y - grid_min_y) / cell_size), int((max_y - grid_min_y) / cell_size) + 1):
+            for col in range(int((min_x - grid_min_x) / cell_size), int((max_x - grid_min_x) / cell_size) + 1):
+                cell = cells.setdefault(row * cols + col, [])
+                if not cell or cell[-1] != i:  # rings of one feature are added consecutively
+                    cell.append(i)
+    cell_ids = array("I", sorted(cells))
+    cell_offsets = array("I", [0])
+    cell_entries = array("I")
+    for cell_id in cell_ids:
+        cell_entries.extend(cells[cell_id])
+        cell_offsets.append(len(cell_entries))
+
+    tmp_path = out_path + ".tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, n_features, len(ring_points) - 1, len(points) // 2,
+                             len(cell_ids), len(cell_entries), cols, rows, grid_min_x, grid_min_y, cell_size))
+        _pad(f)
+        bboxes.tofile(f)
+        points.tofile(f)
+        feature_rings.tofile(f)
+        ring_points.tofile(f)
+        cell_ids.tofile(f)
+        cell_offsets.tofile(f)
+        cell_entries.tofile(f)
+        f.write(b"".join(geoids))
+    # Atomic replace so running workers never map a half-written file
+    os.replace(tmp_path, out_path)
+    return n_features
+
+
+class BlockGroupIndex:
+    """
+    Read-only, memory-mapped block group index built by build_index().
+
+    The file is mapped with mmap, so every gunicorn worker on the host shares the
+    same physical pages.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.n_features, n_rings, n_points, n_cells, n_entries,
+         self.cols, self.rows, self.min_x, self.min_y, self.cell_size) = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{path} is not a block group index (version {_VERSION}).")
+        view = memoryview(self._mm)
+        offset = _HEADER.size + (-_HEADER.size % 8)
+
+        def take(count, fmt, size):
+            nonlocal offset
+            section = view[offset:offset + count * size].cast(fmt)
+            offset += count * size
+            return section
+
+        self._bboxes = take(4 * self.n_features, "d", 8)
+        self._points = take(2 * n_points, "d", 8)
+        self._feature_rings = take(self.n_features + 1, "I", 4)
+        self._ring_points = take(n_rings + 1, "I", 4)
+        self._cell_ids = take(n_cells, "I", 4)
+        self._cell_offsets = take(n_cells + 1, "I", 4)
+        self._cell_entries = take(n_entries, "I", 4)
+        self._geoids = view[offset:offset + GEOID_LENGTH * self.n_features]
+
+    def _contains(self, feature, x, y):
+        # Even-odd ray casting over every ring, so holes are handled too
+        inside = False
+        pts = self._points
+        for ring in range(self._feature_rings[feature], self._feature_rings[feature + 1]):
+            start, end = self._ring_points[ring], self._ring_points[ring + 1]
+            j = end - 1
+            for i in range(start, end):
+                xi, yi = pts[2 * i], pts[2 * i + 1]
+                xj, yj = pts[2 * j], pts[2 * j + 1]
+                if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+                    inside = not inside
+                j = i
+        return inside
+
+    def geoid(self, feature):
+        """
+        Returns the GEOID string stored for a feature number.
+        """
+        return bytes(self._geoids[GEOID_LENGTH * feature:GEOID_LENGTH * (feature + 1)]).decode("ascii")
+
+    def centroid(self, feature):
+        """
+        Returns the area-weighted centroid of a feature as (lat, lon).
+
+        Holes are subtracted through their opposite winding; degenerate polygons fall
+        back to the centre of the bounding box.
+        """
+        pts = self._points
+        area = cx = cy = 0.0
+        for ring in range(self._feature_rings[feature], self._feature_rings[feature + 1]):
+            start, end = self._ring_points[ring], self._ring_points[ring + 1]
+            j = end - 1
+            for i in range(start, end):
+                xi, yi = pts[2 * i], pts[2 * i + 1]
+                xj, yj = pts[2 * j], pts[2 * j + 1]
+                cross = xj * yi - xi * yj
+                area += cross
+                cx += (xj + xi) * cross
+                cy += (yj + yi) * cross
+                j = i
+        if abs(area) < 1e-12:
+            b = 4 * feature
+            return (self._bboxes[b + 1] + self._bboxes[b + 3]) / 2, (self._bboxes[b] + self._bboxes[b + 2]) / 2
+        return cy / (3 * area), cx / (3 * area)
+
+    def lookup(self, lat, lon):
+        """
+        Finds the block group containing a point.
+
+        Args:
+            lat (float): Latitude in degrees.
+            lon (float): Longitude in degrees.
+
+        Returns:
+            str: The 12-digit block group GEOID, or None if the point is not covered by the index.
+        """
+        col = int((lon - self.min_x) / self.cell_size)
+        row = int((lat - self.min_y) / self.cell_size)
+        if not (0 <= col < self.cols and 0 <= row < self.rows):
+            return None
+        cell_id = row * self.cols + col
+        cell = bisect_left(self._cell_ids, cell_id)
+        if cell == len(self._cell_ids) or self._cell_ids[cell] != cell_id:
+            return None
+        bboxes = self._bboxes
+        for k in range(self._cell_offsets[cell], self._cell_offsets[cell + 1]):
+            feature = self._cell_entries[k]
+            b = 4 * feature
+            if bboxes[b] <= lon <= bboxes[b + 2] and bboxes[b + 1] <= lat <= bboxes[b + 3]:
+                if self._contains(feature, lon, lat):
+                    return self.geoid(feature)
+        return None
+
+
+_index = None
+_index_loaded = False
+_index_lock = threading.Lock()
+
+
+def get_block_group_index():
+    """
+    Returns the shared block group index, or None if no index file is installed.
+
+    Returns:
+        BlockGroupIndex: The memory-mapped index, or None.
+    """
+    global _index, _index_loaded
+    if not _index_loaded:
+        with _index_lock:
+            if not _index_loaded:
+                if os.path.exists(BLOCKGROUP_INDEX_PATH):
+                    try:
+                        _index = BlockGroupIndex(BLOCKGROUP_INDEX_PATH)
+                    except (OSError, ValueError) as e:
+                        print(f"Error loading block group index: {e}")
+                _index_loaded = True
+    return _index
+
+
+if __name__ == "__main__":
+    # Usage: python blockgroups.py OUT_PATH SOURCE [SOURCE ...]
+    if len(sys.argv) < 3:
+        print("Usage: python blockgroups.py OUT_PATH tl_2020_XX_bg.shp [more .shp/.geojson files]")
+        sys.exit(1)
+    count = build_index(sys.argv[2:], sys.argv[1])
+    print(f"Indexed {count} block groups into {sys.argv[1]}")
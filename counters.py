@@ -0,0 +1,192 @@
+import atexit
+import os
+import threading
+from mysql.connector import Error
+from db import get_connection
+
+# Counter increments (meta_data, city_rollups) are buffered per worker and written in batches
+COUNTER_FLUSH_INTERVAL = float(os.getenv("COUNTER_FLUSH_INTERVAL", "5"))  # seconds
+COUNTER_FLUSH_SIZE = int(os.getenv("COUNTER_FLUSH_SIZE", "500"))  # distinct keys that trigger an early flush
+COUNTER_BATCH_ROWS = 500  # rows per multi-row upsert
+
+
+class CounterBuffer:
+    """
+    Write-behind buffer for additive counter columns, keyed by a table's unique key.
+
+    Increments are summed in memory per key (e.g. (street, city, state) for meta_data)
+    and written by a background thread every COUNTER_FLUSH_INTERVAL seconds, or as
+    soon as COUNTER_FLUSH_SIZE keys are pending, with batched multi-row upserts in one
+    transaction. A hot key therefore costs one row update per flush instead of one
+    per request. Pending increments are flushed at interpreter exit.
+
+    Args:
+        table (str): The table to upsert into.
+        key_columns (tuple): Columns of the table's unique key.
+        value_columns (tuple): Counter columns, incremented by the buffered deltas.
+    """
+
+    def __init__(self, table="meta_data", key_columns=("street", "city", "state"),
+                 value_columns=("search_count", "delete_count"),
+                 flush_interval=COUNTER_FLUSH_INTERVAL, flush_size=COUNTER_FLUSH_SIZE):
+        self.table = table
+        self.key_columns = tuple(key_columns)
+        self.value_columns = tuple(value_columns)
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._pending = {}  # key tuple -> [delta per value column]
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.stats = {"flushes": 0, "rows": 0, "errors": 0}
+
+    def _ensure_thread(self):
+        # Start (or restart after a gunicorn fork) the flusher thread
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                if self._pid is not None:
+                    self._pending = {}  # the parent process owns what it buffered before the fork
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name=f"{self.table}-flusher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def add(self, key, *deltas):
+        """
+        Buffers counter increments for one key.
+
+        Args:
+            key (tuple): Values of the key columns.
+            *deltas: One increment per value column (may be negative).
+        """
+        self._ensure_thread()
+        with self._lock:
+            self._merge(key, deltas)
+            if len(self._pending) >= self.flush_size:
+                self._wake.set()
+
+    def _merge(self, key, deltas):
+        counts = self._pending.setdefault(key, [0] * len(self.value_columns))
+        for i, delta in enumerate(deltas):
+            counts[i] += delta
+
+    def pending(self):
+        """
+        Returns the number of keys with unflushed increments.
+        """
+        with self._lock:
+            return len(self._pending)
+
+    def _upsert(self, cursor, batch):
+        # Only non-negative deltas get here, so a missing row can safely be created from them
+        columns = self.key_columns + self.value_columns
+        row = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        updates = ", ".join(f"{column} = {column} + VALUES({column})" for column in self.value_columns)
+        cursor.execute(f"""
+            INSERT INTO {self.table} ({", ".join(columns)})
+            VALUES {", ".join([row] * len(batch))}
+            ON DUPLICATE KEY UPDATE {updates}
+        """, [value for key, counts in batch for value in (*key, *counts)])
+
+    def _decrement(self, cursor, key, counts):
+        # Negative deltas only adjust an existing row, clamped at zero: a row that is missing (e.g. rebuilt
+        # without these searches) must not be created with negative counts
+        cursor.execute(f"""
+            UPDATE {self.table}
+            SET {", ".join(f"{column} = GREATEST(0, {column} + %s)" for column in self.value_columns)}
+            WHERE {" AND ".join(f"{column} = %s" for column in self.key_columns)}
+        """, (*counts, *key))
+        if max(counts) > 0:
+            # Mixed deltas (e.g. a save and a delete in one interval): still record the increments for a missing row
+            columns = self.key_columns + self.value_columns
+            cursor.execute(f"""
+                INSERT IGNORE INTO {self.table} ({", ".join(columns)})
+                VALUES ({", ".join(["%s"] * len(columns))})
+            """, (*key, *(max(0, count) for count in counts)))
+
+    def flush(self):
+        """
+        Writes all pending increments to the table in one transaction.
+
+        Keys whose deltas are all non-negative are upserted in batches; keys with a
+        negative delta only update an existing row, clamped at zero, so a missing row
+        is never created with negative counts. On a database error the increments are
+        merged back and retried on the next flush.
+
+        Returns:
+            int: The number of keys written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            # A fixed key order means concurrent flushes from other workers lock rows in the same order
+            items = sorted(pending.items())
+            try:
+                with get_connection() as connection:
+                    cursor = connection.cursor()
+                    try:
+                        connection.start_transaction()
+                        batch = []
+                        for key, counts in items:
+                            if min(counts) >= 0:
+                                batch.append((key, counts))
+                                if len(batch) >= COUNTER_BATCH_ROWS:
+                                    self._upsert(cursor, batch)
+                                    batch = []
+                                continue
+                            if batch:
+                                self._upsert(cursor, batch)
+                                batch = []
+                            self._decrement(cursor, key, counts)
+                        if batch:
+                            self._upsert(cursor, batch)
+                        connection.commit()
+                    except Error:
+                        connection.rollback()
+                        raise
+                    finally:
+                        cursor.close()
+            except Error as e:
+                print(f"Error flushing {self.table} counters: {str(e)}")
+                self.stats["errors"] += 1
+                with self._lock:
+                    for key, counts in pending.items():
+                        self._merge(key, counts)
+                return 0
+            self.stats["flushes"] += 1
+            self.stats["rows"] += len(items)
+            return len(items)
+
+
+meta_data_counters = CounterBuffer()
+atexit.register(meta_data_counters.flush)
+
+
+def record_search(street, city, state):
+    """
+    Counts a newly saved search in meta_data (written behind).
+    """
+    meta_data_counters.add((street, city, state), 1, 0)
+
+
+def record_deletes(counts):
+    """
+    Counts deleted searches in meta_data (written behind).
+
+    Args:
+        counts (dict): (street, city, state) -> number of deleted searches.
+    """
+    for (street, city, state), count in counts.items():
+        meta_data_counters.add((street, city, state), 0, count)
+
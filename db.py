@@ -0,0 +1,218 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+import mysql.connector
+from mysql.connector import Error
+
+# Load environment variables once at import time instead of on every query
+load_dotenv()
+
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "user": os.getenv("DB_USER"),
+    "password": os.getenv("DB_PASSWORD"),
+    "database": os.getenv("DB_NAME"),
+}
+
+# Pool sizing is per process, so with gunicorn the total number of MySQL
+# connections is roughly workers * DB_POOL_SIZE.
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))  # seconds to wait for a free connection
+POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))  # evict connections idle this long
+POOL_PING_INTERVAL = float(os.getenv("DB_POOL_PING_INTERVAL", "30"))  # health check connections idle this long
+
+
+class PoolTimeout(Error):
+    """
+    Raised when no connection becomes available within the checkout timeout.
+    """
+
+
+class ConnectionPool:
+    """
+    A bounded, thread-safe pool of MySQL connections.
+
+    Connections are created lazily up to max_size. On checkout, connections that
+    sat idle longer than idle_timeout are closed and replaced, and connections idle
+    longer than ping_interval are pinged before being handed out.
+    """
+
+    def __init__(self, config, max_size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 idle_timeout=POOL_IDLE_TIMEOUT, ping_interval=POOL_PING_INTERVAL):
+        self.config = dict(config)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self._idle = queue.LifoQueue()  # (connection, last_used) pairs, most recently used first
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.stats = {"created": 0, "reused": 0, "evicted": 0, "timeouts": 0, "in_use": 0}
+
+    def _reset_after_fork(self):
+        # Connections must not be shared between a gunicorn master and its workers
+        if os.getpid() != self._pid:
+            with self._lock:
+                if os.getpid() != self._pid:
+                    self._idle = queue.LifoQueue()
+                    self._slots = threading.BoundedSemaphore(self.max_size)
+                    self._pid = os.getpid()
+                    self.stats["in_use"] = 0
+
+    def _connect(self):
+        connection = mysql.connector.connect(**self.config)
+        self.stats["created"] += 1
+        return connection
+
+    def _close_quietly(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        """
+        Checks out a healthy connection, waiting up to the pool timeout.
+
+        Returns:
+            mysql.connector.connection.MySQLConnection: An open connection.
+
+        Raises:
+            PoolTimeout: If the pool is exhausted for longer than the timeout.
+            mysql.connector.Error: If a new connection cannot be established.
+        """
+        self._reset_after_fork()
+        if not self._slots.acquire(timeout=self.timeout):
+            self.stats["timeouts"] += 1
+            raise PoolTimeout(msg=f"Timed out after {self.timeout}s waiting for a database connection")
+        try:
+            connection = self._take_idle()
+            if connection is None:
+                connection = self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+        self.stats["in_use"] += 1
+        return connection
+
+    def _take_idle(self):
+        now = time.monotonic()
+        while True:
+            try:
+                connection, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            idle_for = now - last_used
+            if idle_for > self.idle_timeout:
+                self.stats["evicted"] += 1
+                self._close_quietly(connection)
+                continue
+            if idle_for > self.ping_interval:
+                try:
+                    connection.ping(reconnect=False)
+                except Error:
+                    self.stats["evicted"] += 1
+                    self._close_quietly(connection)
+                    continue
+            self.stats["reused"] += 1
+            return connection
+
+    def release(self, connection, discard=False):
+        """
+        Returns a connection to the pool.
+
+        Args:
+            connection: The connection previously returned by acquire().
+            discard (bool): Close the connection instead of reusing it (e.g. after an error).
+        """
+        if os.getpid() != self._pid:
+            # Checked out before a fork; the slot belongs to the old semaphore
+            self._close_quietly(connection)
+            return
+        self.stats["in_use"] -= 1
+        try:
+            if not discard:
+                try:
+                    # Roll back anything left open so the next user starts clean
+                    if connection.in_transaction:
+                        connection.rollback()
+                except Error:
+                    discard = True
+            if discard:
+                self._close_quietly(connection)
+            else:
+                self._idle.put((connection, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        """
+        Closes every idle connection in the pool.
+        """
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close_quietly(connection)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Returns the process-wide connection pool, creating it on first use.
+
+    Returns:
+        ConnectionPool: The shared pool.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_CONFIG)
+    return _pool
+
+
+def close_pool():
+    """
+    Closes the idle connections of this process's pool, if one was created.
+
+    Runs at interpreter exit and from gunicorn's worker_exit, so the server sees a clean
+    disconnect instead of waiting out wait_timeout on abandoned connections.
+    """
+    if _pool is not None:
+        _pool.close_all()
+
+
+# Registered before the write-behind buffers (which import db), so atexit runs it after their final flush
+atexit.register(close_pool)
+
+
+@contextmanager
+def get_connection():
+    """
+    Context manager that checks a connection out of the pool and returns it afterwards.
+
+    Connections that raised a database error are discarded rather than reused.
+
+    Yields:
+        mysql.connector.connection.MySQLConnection: A pooled connection.
+    """
+    pool = get_pool()
+    connection = pool.acquire()
+    discard = False
+    try:
+        yield connection
+    except Error:
+        discard = True
+        raise
+    finally:
+        pool.release(connection, discard=discard)
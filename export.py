@@ -0,0 +1,168 @@
+import argparse
+import sys
+import zlib
+from decimal import Decimal
+from mysql.connector import Error
+from db import get_pool
+from walkstore import WALKABILITY_COLUMNS
+from batch import format_results
+from refdata import get_reference_data
+
+EXPORT_FIELDS = ["user_id", "search_id", "street", "city", "state", "census_block"] + WALKABILITY_COLUMNS
+EXPORT_FETCH_SIZE = 500  # rows pulled from the server per round trip
+
+
+def iter_saved_searches(user_id, attribute="NatWalkInd", city_filter=None, state_filter=None, sort="DESC"):
+    """
+    Streams saved searches with their walkability scores straight from the server.
+
+    Uses an unbuffered cursor read in EXPORT_FETCH_SIZE batches, so memory stays flat
+    however many rows match. Filters and ordering match the saved addresses view.
+    The connection is acquired and the query run before this returns, so a database
+    that is down surfaces here, before any response has been started.
+
+    Args:
+        user_id (int): The ID of the user, or None to export every user's searches.
+        attribute (str): The walkability column to sort by.
+        city_filter (str): Optional city filter.
+        state_filter (str): Optional state filter.
+        sort (str): "Low" for ascending, anything else for descending.
+
+    Returns:
+        iterator: One dict per saved search, keyed by EXPORT_FIELDS. It re-raises a
+                  database error hit mid-stream rather than ending early.
+
+    Raises:
+        Error: If no connection could be acquired or the query failed.
+    """
+    if not get_reference_data().is_attribute(attribute):
+        attribute = "NatWalkInd"
+    direction = "ASC" if sort == "Low" else "DESC"
+    query = f"""
+        SELECT s.user_id, s.search_id, s.street, s.city, s.state, s.census_block,
+               {", ".join("w." + column for column in WALKABILITY_COLUMNS)}
+        FROM searches AS s
+        JOIN WalkabilityIndex AS w ON w.census_block = s.census_block
+        WHERE 1 = 1
+    """
+    params = []
+    if user_id is not None:
+        query += " AND s.user_id = %s"
+        params.append(user_id)
+    if city_filter is not None:
+        query += " AND s.city = %s"
+        params.append(city_filter)
+    if state_filter is not None:
+        query += " AND s.state = %s"
+        params.append(state_filter)
+    query += f" ORDER BY w.{attribute} {direction}, s.user_id, s.search_id"
+
+    # The pool is used directly so a connection abandoned mid-stream (client went away)
+    # is discarded rather than handed to the next request with unread rows on it
+    pool = get_pool()
+    connection = pool.acquire()
+    try:
+        cursor = connection.cursor(dictionary=True, buffered=False)
+        cursor.execute(query, params)
+    except Error:
+        pool.release(connection, discard=True)
+        raise
+    rows = _stream_rows(pool, connection, cursor)
+    next(rows)  # step inside the try below, so closing the iterator unused still returns the connection
+    return rows
+
+
+def _stream_rows(pool, connection, cursor):
+    finished = False
+    try:
+        yield
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                for key, value in row.items():
+                    if isinstance(value, Decimal):
+                        row[key] = float(value)  # Decimal isn't JSON serializable
+                yield row
+        cursor.close()
+        finished = True
+    except Error as e:
+        print(f"Error exporting saved searches: {str(e)}")
+        raise  # abort the transfer; ending quietly would hand the client a truncated file that looks complete
+    finally:
+        pool.release(connection, discard=not finished)
+
+
+def gzip_stream(chunks):
+    """
+    Gzip-compresses a stream of text chunks incrementally.
+
+    Yields:
+        bytes: Compressed data as the compressor produces it.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_saved_searches(user_id, fmt="csv", compress=False, **filters):
+    """
+    Streams an export of saved searches as CSV or NDJSON, optionally gzip-compressed.
+
+    Args:
+        user_id (int): The ID of the user, or None for all users.
+        fmt (str): "csv" or "ndjson".
+        compress (bool): Gzip the output.
+        **filters: attribute, city_filter, state_filter and sort, as for iter_saved_searches().
+
+    Returns:
+        iterator: str chunks, or bytes chunks when compress is True.
+
+    Raises:
+        Error: If the export query could not be started.
+    """
+    chunks = format_results(iter_saved_searches(user_id, **filters), fmt, fields=EXPORT_FIELDS)
+    return gzip_stream(chunks) if compress else chunks
+
+
+def main(argv=None):
+    """
+    Command line entry point: python export.py (--user-id N | --all) [--format ndjson] [--gzip] [--output FILE]
+    """
+    parser = argparse.ArgumentParser(description="Export saved searches with walkability scores.")
+    who = parser.add_mutually_exclusive_group(required=True)
+    who.add_argument("--user-id", type=int, help="export one user's saved searches")
+    who.add_argument("--all", action="store_true", help="export every user's saved searches")
+    parser.add_argument("--city")
+    parser.add_argument("--state")
+    parser.add_argument("--attribute", default="NatWalkInd", help="walkability column to sort by")
+    parser.add_argument("--sort", choices=["High", "Low"], default="High")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--output", help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    try:
+        chunks = export_saved_searches(None if args.all else args.user_id, args.format, args.gzip,
+                                       attribute=args.attribute, city_filter=args.city, state_filter=args.state,
+                                       sort=args.sort)
+    except Error as e:
+        print(f"Error exporting saved searches: {str(e)}", file=sys.stderr)
+        return 1
+    if args.output:
+        with open(args.output, "wb" if args.gzip else "w", **({} if args.gzip else {"newline": ""})) as out:
+            for chunk in chunks:
+                out.write(chunk)
+    else:
+        out = sys.stdout.buffer if args.gzip else sys.stdout
+        for chunk in chunks:
+            out.write(chunk)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
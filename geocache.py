@@ -0,0 +1,165 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from cache import TTLCache
+
+# Durable tier lives in a local SQLite file shared by every gunicorn worker on the host
+GEOCODE_CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "geocode_cache.sqlite3"))
+GEOCODE_CACHE_TTL = int(os.getenv("GEOCODE_CACHE_TTL", str(90 * 24 * 3600)))  # block groups rarely change
+GEOCODE_NEGATIVE_TTL = int(os.getenv("GEOCODE_NEGATIVE_TTL", str(24 * 3600)))  # retry "not found" daily
+GEOCODE_MEMORY_SIZE = int(os.getenv("GEOCODE_MEMORY_SIZE", "10000"))
+
+# Common street-suffix and direction spellings collapsed so "123 Main Street" and "123 main st." share an entry
+_ABBREVIATIONS = {
+    "street": "st", "avenue": "ave", "boulevard": "blvd", "road": "rd", "drive": "dr",
+    "lane": "ln", "court": "ct", "place": "pl", "terrace": "ter", "parkway": "pkwy",
+    "highway": "hwy", "circle": "cir", "square": "sq", "north": "n", "south": "s",
+    "east": "e", "west": "w", "northeast": "ne", "northwest": "nw", "southeast": "se",
+    "southwest": "sw", "apartment": "apt", "suite": "ste",
+}
+
+
+def normalize_address(street, city, state):
+    """
+    Builds a canonical cache key for an address.
+
+    Args:
+        street (str): The street address.
+        city (str): The city name.
+        state (str): The state name or abbreviation.
+
+    Returns:
+        str: Lowercased "street|city|state" with punctuation removed and common words abbreviated.
+    """
+    parts = []
+    for value in (street, city, state):
+        words = re.sub(r"[^\w\s]", " ", (value or "").lower()).split()
+        parts.append(" ".join(_ABBREVIATIONS.get(word, word) for word in words))
+    return "|".join(parts)
+
+
+class GeocodeCache:
+    """
+    Two-tier cache from normalized address to census block group GEOID.
+
+    The first tier is an in-process LRU; the second is a SQLite table that survives
+    restarts and is shared between worker processes. "Not found" results are cached
+    too (negative caching), with a shorter TTL.
+    """
+
+    def __init__(self, path=GEOCODE_CACHE_PATH, ttl=GEOCODE_CACHE_TTL,
+                 negative_ttl=GEOCODE_NEGATIVE_TTL, memory_size=GEOCODE_MEMORY_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory = TTLCache(max_size=memory_size, ttl=ttl, name="geocode")
+        self._local = threading.local()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "negative_hits": 0}
+        self._init_db()
+
+    def _db(self):
+        # sqlite3 connections cannot be shared across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        try:
+            conn = self._db()
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS geocode_cache (
+                    address_key TEXT PRIMARY KEY,
+                    geoid TEXT,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error initializing geocode cache: {e}")
+
+    def get(self, key):
+        """
+        Looks up an address key.
+
+        Args:
+            key (str): A key from normalize_address().
+
+        Returns:
+            tuple: (found, geoid). found is False on a miss; geoid is None for a cached "not found".
+        """
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.stats["memory_hits"] += 1
+            if entry[0] is None:
+                self.stats["negative_hits"] += 1
+            return True, entry[0]
+        try:
+            row = self._db().execute(
+                "SELECT geoid, expires_at FROM geocode_cache WHERE address_key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading geocode cache: {e}")
+            row = None
+        if row is not None and row[1] > time.time():
+            geoid = row[0]
+            self.stats["disk_hits"] += 1
+            if geoid is None:
+                self.stats["negative_hits"] += 1
+            # Promote to the memory tier for the rest of its lifetime
+            self.memory.set(key, (geoid,), ttl=max(1, int(row[1] - time.time())))
+            return True, geoid
+        self.stats["misses"] += 1
+        return False, None
+
+    def set(self, key, geoid):
+        """
+        Stores a resolved GEOID, or None to record that the address could not be resolved.
+        """
+        ttl = self.ttl if geoid is not None else self.negative_ttl
+        self.memory.set(key, (geoid,), ttl=ttl)
+        try:
+            conn = self._db()
+            conn.execute(
+                "INSERT OR REPLACE INTO geocode_cache (address_key, geoid, expires_at) VALUES (?, ?, ?)",
+                (key, geoid, time.time() + ttl),
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Error writing geocode cache: {e}")
+
+    def purge_expired(self):
+        """
+        Deletes expired rows from the durable tier.
+
+        Returns:
+            int: The number of rows removed.
+        """
+        conn = self._db()
+        cursor = conn.execute("DELETE FROM geocode_cache WHERE expires_at <= ?", (time.time(),))
+        conn.commit()
+        return cursor.rowcount
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_geocode_cache():
+    """
+    Returns the process-wide geocode cache, creating it on first use.
+
+    Returns:
+        GeocodeCache: The shared cache.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = GeocodeCache()
+    return _cache
@@ -0,0 +1,292 @@
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from ratelimit import get_bucket, RateLimitExceeded
+
+# Upstream endpoints; override to point at local stub servers
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org").rstrip("/")
+NOMINATIM_USER_AGENT = os.getenv("NOMINATIM_USER_AGENT", "walkdata sarsov@wisc.edu")
+CENSUS_GEOCODER_URL = os.getenv("CENSUS_GEOCODER_URL", "https://geocoding.geo.census.gov/geocoder/geographies/coordinates")
+
+# (connect, read) timeouts in seconds
+GEOCODER_CONNECT_TIMEOUT = float(os.getenv("GEOCODER_CONNECT_TIMEOUT", "3"))
+GEOCODER_READ_TIMEOUT = float(os.getenv("GEOCODER_READ_TIMEOUT", "10"))
+GEOCODER_RETRIES = int(os.getenv("GEOCODER_RETRIES", "2"))
+
+# Circuit breaker: open after this many consecutive failures, probe again after the reset timeout
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+
+# Nominatim's usage policy allows about one request per second per user agent, across all our workers
+NOMINATIM_RATE = float(os.getenv("NOMINATIM_RATE", "1.0"))
+
+# Latency histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class UpstreamUnavailable(Exception):
+    """
+    Raised when an upstream geocoder fails or its circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    Closed: calls go through. Open: calls fail fast until reset_timeout has passed.
+    Half-open: one probe call is allowed; success closes the breaker, failure re-opens it.
+    A probe that never reports back (e.g. a cancelled task) is replaced by a new one
+    after another reset_timeout, so the breaker cannot stay half-open forever.
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Returns True if a call may be attempted now.
+        """
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half-open"
+                self.opened_at = time.monotonic()  # when this probe started
+                return True  # this caller is the probe
+            return False
+
+    def release(self):
+        """
+        Hands back a probe that was allowed but never sent, so the next caller can probe instead.
+        """
+        with self._lock:
+            if self.state == "half-open":
+                self.opened_at = time.monotonic() - self.reset_timeout
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half-open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"Circuit breaker for {self.name} opened after {self.failures} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class UpstreamMetrics:
+    """
+    Request, error and latency counters for one upstream.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0  # calls short-circuited by an open breaker
+        self.latency_sum = 0.0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self.requests += 1
+            if not ok:
+                self.errors += 1
+            self.latency_sum += latency
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    self.latency_buckets[i] += 1
+                    break
+            else:
+                self.latency_buckets[-1] += 1
+
+    def record_rejected(self):
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self):
+        """
+        Returns the counters as a plain dictionary.
+        """
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "rejected": self.rejected,
+                "latency_avg": self.latency_sum / self.requests if self.requests else 0.0,
+                "latency_sum": self.latency_sum,
+                "latency_buckets": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], self.latency_buckets)),
+            }
+
+
+breakers = {"nominatim": CircuitBreaker("nominatim"), "census": CircuitBreaker("census")}
+metrics = {"nominatim": UpstreamMetrics("nominatim"), "census": UpstreamMetrics("census")}
+
+
+def nominatim_bucket():
+    """
+    Returns the token bucket that every process draws from before calling Nominatim.
+    """
+    return get_bucket("nominatim", NOMINATIM_RATE)
+
+
+def parse_census_response(data):
+    """
+    Extracts the 12-digit block group GEOID from a Census coordinates geocoder response.
+
+    Returns:
+        str: The GEOID, or None if the response has no block.
+    """
+    try:
+        block_geoid = data['result']['geographies']['2020 Census Blocks'][0]['GEOID']
+        return block_geoid[:-3]  # Truncate to 12-digit block group
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+def census_params(lat, lon):
+    return {"x": lon, "y": lat, "benchmark": "Public_AR_Current", "vintage": "Current_Current", "format": "json"}
+
+
+def nominatim_params(address):
+    return {"q": address, "format": "jsonv2", "limit": 1}
+
+
+class GeocodingClient:
+    """
+    Synchronous client for Nominatim and the Census coordinates geocoder.
+
+    Uses one keep-alive requests.Session per process, strict connect/read timeouts,
+    jittered-backoff retries for idempotent GETs on connection errors and 429/5xx,
+    a circuit breaker per upstream and per-upstream latency/error metrics. Nominatim
+    requests are only retried when the connection could not be made: any request
+    that reached the server must take its own token from the shared rate limit bucket.
+    """
+
+    def __init__(self):
+        self.session = requests.Session()
+        retry = Retry(
+            total=GEOCODER_RETRIES,
+            connect=GEOCODER_RETRIES,
+            read=GEOCODER_RETRIES,
+            status=GEOCODER_RETRIES,
+            backoff_factor=0.3,
+            backoff_jitter=0.3,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # The longer prefix wins, so Nominatim gets connect-only retries
+        nominatim_retry = Retry(total=GEOCODER_RETRIES, connect=GEOCODER_RETRIES, read=0, status=0, other=0,
+                                backoff_factor=0.3, backoff_jitter=0.3, allowed_methods=frozenset(["GET"]),
+                                raise_on_status=False)
+        self.session.mount(f"{NOMINATIM_URL}/", HTTPAdapter(pool_connections=1, pool_maxsize=16,
+                                                            max_retries=nominatim_retry))
+        self.session.headers["User-Agent"] = NOMINATIM_USER_AGENT
+        self.timeout = (GEOCODER_CONNECT_TIMEOUT, GEOCODER_READ_TIMEOUT)
+
+    def _wait_for_nominatim(self, breaker):
+        # Queue for the shared token bucket so bursts are smoothed instead of earning 429s
+        try:
+            nominatim_bucket().acquire()
+        except RateLimitExceeded as e:
+            breaker.release()
+            metrics["nominatim"].record_rejected()
+            raise UpstreamUnavailable(str(e)) from e
+
+    def _get_json(self, upstream, url, params):
+        breaker = breakers[upstream]
+        if not breaker.allow():
+            metrics[upstream].record_rejected()
+            raise UpstreamUnavailable(f"{upstream} is temporarily unavailable (circuit open)")
+        if upstream == "nominatim":
+            # Only calls that will really be sent take a token, so an open breaker costs no queueing
+            self._wait_for_nominatim(breaker)
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, params=params, timeout=self.timeout)
+            if response.status_code == 429 or response.status_code >= 500:
+                raise UpstreamUnavailable(f"{upstream} returned HTTP {response.status_code}")
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError, UpstreamUnavailable) as e:
+            metrics[upstream].record(time.perf_counter() - start, ok=False)
+            breaker.record_failure()
+            if isinstance(e, UpstreamUnavailable):
+                raise
+            raise UpstreamUnavailable(f"{upstream} request failed: {e}") from e
+        except BaseException:
+            # Interrupted mid-call: still report back, or a half-open breaker would wait on this probe
+            metrics[upstream].record(time.perf_counter() - start, ok=False)
+            breaker.record_failure()
+            raise
+        metrics[upstream].record(time.perf_counter() - start, ok=True)
+        breaker.record_success()
+        return data
+
+    def geocode(self, address):
+        """
+        Geocodes a free-form address with Nominatim.
+
+        Returns:
+            tuple: (lat, lon), or None if the address was not found.
+
+        Raises:
+            UpstreamUnavailable: If Nominatim failed or its breaker is open.
+        """
+        results = self._get_json("nominatim", f"{NOMINATIM_URL}/search", nominatim_params(address))
+        if not results:
+            return None
+        return float(results[0]["lat"]), float(results[0]["lon"])
+
+    def block_group_for_point(self, lat, lon):
+        """
+        Maps coordinates to a block group with the Census coordinates geocoder.
+
+        Returns:
+            str: The 12-digit GEOID, or None if the point has no block.
+
+        Raises:
+            UpstreamUnavailable: If the Census API failed or its breaker is open.
+        """
+        return parse_census_response(self._get_json("census", CENSUS_GEOCODER_URL, census_params(lat, lon)))
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_geocoding_client():
+    """
+    Returns this process's geocoding client, recreating it after a fork.
+
+    Returns:
+        GeocodingClient: The shared client.
+    """
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = GeocodingClient()
+                _client_pid = os.getpid()
+    return _client
@@ -1,35 +1,58 @@
 # utils.py
 
-import requests
-from geopy.geocoders import Nominatim
+from geocache import get_geocode_cache, normalize_address
+from blockgroups import get_block_group_index
+from geoclient import get_geocoding_client, UpstreamUnavailable
+from ratelimit import SingleFlight
+
+NOT_FOUND_MESSAGE = "Census block not found for the given location."
+UNAVAILABLE_MESSAGE = "The geocoding service is temporarily unavailable. Please try again later."
+
+# Identical addresses looked up at the same time share one upstream resolution
+_in_flight = SingleFlight()
 
 ##this method returns geoid to find walkdata for
 ##pass in street, city and state as string
 
 def get_block_group_geoid(street, city, state):
+    # Repeat addresses are answered from the geocode cache without any remote calls
+    cache = get_geocode_cache()
+    key = normalize_address(street, city, state)
+    found, geoid = cache.get(key)
+    if found:
+        return geoid if geoid is not None else NOT_FOUND_MESSAGE
+
+    try:
+        geoid = _in_flight.do(key, _resolve_and_cache, key, street, city, state)
+    except UpstreamUnavailable as e:
+        # Upstream failures are not cached, so the address is retried once the geocoder recovers
+        print(f"Error resolving block group: {str(e)}")
+        return UNAVAILABLE_MESSAGE
+    return geoid if geoid is not None else NOT_FOUND_MESSAGE
+
+def _resolve_and_cache(key, street, city, state):
+    geoid = _resolve_block_group_geoid(street, city, state)
+    # None is cached too (negative cache) so bad addresses don't hit the geocoders again
+    get_geocode_cache().set(key, geoid)
+    return geoid
+
+def _resolve_block_group_geoid(street, city, state):
     # Construct the full address internally
     address = f"{street}, {city}, {state}"
 
-    geolocator = Nominatim(user_agent="walkdata sarsov@wisc.edu")
-    location = geolocator.geocode(address)
+    client = get_geocoding_client()
+    location = client.geocode(address)
 
     if not location:
-        return "Census block not found for the given location."
+        return None
 
-    lat, lon = location.latitude, location.longitude
+    lat, lon = location
 
-    url = (
-        f"https://geocoding.geo.census.gov/geocoder/geographies/coordinates"
-        f"?x={lon}&y={lat}&benchmark=Public_AR_Current&vintage=Current_Current&format=json"
-    )
-
-    resp = requests.get(url).json()
-
-    try:
-        block_info = resp['result']['geographies']['2020 Census Blocks'][0]
-        block_geoid = block_info['GEOID']
-        block_group_geoid = block_geoid[:-3]  # Truncate to 12-digit block group
-        return block_group_geoid
-    except (KeyError, IndexError):
-        return "Census block not found for the given location."
+    # Resolve the point locally when a block group index is installed; only misses go to the Census API
+    index = get_block_group_index()
+    if index is not None:
+        block_group_geoid = index.lookup(lat, lon)
+        if block_group_geoid:
+            return block_group_geoid
 
+    return client.block_group_for_point(lat, lon)
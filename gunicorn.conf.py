@@ -0,0 +1,32 @@
+# Gunicorn settings picked up automatically when gunicorn is started from this directory.
+import os
+
+# Threaded workers: each thread blocks on its own geocode, so a worker has at most GUNICORN_THREADS
+# lookups in flight. Nominatim's shared rate limit, not the thread count, is what bounds throughput.
+worker_class = "gthread"
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+
+
+def on_starting(server):
+    # Worker metrics snapshots (metrics.py) from a previous run would otherwise be summed in
+    metrics_dir = os.getenv("METRICS_DIR")
+    if metrics_dir and os.path.isdir(metrics_dir):
+        for name in os.listdir(metrics_dir):
+            if name.startswith("metrics-") and name.endswith(".json"):
+                os.remove(os.path.join(metrics_dir, name))
+
+
+def worker_exit(server, worker):
+    # Write any buffered meta_data counters and city rollup deltas before the worker goes away
+    from counters import meta_data_counters
+    from rollups import city_rollup_counters
+    meta_data_counters.flush()
+    city_rollup_counters.flush()
+    # Leave a final metrics snapshot so the worker's counts outlive it
+    from metrics import write_snapshot
+    write_snapshot()
+    # Last, after the flushes above have used the pool
+    from db import close_pool
+    close_pool()
@@ -0,0 +1,236 @@
+import csv
+import math
+import os
+import sys
+import time
+from mysql.connector import Error
+from db import get_connection
+from walkstore import WALKABILITY_COLUMNS, WALKSTORE_PATH, build_store, rows_from_db
+from percentiles import PERCENTILES_PATH, build_percentiles
+from nearby import NEARBY_INDEX_PATH, build_nearby_index
+from rollups import city_rollup_counters, refresh_area_rollups, refresh_city_rollups
+
+LOADER_BATCH_ROWS = int(os.getenv("LOADER_BATCH_ROWS", "5000"))  # rows per multi-row INSERT
+SHADOW_TABLE = "WalkabilityIndex_shadow"
+RETIRED_TABLE = "WalkabilityIndex_old"
+
+# EPA Smart Location Database column -> WalkabilityIndex column
+SLD_COLUMNS = {
+    "D3B_Ranked": "intersection_density",
+    "D4A_Ranked": "transit_access",
+    "D2A_Ranked": "job_housing_mix",
+    "D2B_Ranked": "population_employment_density",
+    "NatWalkInd": "NatWalkInd",
+}
+# Widths of the FIPS parts that make up a 12-digit block group GEOID
+GEOID_PARTS = (("STATEFP", 2), ("COUNTYFP", 3), ("TRACTCE", 6), ("BLKGRPCE", 1))
+SCORE_RANGE = (1, 20)  # the ranked columns and NatWalkInd all run from 1 to 20
+
+
+class InvalidRow(ValueError):
+    """
+    Raised for a CSV row that cannot be loaded.
+    """
+
+
+def parse_row(row):
+    """
+    Validates one CSV row and converts it to a WalkabilityIndex record.
+
+    Accepts either the EPA Smart Location Database layout (STATEFP/COUNTYFP/TRACTCE/
+    BLKGRPCE plus the ranked columns) or rows already in the WalkabilityIndex layout.
+
+    Args:
+        row (dict): One csv.DictReader row.
+
+    Returns:
+        tuple: (census_block, intersection_density, transit_access, job_housing_mix,
+                population_employment_density, NatWalkInd).
+
+    Raises:
+        InvalidRow: If the GEOID or a score is missing or out of range.
+    """
+    if row.get("census_block"):
+        census_block = row["census_block"].strip().zfill(12)
+        values = {column: row.get(column) for column in WALKABILITY_COLUMNS}
+    else:
+        parts = []
+        for field, width in GEOID_PARTS:
+            part = (row.get(field) or "").strip()
+            # Spreadsheet exports often drop leading zeros (and add ".0")
+            if part.endswith(".0"):
+                part = part[:-2]
+            if not part.isdigit() or len(part) > width:
+                raise InvalidRow(f"bad {field} {part!r}")
+            parts.append(part.zfill(width))
+        census_block = "".join(parts)
+        values = {column: row.get(source) for source, column in SLD_COLUMNS.items()}
+    if len(census_block) != 12 or not census_block.isdigit():
+        raise InvalidRow(f"bad census block {census_block!r}")
+
+    record = [census_block]
+    low, high = SCORE_RANGE
+    for column in WALKABILITY_COLUMNS:
+        raw = (values.get(column) or "").strip()
+        if raw == "":
+            record.append(None)
+            continue
+        try:
+            value = float(raw)
+        except ValueError:
+            raise InvalidRow(f"{column} is not a number: {raw!r}")
+        if math.isnan(value) or not low <= value <= high:
+            raise InvalidRow(f"{column} out of range: {raw!r}")
+        record.append(round(value, 2) if column == "NatWalkInd" else int(round(value)))
+    return tuple(record)
+
+
+def _insert_batch(cursor, batch):
+    values = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(batch))
+    cursor.execute(f"""
+        INSERT INTO {SHADOW_TABLE} (census_block, {", ".join(WALKABILITY_COLUMNS)})
+        VALUES {values}
+    """, [value for record in batch for value in record])
+
+
+def load_dataset(csv_path, source=None, rebuild_files=True, progress=None):
+    """
+    Loads a walkability CSV into WalkabilityIndex without downtime.
+
+    Rows are streamed and validated in chunks, bulk-inserted into a shadow table with
+    multi-row INSERTs, and the shadow table is swapped in with one atomic RENAME TABLE.
+    Afterwards the area and city rollups are rebuilt, a dataset_versions row is
+    recorded, and the installed walkability store, percentile tables and nearby index
+    are rebuilt so workers pick up the new version.
+
+    Args:
+        csv_path (str): Path to the EPA Smart Location Database CSV (or a WalkabilityIndex-shaped CSV).
+        source (str): Label recorded with the dataset version; defaults to the file name.
+        rebuild_files (bool): Rebuild the derived files that are already installed.
+        progress (callable): Called with (rows loaded, rows rejected) after every batch.
+
+    Returns:
+        dict: rows, rejected, duplicates, seconds, rows_per_sec and version, or None if the load failed.
+    """
+    started = time.perf_counter()
+    loaded = rejected = duplicates = 0
+    seen = set()
+    city_rollup_counters.flush()  # the city rollup rebuild below already counts these searches
+    try:
+        with get_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(f"DROP TABLE IF EXISTS {SHADOW_TABLE}")
+                cursor.execute(f"CREATE TABLE {SHADOW_TABLE} LIKE WalkabilityIndex")
+                # Blocks are de-duplicated below, so InnoDB can skip its own unique checks during the bulk load
+                cursor.execute("SET SESSION unique_checks = 0")
+                batch = []
+                with open(csv_path, newline="", encoding="utf-8-sig") as f:
+                    for line_number, row in enumerate(csv.DictReader(f), start=2):
+                        try:
+                            record = parse_row(row)
+                        except InvalidRow as e:
+                            rejected += 1
+                            if rejected <= 10:
+                                print(f"Skipping line {line_number}: {e}")
+                            continue
+                        if record[0] in seen:
+                            duplicates += 1
+                            continue
+                        seen.add(record[0])
+                        batch.append(record)
+                        if len(batch) >= LOADER_BATCH_ROWS:
+                            _insert_batch(cursor, batch)
+                            connection.commit()
+                            loaded += len(batch)
+                            batch = []
+                            if progress:
+                                progress(loaded, rejected)
+                if batch:
+                    _insert_batch(cursor, batch)
+                    connection.commit()
+                    loaded += len(batch)
+                    if progress:
+                        progress(loaded, rejected)
+                if loaded == 0:
+                    cursor.execute(f"DROP TABLE {SHADOW_TABLE}")
+                    print(f"No valid rows in {csv_path}; WalkabilityIndex left unchanged")
+                    return None
+
+                # Both renames happen atomically: readers see the old table or the new one, never neither
+                cursor.execute(f"DROP TABLE IF EXISTS {RETIRED_TABLE}")
+                cursor.execute(f"RENAME TABLE WalkabilityIndex TO {RETIRED_TABLE}, {SHADOW_TABLE} TO WalkabilityIndex")
+                cursor.execute(f"DROP TABLE {RETIRED_TABLE}")
+
+                version = int(time.time())
+                connection.start_transaction()
+                refresh_area_rollups(cursor)
+                refresh_city_rollups(cursor)
+                cursor.execute("""
+                    INSERT INTO dataset_versions (version, source, row_count, rejected_count)
+                    VALUES (%s, %s, %s, %s)
+                """, (version, source or os.path.basename(csv_path), loaded, rejected))
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                try:
+                    # The connection goes back to the pool, so the bulk-load setting must not outlive this load;
+                    # if it cannot be restored, the Error makes get_connection discard the connection instead
+                    cursor.execute("SET SESSION unique_checks = 1")
+                finally:
+                    cursor.close()
+    except Error as e:
+        print(f"Error loading walkability dataset: {str(e)}")
+        return None
+    except (OSError, csv.Error, ValueError) as e:
+        # Unreadable file, bad encoding or a malformed CSV: the shadow table is dropped by the next load
+        print(f"Error reading walkability dataset {csv_path}: {str(e)}")
+        return None
+
+    seconds = time.perf_counter() - started
+    if rebuild_files:
+        _rebuild_files(version)
+    stats = {"rows": loaded, "rejected": rejected, "duplicates": duplicates, "seconds": round(seconds, 2),
+             "rows_per_sec": round(loaded / seconds) if seconds else loaded, "version": version}
+    print(f"Loaded {loaded} block groups in {stats['seconds']}s ({stats['rows_per_sec']} rows/sec), "
+          f"{rejected} rejected, {duplicates} duplicates, dataset version {version}")
+    return stats
+
+
+def _rebuild_files(version):
+    # Keep the memory-mapped copies in step with the table; workers remap them on their next check
+    if os.path.exists(WALKSTORE_PATH):
+        build_store(rows_from_db(), WALKSTORE_PATH, dataset_version=version)
+    if os.path.exists(PERCENTILES_PATH):
+        build_percentiles(rows_from_db(), PERCENTILES_PATH, dataset_version=version)
+    if os.path.exists(NEARBY_INDEX_PATH):
+        try:
+            build_nearby_index(rows_from_db(), NEARBY_INDEX_PATH, dataset_version=version)
+        except ValueError as e:
+            print(f"Error rebuilding nearby index: {e}")
+
+
+def current_dataset_version():
+    """
+    Returns the version number of the most recently loaded dataset, or None if none was recorded.
+    """
+    try:
+        with get_connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("SELECT MAX(version) FROM dataset_versions")
+            row = cursor.fetchone()
+            cursor.close()
+        return row[0] if row else None
+    except Error as e:
+        print(f"Error reading dataset version: {str(e)}")
+        return None
+
+
+if __name__ == "__main__":
+    # Usage: python loader.py SLD_CSV
+    if len(sys.argv) != 2:
+        print("Usage: python loader.py EPA_SmartLocationDatabase.csv")
+        sys.exit(1)
+    sys.exit(0 if load_dataset(sys.argv[1], progress=lambda rows, rejected: print(f"{rows} rows loaded", end="\r")) else 1)
@@ -1,8 +1,10 @@
+import os
+import threading
 from rich.console import Console
 from prompt_toolkit.application import Application
 from prompt_toolkit.key_binding import KeyBindings
 from prompt_toolkit.layout import Layout, HSplit
-from prompt_toolkit.widgets import Box, Frame, Label, RadioList, Button
+from prompt_toolkit.widgets import Box, Frame, Label, RadioList, Button, TextArea
 from prompt_toolkit.styles import Style
 from prompt_toolkit.layout.controls import FormattedTextControl
 from prompt_toolkit.layout.containers import Window
@@ -76,8 +78,19 @@ class WalkdataCLI:
         self.app.invalidate()
 
     def _show_view_screen(self):
+        # Rankings are read from the rollup tables, so this is a few small indexed queries
+        from rollups import top_areas, top_cities
+        lines = ["Most walkable states (average NatWalkInd):"]
+        lines += [f"  {i}. {area['name']:<28} {area['avg_score']:6.2f}" for i, area in enumerate(top_areas("state", 10), 1)]
+        lines.append("Most walkable counties:")
+        lines += [f"  {i}. {area['name']:<28} {area['avg_score']:6.2f}" for i, area in enumerate(top_areas("county", 10), 1)]
+        lines.append("Most walkable cities among saved searches:")
+        lines += [f"  {i}. {city['city'] + ', ' + city['state']:<28} {city['avg_score']:6.2f}" for i, city in enumerate(top_cities(10), 1)]
+        if len(lines) == 3:
+            lines.append("No rollups yet. Load the dataset or run `python rollups.py refresh`.")
         new_body = HSplit([
-            Label(text="📍 View Walkable Cities - Coming Soon!", style="bold"),
+            Label(text="📍 View Walkable Cities", style="bold"),
+            Label(text="\n".join(lines)),
             Button(text="Back to Main Menu", handler=lambda: self._set_body(self.body)),
         ])
         self._set_body(new_body)
@@ -90,11 +103,42 @@ class WalkdataCLI:
         self._set_body(new_body)
 
     def _show_load_screen(self):
+        path_input = TextArea(text=os.getenv("WALKABILITY_CSV", "EPA_SmartLocationDatabase.csv"), multiline=False)
+        status = Label(text="Enter the path to the EPA Smart Location Database CSV.")
+
+        def set_status(text):
+            status.text = text
+            self.app.invalidate()
+
+        def load():
+            # The loader streams into a shadow table and swaps it in, so the web app keeps serving meanwhile
+            from loader import load_dataset
+            path = path_input.text.strip()
+            if not os.path.exists(path):
+                set_status(f"File not found: {path}")
+                return
+            set_status("📦 Loading...")
+            try:
+                stats = load_dataset(path, progress=lambda rows, rejected: set_status(f"📦 Loading... {rows} rows ({rejected} rejected)"))
+            except Exception as e:
+                # Anything the loader did not handle would otherwise end this thread with the status stuck at "Loading..."
+                print(f"Error loading walkability dataset: {str(e)}")
+                stats = None
+            if stats is None:
+                set_status("Load failed; WalkabilityIndex was left unchanged. See the console for details.")
+            else:
+                set_status(f"📦 Loaded {stats['rows']} block groups in {stats['seconds']}s "
+                           f"({stats['rows_per_sec']} rows/sec), {stats['rejected']} rejected. Version {stats['version']}.")
+
         new_body = HSplit([
-            Label(text="📦 Loading Sample Data... Done!", style="bold"),
+            Label(text="📦 Load Sample Data", style="bold"),
+            path_input,
+            status,
+            Button(text="Load", handler=lambda: threading.Thread(target=load, daemon=True).start()),
             Button(text="Back to Main Menu", handler=lambda: self._set_body(self.body)),
         ])
         self._set_body(new_body)
+        self.app.layout.focus(path_input)
 
     def run(self):
         self.app.run()
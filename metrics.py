@@ -0,0 +1,406 @@
+import bisect
+import glob
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from flask import Response, g, request
+
+# Latency buckets in seconds, from a cached lookup up to a slow geocode
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# When set, each worker writes its metrics here and /metrics reports the sum over all workers
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "10"))  # seconds between worker snapshots
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # optional bearer token required by /metrics
+METRICS_MAX_STATEMENTS = int(os.getenv("METRICS_MAX_STATEMENTS", "200"))  # distinct SQL labels before "other"
+SQL_LOG_SAMPLE_RATE = float(os.getenv("SQL_LOG_SAMPLE_RATE", "0.01"))  # share of queries logged
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "250"))  # slower queries are always logged
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+log = logging.getLogger("walkability")
+sql_log = logging.getLogger("walkability.sql")
+
+_registry = []  # every Histogram, in creation order
+
+
+class Histogram:
+    """
+    A labelled latency histogram rendered in the Prometheus text format.
+
+    Label values are passed positionally, in the order of labelnames. Observing
+    costs one bisect and one short locked update.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [count per bucket..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        """
+        Records one observation (in seconds) for the given label values.
+        """
+        index = bisect.bisect_left(self.buckets, value)  # first bucket whose bound is >= value
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        """
+        Context manager that observes the wall time of its block.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def collect(self):
+        """
+        Returns the histogram as a metric family dictionary (see render()).
+        """
+        with self._lock:
+            series = [[list(labels), [values[:-1], values[-1]]] for labels, values in self._series.items()]
+        return {"name": self.name, "type": "histogram", "help": self.documentation,
+                "labelnames": list(self.labelnames), "buckets": list(self.buckets), "series": series}
+
+
+http_request_seconds = Histogram("walkability_http_request_seconds", "Time spent handling HTTP requests.",
+                                 ("endpoint", "method", "status"))
+stage_seconds = Histogram("walkability_stage_seconds", "Time spent in each stage of a lookup or save.",
+                          ("operation", "stage"))
+db_query_seconds = Histogram("walkability_db_query_seconds", "execute_query() time by normalized statement.",
+                             ("statement", "status"))
+db_pool_wait_seconds = Histogram("walkability_db_pool_wait_seconds", "Time spent waiting for a pooled connection.")
+
+
+def timed(operation, stage):
+    """
+    Times one stage of an operation, e.g. with timed("lookup", "geocode"): ...
+    """
+    return stage_seconds.time(operation, stage)
+
+
+_SQL_STRING = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_SQL_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_SQL_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_SQL_TUPLE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SQL_TUPLES = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_statements = set()
+_statements_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(query):
+    """
+    Reduces a statement to its shape for use as a metric label.
+
+    Whitespace is collapsed, literals and placeholders become ?, and IN lists and
+    multi-row VALUES lists become (...), so the same query with different arguments
+    or batch sizes maps to one label.
+
+    Args:
+        query (str): The SQL text.
+
+    Returns:
+        str: The normalized statement, at most 200 characters.
+    """
+    normalized = " ".join(query.split())
+    normalized = _SQL_STRING.sub("?", normalized)
+    normalized = _SQL_PLACEHOLDER.sub("?", normalized)
+    normalized = _SQL_NUMBER.sub("?", normalized)
+    normalized = _SQL_TUPLE.sub("(...)", normalized)
+    normalized = _SQL_TUPLES.sub("(...)", normalized)
+    return normalized[:200]
+
+
+def _statement_label(query):
+    statement = normalize_sql(query)
+    if statement in _statements:
+        return statement
+    # Queries built with f-strings could otherwise grow the label set without bound
+    with _statements_lock:
+        if len(_statements) >= METRICS_MAX_STATEMENTS:
+            return "other"
+        _statements.add(statement)
+    return statement
+
+
+def record_query(query, started, acquired, status, rows=None):
+    """
+    Records one execute_query() call and logs a sample of them.
+
+    Every query is timed into the histograms. A SQL_LOG_SAMPLE_RATE share of queries,
+    plus every failed query and every query slower than SQL_SLOW_QUERY_MS, is logged as
+    one JSON line on the "walkability.sql" logger. Parameters are never logged.
+
+    Args:
+        query (str): The SQL text.
+        started (float): perf_counter() before the connection was requested.
+        acquired (float): perf_counter() once a connection was checked out, or None if that failed.
+        status (str): "ok" or "error".
+        rows (int): Rows returned, if known.
+    """
+    now = time.perf_counter()
+    statement = _statement_label(query)
+    if acquired is not None:
+        db_pool_wait_seconds.observe(acquired - started)
+    duration = now - (acquired if acquired is not None else started)
+    db_query_seconds.observe(duration, statement, status)
+    slow = duration * 1000 >= SQL_SLOW_QUERY_MS
+    if slow or status != "ok" or random.random() < SQL_LOG_SAMPLE_RATE:
+        sql_log.log(logging.WARNING if slow or status != "ok" else logging.INFO, json.dumps({
+            "event": "sql",
+            "statement": normalize_sql(query),
+            "status": status,
+            "duration_ms": round(duration * 1000, 3),
+            "pool_wait_ms": round((acquired - started) * 1000, 3) if acquired is not None else None,
+            "rows": rows,
+            "slow": slow,
+            "sampled": not (slow or status != "ok"),
+        }))
+
+
+def _family(name, kind, documentation, labelnames, series):
+    return {"name": name, "type": kind, "help": documentation, "labelnames": list(labelnames), "series": series}
+
+
+def _runtime_families():
+    # Imported here: these modules (indirectly) import this one
+    from cache import named_caches
+    from db import get_pool
+    from geoclient import LATENCY_BUCKETS, metrics as upstream_metrics
+    from geocache import get_geocode_cache
+
+    pool = get_pool()
+    families = [
+        _family("walkability_db_pool_in_use", "gauge", "Pooled connections checked out.", (),
+                [[[], pool.stats["in_use"]]]),
+        _family("walkability_db_pool_events_total", "counter", "Connection pool events.", ("event",),
+                [[[event], pool.stats[event]] for event in ("created", "reused", "evicted", "timeouts")]),
+    ]
+    geocode_stats = get_geocode_cache().stats  # first, so its memory tier is among the named caches
+    caches = sorted(named_caches.items())
+    families.append(_family("walkability_cache_entries", "gauge", "Entries held by each in-process cache.", ("cache",),
+                            [[[name], len(cache)] for name, cache in caches]))
+    families.append(_family("walkability_cache_requests_total", "counter", "In-process cache lookups.",
+                            ("cache", "result"),
+                            [[[name, result], cache.stats[key]] for name, cache in caches
+                             for result, key in (("hit", "hits"), ("miss", "misses"))]))
+    families.append(_family("walkability_cache_evictions_total", "counter", "In-process cache LRU evictions.",
+                            ("cache",), [[[name], cache.stats["evictions"]] for name, cache in caches]))
+    families.append(_family("walkability_geocode_cache_lookups_total", "counter", "Geocode cache lookups by tier.",
+                            ("result",), [[[result], geocode_stats[result]]
+                                          for result in ("memory_hits", "disk_hits", "misses", "negative_hits")]))
+
+    upstreams = {name: upstream.snapshot() for name, upstream in sorted(upstream_metrics.items())}
+    families.append({"name": "walkability_upstream_request_seconds", "type": "histogram",
+                     "help": "Geocoding upstream request latency (Nominatim, Census).",
+                     "labelnames": ["upstream"], "buckets": list(LATENCY_BUCKETS),
+                     "series": [[[name], [list(snapshot["latency_buckets"].values()), snapshot["latency_sum"]]]
+                                for name, snapshot in upstreams.items()]})
+    families.append(_family("walkability_upstream_errors_total", "counter", "Failed geocoding upstream requests.",
+                            ("upstream",), [[[name], snapshot["errors"]] for name, snapshot in upstreams.items()]))
+    families.append(_family("walkability_upstream_rejected_total", "counter",
+                            "Geocoding calls short-circuited by an open circuit breaker.",
+                            ("upstream",), [[[name], snapshot["rejected"]] for name, snapshot in upstreams.items()]))
+    return families
+
+
+def collect():
+    """
+    Returns every metric family of this process.
+    """
+    families = [histogram.collect() for histogram in _registry]
+    try:
+        families.extend(_runtime_families())
+    except Exception as e:
+        print(f"Error collecting runtime metrics: {str(e)}")
+    return families
+
+
+def _snapshot_path(pid):
+    return os.path.join(METRICS_DIR, f"metrics-{pid}.json")
+
+
+def write_snapshot():
+    """
+    Writes this worker's metrics to METRICS_DIR so any worker can report them.
+    """
+    if not METRICS_DIR:
+        return
+    path = _snapshot_path(os.getpid())
+    tmp_path = f"{path}.tmp"
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        with open(tmp_path, "w") as f:
+            json.dump(collect(), f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Error writing metrics snapshot: {str(e)}")
+
+
+def _merge(snapshots):
+    # Sum every series over the workers; gauges only count workers that reported recently
+    merged = {}
+    for families, fresh in snapshots:
+        for family in families:
+            if family["type"] == "gauge" and not fresh:
+                continue
+            target = merged.setdefault(family["name"], dict(family, series={}))
+            for labels, value in family["series"]:
+                key = tuple(labels)
+                if family["type"] == "histogram":
+                    counts, total = target["series"].get(key, ([0] * len(value[0]), 0.0))
+                    target["series"][key] = ([a + b for a, b in zip(counts, value[0])], total + value[1])
+                else:
+                    target["series"][key] = target["series"].get(key, 0) + value
+    for family in merged.values():
+        family["series"] = [[list(key), list(value) if family["type"] == "histogram" else value]
+                            for key, value in sorted(family["series"].items())]
+    return list(merged.values())
+
+
+def gather():
+    """
+    Returns the metric families to report: this process's, or all workers' when METRICS_DIR is set.
+    """
+    if not METRICS_DIR:
+        return collect()
+    write_snapshot()
+    snapshots = []
+    now = time.time()
+    for path in glob.glob(os.path.join(METRICS_DIR, "metrics-*.json")):
+        try:
+            fresh = now - os.path.getmtime(path) <= 3 * METRICS_FLUSH_INTERVAL
+            with open(path) as f:
+                snapshots.append((json.load(f), fresh))
+        except (OSError, ValueError) as e:
+            print(f"Error reading metrics snapshot {path}: {str(e)}")
+    return _merge(snapshots)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def render(families):
+    """
+    Formats metric families in the Prometheus text exposition format (version 0.0.4).
+
+    Args:
+        families (list): Dictionaries with name, type, help, labelnames, series and,
+                         for histograms, buckets. Histogram series values are
+                         [non-cumulative counts including +Inf, sum].
+
+    Returns:
+        str: The exposition text.
+    """
+    lines = []
+    for family in families:
+        name = family["name"]
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for labels, value in family["series"]:
+            pairs = list(zip(family["labelnames"], labels))
+            if family["type"] != "histogram":
+                lines.append(f"{name}{_labels(pairs)} {value}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip([str(bound) for bound in family["buckets"]] + ["+Inf"], counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(pairs + [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_labels(pairs)} {total}")
+            lines.append(f"{name}_count{_labels(pairs)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+class _SnapshotWriter:
+    # Background thread that keeps this worker's snapshot file current (restarted after a fork)
+    def __init__(self):
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if not METRICS_DIR or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name="metrics-writer", daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            write_snapshot()
+
+
+_snapshot_writer = _SnapshotWriter()
+
+
+def configure_logging():
+    """
+    Sends the "walkability" loggers to stderr at LOG_LEVEL, unless logging is already configured.
+    """
+    if log.handlers:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    log.addHandler(handler)
+    log.setLevel(LOG_LEVEL)
+
+
+def init_app(app):
+    """
+    Times every request and adds the /metrics endpoint to a Flask app.
+
+    Args:
+        app (Flask): The application.
+    """
+    configure_logging()
+
+    @app.before_request
+    def _start_timer():
+        _snapshot_writer.ensure_started()
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            # Unmatched URLs share one label so scanners can't grow the series count
+            http_request_seconds.observe(time.perf_counter() - started, request.endpoint or "unmatched",
+                                         request.method, str(response.status_code))
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics_endpoint():
+        """
+        Prometheus scrape endpoint.
+        """
+        if METRICS_TOKEN:
+            supplied = request.headers.get("Authorization", "")
+            if not hmac.compare_digest(supplied.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+                return Response("Unauthorized\n", status=401, mimetype="text/plain")
+        return Response(render(gather()), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,314 @@
+import csv
+import heapq
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from blockgroups import get_block_group_index
+from walkstore import WALKABILITY_COLUMNS
+
+NEARBY_INDEX_PATH = os.getenv("NEARBY_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "nearby.nbix"))
+NEARBY_RELOAD_INTERVAL = float(os.getenv("NEARBY_RELOAD_INTERVAL", "30"))  # seconds between file checks
+NEARBY_CELL_SIZE = float(os.getenv("NEARBY_CELL_SIZE", "0.1"))  # degrees
+NEARBY_MAX_RADIUS_KM = float(os.getenv("NEARBY_MAX_RADIUS_KM", "50"))
+NEARBY_MAX_RESULTS = int(os.getenv("NEARBY_MAX_RESULTS", "50"))
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+_MAGIC = b"NBIX"
+_FORMAT_VERSION = 1
+# magic, format version, dataset version, points, columns, grid columns, grid rows,
+# length of the column-name block, min lon, min lat, cell size
+_HEADER = struct.Struct("<4sIqIIIIIddd")
+GEOID_LENGTH = 12
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance between two points in kilometres.
+    """
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def build_nearby_index(rows, out_path, block_groups=None, columns=WALKABILITY_COLUMNS, cell_size=NEARBY_CELL_SIZE,
+                       dataset_version=None):
+    """
+    Writes a memory-mappable grid of block group centroids joined to their walkability scores.
+
+    Centroids come from the block group index (blockgroups.py). Points are sorted by
+    grid cell so each cell is one contiguous slice, and a sorted GEOID array lets a
+    query start from a census block.
+
+    Args:
+        rows (iterable): Dictionaries with a census_block key and one key per column.
+        out_path (str): Where to write the index.
+        block_groups (BlockGroupIndex): Source of polygons; defaults to the installed index.
+        columns (list): Column names to include.
+        cell_size (float): Grid cell size in degrees.
+        dataset_version (int): Version stamp; defaults to the current Unix time.
+
+    Returns:
+        int: The number of block groups written.
+    """
+    block_groups = block_groups or get_block_group_index()
+    if block_groups is None:
+        raise ValueError("A block group index is required; build one with blockgroups.py first.")
+    scores = {}
+    for row in rows:
+        block = str(row["census_block"]).strip()
+        if block.isdigit():
+            scores[block.zfill(GEOID_LENGTH)] = [
+                float(row[c]) if row.get(c) not in (None, "") else math.nan for c in columns
+            ]
+
+    points = []  # (lat, lon, geoid, scores)
+    for feature in range(block_groups.n_features):
+        geoid = block_groups.geoid(feature)
+        values = scores.get(geoid)
+        if values is not None:
+            lat, lon = block_groups.centroid(feature)
+            points.append((lat, lon, geoid, values))
+    if not points:
+        raise ValueError("No block group in the index has walkability scores.")
+
+    min_x = min(p[1] for p in points)
+    min_y = min(p[0] for p in points)
+    cols = int((max(p[1] for p in points) - min_x) / cell_size) + 1
+    grid_rows = int((max(p[0] for p in points) - min_y) / cell_size) + 1
+
+    def cell_of(p):
+        return int((p[0] - min_y) / cell_size) * cols + int((p[1] - min_x) / cell_size)
+
+    points.sort(key=cell_of)
+    cell_offsets = array("I", [0] * (cols * grid_rows + 1))
+    for p in points:
+        cell_offsets[cell_of(p) + 1] += 1
+    for i in range(1, len(cell_offsets)):
+        cell_offsets[i] += cell_offsets[i - 1]
+
+    lats = array("d", (p[0] for p in points))
+    lons = array("d", (p[1] for p in points))
+    data = [array("d", (p[3][c] for p in points)) for c in range(len(columns))]
+    by_geoid = sorted(range(len(points)), key=lambda i: points[i][2])
+    geoid_keys = array("q", (int(points[i][2]) for i in by_geoid))
+    geoid_rows = array("I", by_geoid)
+
+    names = ",".join(columns).encode("ascii")
+    names += b"\0" * (-len(names) % 8)
+    version = int(time.time()) if dataset_version is None else dataset_version
+    tmp_path = out_path + ".tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, version, len(points), len(columns), cols, grid_rows,
+                             len(names), min_x, min_y, cell_size))
+        f.write(b"\0" * (-_HEADER.size % 8))
+        f.write(names)
+        lats.tofile(f)
+        lons.tofile(f)
+        for values in data:
+            values.tofile(f)
+        geoid_keys.tofile(f)
+        geoid_rows.tofile(f)
+        cell_offsets.tofile(f)
+        f.write(b"".join(p[2].encode("ascii") for p in points))
+    # Atomic replace so running workers never map a half-written file
+    os.replace(tmp_path, out_path)
+    return len(points)
+
+
+class NearbyIndex:
+    """
+    Read-only, memory-mapped centroid grid built by build_nearby_index().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._stat = os.fstat(f.fileno())
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, fmt, self.dataset_version, self.n_points, n_columns, self.cols, self.rows, names_len,
+         self.min_x, self.min_y, self.cell_size) = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or fmt != _FORMAT_VERSION:
+            raise ValueError(f"{path} is not a nearby index (format {_FORMAT_VERSION}).")
+        view = memoryview(self._mm)
+        offset = _HEADER.size + (-_HEADER.size % 8)
+        self.columns = bytes(self._mm[offset:offset + names_len]).rstrip(b"\0").decode("ascii").split(",")
+        offset += names_len
+
+        def take(count, fmt, size):
+            nonlocal offset
+            section = view[offset:offset + count * size].cast(fmt)
+            offset += count * size
+            return section
+
+        self._lats = take(self.n_points, "d", 8)
+        self._lons = take(self.n_points, "d", 8)
+        self._data = {column: take(self.n_points, "d", 8) for column in self.columns}
+        self._geoid_keys = take(self.n_points, "q", 8)
+        self._geoid_rows = take(self.n_points, "I", 4)
+        self._cell_offsets = take(self.cols * self.rows + 1, "I", 4)
+        self._geoids = view[offset:offset + GEOID_LENGTH * self.n_points]
+
+    def _geoid(self, row):
+        return bytes(self._geoids[GEOID_LENGTH * row:GEOID_LENGTH * (row + 1)]).decode("ascii")
+
+    def _row(self, census_block):
+        try:
+            key = int(census_block)
+        except (TypeError, ValueError):
+            return None
+        i = bisect_left(self._geoid_keys, key)
+        if i < self.n_points and self._geoid_keys[i] == key:
+            return self._geoid_rows[i]
+        return None
+
+    def locate(self, census_block):
+        """
+        Returns the centroid and scores of a block group.
+
+        Returns:
+            dict: {"census_block", "lat", "lon", "scores"}, or None if the block group is not indexed.
+        """
+        row = self._row(census_block)
+        if row is None:
+            return None
+        return self._point(row)
+
+    def _point(self, row):
+        scores = {}
+        for column, data in self._data.items():
+            value = data[row]
+            scores[column] = None if math.isnan(value) else value
+        return {"census_block": self._geoid(row), "lat": self._lats[row], "lon": self._lons[row], "scores": scores}
+
+    def nearest(self, lat, lon, k=10, radius_km=5.0, attribute="NatWalkInd", min_score=None, exclude=None):
+        """
+        Finds the k nearest block groups within a radius whose score is above a threshold.
+
+        Only the grid cells overlapping the radius are scanned, and the cheap
+        equirectangular distance prunes points before the exact haversine check.
+
+        Args:
+            lat (float): Latitude of the origin.
+            lon (float): Longitude of the origin.
+            k (int): Maximum number of results.
+            radius_km (float): Search radius in kilometres.
+            attribute (str): Walkability column to filter on.
+            min_score (float): Only block groups scoring strictly above this are returned.
+            exclude (str): A census block to leave out (usually the origin).
+
+        Returns:
+            list: Dictionaries with census_block, lat, lon, distance_km and scores, nearest first.
+                  Empty if the origin is not a finite point or the radius misses the grid.
+        """
+        scores = self._data.get(attribute)
+        if scores is None:
+            raise ValueError(f"Unknown attribute: {attribute}")
+        if not (math.isfinite(lat) and math.isfinite(lon) and math.isfinite(radius_km)):
+            return []
+        dlat = radius_km / KM_PER_DEGREE
+        dlon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+        row_lo = max(0, int((lat - dlat - self.min_y) / self.cell_size))
+        row_hi = min(self.rows - 1, int((lat + dlat - self.min_y) / self.cell_size))
+        col_lo = max(0, int((lon - dlon - self.min_x) / self.cell_size))
+        col_hi = min(self.cols - 1, int((lon + dlon - self.min_x) / self.cell_size))
+        if row_lo > row_hi or col_lo > col_hi:
+            return []  # the search area lies entirely outside the grid
+        exclude_row = self._row(exclude) if exclude else None
+
+        cos_lat = math.cos(math.radians(lat))
+        limit = (radius_km / KM_PER_DEGREE) ** 2
+        lats, lons, offsets = self._lats, self._lons, self._cell_offsets
+        candidates = []
+        for row in range(row_lo, row_hi + 1):
+            base = row * self.cols
+            # Cells in one grid row are adjacent, so the whole column span is one slice
+            for i in range(offsets[base + col_lo], offsets[base + col_hi + 1]):
+                score = scores[i]
+                if math.isnan(score) or (min_score is not None and score <= min_score) or i == exclude_row:
+                    continue
+                y = lats[i] - lat
+                x = (lons[i] - lon) * cos_lat
+                if x * x + y * y <= limit * 1.01:
+                    candidates.append(i)
+
+        results = []
+        for i in candidates:
+            distance = haversine_km(lat, lon, lats[i], lons[i])
+            if distance <= radius_km:
+                results.append((distance, i))
+        nearest = []
+        for distance, i in heapq.nsmallest(k, results):
+            point = self._point(i)
+            point["distance_km"] = round(distance, 3)
+            nearest.append(point)
+        return nearest
+
+    def is_stale(self):
+        """
+        Returns True if the file on disk has been replaced since this index was opened.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns) != (self._stat.st_ino, self._stat.st_mtime_ns)
+
+    def __len__(self):
+        return self.n_points
+
+
+_nearby = None
+_nearby_checked_at = 0.0
+_nearby_lock = threading.Lock()
+
+
+def get_nearby_index():
+    """
+    Returns the shared nearby index, or None if none has been built.
+
+    The file is re-checked every NEARBY_RELOAD_INTERVAL seconds and remapped when it
+    has been replaced.
+
+    Returns:
+        NearbyIndex: The memory-mapped index, or None.
+    """
+    global _nearby, _nearby_checked_at
+    now = time.monotonic()
+    if now - _nearby_checked_at < NEARBY_RELOAD_INTERVAL:
+        return _nearby
+    with _nearby_lock:
+        if now - _nearby_checked_at < NEARBY_RELOAD_INTERVAL:
+            return _nearby
+        _nearby_checked_at = now
+        if _nearby is None or _nearby.is_stale():
+            if os.path.exists(NEARBY_INDEX_PATH):
+                try:
+                    _nearby = NearbyIndex(NEARBY_INDEX_PATH)
+                except (OSError, ValueError) as e:
+                    print(f"Error loading nearby index: {e}")
+            else:
+                _nearby = None
+    return _nearby
+
+
+if __name__ == "__main__":
+    # Usage: python nearby.py OUT_PATH [walkability_index.csv]
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python nearby.py OUT_PATH [walkability_index.csv]   (reads the database when no CSV is given)")
+        sys.exit(1)
+    if len(sys.argv) == 3:
+        with open(sys.argv[2], newline="") as f:
+            count = build_nearby_index(csv.DictReader(f), sys.argv[1])
+    else:
+        from walkstore import rows_from_db
+        count = build_nearby_index(rows_from_db(), sys.argv[1])
+    print(f"Indexed {count} block group centroids into {sys.argv[1]}")
@@ -0,0 +1,140 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+
+# bcrypt work factor for new hashes; stored hashes with a lower cost are upgraded on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Hashing runs in a small process pool so a burst of logins cannot starve request threads.
+# PASSWORD_WORKERS=0 hashes inline on the calling thread (handy for `flask run`).
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2"))
+PASSWORD_MAX_PENDING = int(os.getenv("PASSWORD_MAX_PENDING", str(max(PASSWORD_WORKERS, 1) * 4)))
+PASSWORD_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_QUEUE_TIMEOUT", "5"))  # seconds to wait for a free slot
+PASSWORD_TIMEOUT = float(os.getenv("PASSWORD_TIMEOUT", "30"))  # seconds to wait for one hash
+
+
+class PasswordPoolBusy(Exception):
+    """
+    Raised when too many password operations are already queued.
+    """
+
+
+def hash_cost(hashed):
+    """
+    Returns the work factor encoded in a bcrypt hash ("$2b$12$..." -> 12), or 0 if unreadable.
+    """
+    try:
+        return int(hashed.split(b"$")[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _check(password, hashed, rounds):
+    # Runs in a pool process. On success, also produce the upgraded hash so the
+    # rehash costs no extra round trip to the pool.
+    if not bcrypt.checkpw(password, hashed):
+        return False, None
+    if hash_cost(hashed) < rounds:
+        return True, bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+    return True, None
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a bounded process pool.
+
+    At most PASSWORD_MAX_PENDING operations may be queued or running; further callers
+    wait up to PASSWORD_QUEUE_TIMEOUT seconds for a slot and then get PasswordPoolBusy,
+    so a login storm is shed instead of piling up behind the pool. A caller whose
+    operation takes longer than PASSWORD_TIMEOUT also gets PasswordPoolBusy.
+    """
+
+    def __init__(self, workers=PASSWORD_WORKERS, max_pending=PASSWORD_MAX_PENDING, rounds=BCRYPT_ROUNDS):
+        self.rounds = rounds
+        self.workers = workers
+        # spawn: the pool is created from a threaded gunicorn worker, where fork is unsafe
+        self._executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) if workers else None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.stats = {"hashed": 0, "checked": 0, "rehashed": 0, "rejected": 0}
+
+    def _run(self, function, *args):
+        if self._executor is None:
+            return function(*args)
+        if not self._slots.acquire(timeout=PASSWORD_QUEUE_TIMEOUT):
+            self.stats["rejected"] += 1
+            raise PasswordPoolBusy("Too many logins in progress. Please try again in a moment.")
+        try:
+            future = self._executor.submit(function, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the job actually finishes, not just until this caller stops waiting
+        future.add_done_callback(lambda done: self._slots.release())
+        try:
+            return future.result(PASSWORD_TIMEOUT)
+        except TimeoutError as e:
+            future.cancel()  # only takes effect while the job is still queued
+            self.stats["rejected"] += 1
+            raise PasswordPoolBusy("Password check took too long. Please try again in a moment.") from e
+
+    def hash(self, password):
+        """
+        Hashes a plain text password at the configured cost.
+
+        Returns:
+            bytes: The bcrypt hash.
+        """
+        hashed = self._run(_hash, password.encode("utf-8"), self.rounds)
+        self.stats["hashed"] += 1
+        return hashed
+
+    def check(self, password, hashed):
+        """
+        Verifies a password against a stored hash.
+
+        Args:
+            password (str): The plain text password.
+            hashed (str or bytes): The stored bcrypt hash.
+
+        Returns:
+            tuple: (valid, new_hash). new_hash is a re-hash at the configured cost when
+                   the password is valid but the stored hash used a lower cost, else None.
+        """
+        if isinstance(hashed, str):
+            hashed = hashed.encode("utf-8")
+        valid, new_hash = self._run(_check, password.encode("utf-8"), hashed, self.rounds)
+        self.stats["checked"] += 1
+        if new_hash is not None:
+            self.stats["rehashed"] += 1
+        return valid, new_hash
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_hasher = None
+_hasher_pid = None
+_hasher_lock = threading.Lock()
+
+
+def get_password_hasher():
+    """
+    Returns this process's password hasher, recreating it after a fork.
+
+    Returns:
+        PasswordHasher: The shared hasher.
+    """
+    global _hasher, _hasher_pid
+    if _hasher is None or _hasher_pid != os.getpid():
+        with _hasher_lock:
+            if _hasher is None or _hasher_pid != os.getpid():
+                _hasher = PasswordHasher()
+                _hasher_pid = os.getpid()
+    return _hasher
@@ -0,0 +1,191 @@
+import csv
+import hashlib
+import json
+import math
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from walkstore import WALKABILITY_COLUMNS
+
+PERCENTILES_PATH = os.getenv("PERCENTILES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "percentiles.json"))
+PERCENTILES_RELOAD_INTERVAL = float(os.getenv("PERCENTILES_RELOAD_INTERVAL", "30"))  # seconds between file checks
+
+# Points per quantile table; 1000 gives 0.1 percentage point resolution
+QUANTILES = 1000
+NATIONAL = "US"
+
+
+def _quantile_table(values, quantiles=QUANTILES):
+    # values must be sorted. Keep every value for small groups, otherwise evenly spaced order statistics.
+    n = len(values)
+    if n <= quantiles + 1:
+        return list(values)
+    return [values[round(i * (n - 1) / quantiles)] for i in range(quantiles + 1)]
+
+
+def build_percentiles(rows, out_path, columns=WALKABILITY_COLUMNS, dataset_version=None, quantiles=QUANTILES):
+    """
+    Precomputes quantile tables for every walkability column, nationally and per state.
+
+    The state is the first two digits (state FIPS) of the census block. Each table is a
+    sorted list of order statistics, so a score's percentile is one binary search.
+
+    Args:
+        rows (iterable): Dictionaries with a census_block key and one key per column.
+        out_path (str): Where to write the tables (JSON).
+        columns (list): Column names to include.
+        dataset_version (int): Version stamp; defaults to the current Unix time.
+        quantiles (int): Points per table.
+
+    Returns:
+        int: The number of rows read.
+    """
+    groups = {NATIONAL: {column: [] for column in columns}}
+    count = 0
+    for row in rows:
+        block = str(row["census_block"]).strip()
+        if not block.isdigit():
+            continue
+        count += 1
+        state = block.zfill(12)[:2]
+        if state not in groups:
+            groups[state] = {column: [] for column in columns}
+        for column in columns:
+            value = row.get(column)
+            if value in (None, ""):
+                continue
+            value = float(value)
+            if math.isnan(value):
+                continue
+            groups[NATIONAL][column].append(value)
+            groups[state][column].append(value)
+
+    tables = {}
+    for scope, by_column in groups.items():
+        tables[scope] = {}
+        for column, values in by_column.items():
+            values.sort()
+            tables[scope][column] = {"count": len(values), "quantiles": _quantile_table(values, quantiles)}
+
+    version = int(time.time()) if dataset_version is None else dataset_version
+    tmp_path = out_path + ".tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(tmp_path, "w") as f:
+        json.dump({"dataset_version": version, "columns": list(columns), "tables": tables}, f, separators=(",", ":"))
+    os.replace(tmp_path, out_path)
+    return count
+
+
+class PercentileTables:
+    """
+    Percentile lookups against the tables written by build_percentiles().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._stat = os.stat(path)
+        with open(path, "rb") as f:
+            raw = f.read()
+        data = json.loads(raw)
+        # Identifies these exact tables, so response caches can key on them (same file -> same digest on every host)
+        self.digest = hashlib.sha256(raw).hexdigest()[:16]
+        self.dataset_version = data["dataset_version"]
+        self.columns = data["columns"]
+        self._tables = {
+            scope: {column: table["quantiles"] for column, table in by_column.items() if table["quantiles"]}
+            for scope, by_column in data["tables"].items()
+        }
+
+    def rank(self, key, value, scope=NATIONAL):
+        """
+        Returns the share of block groups in scope that score strictly below value.
+
+        Args:
+            key (str): The walkability attribute.
+            value (float): The score.
+            scope (str): "US" or a two-digit state FIPS code.
+
+        Returns:
+            float: A percentage between 0 and 100 (one decimal), or None if there is no table.
+        """
+        table = self._tables.get(scope, {}).get(key)
+        if table is None or value is None:
+            return None
+        return round(100.0 * bisect_left(table, float(value)) / len(table), 1)
+
+    def context(self, census_block, values):
+        """
+        Ranks every value of a block group nationally and within its state.
+
+        Args:
+            census_block (str): The 12-digit block group GEOID.
+            values (dict): Attribute -> score, as returned by the walkability lookups.
+
+        Returns:
+            dict: Attribute -> {"national": percent or None, "state": percent or None}.
+        """
+        state = str(census_block).zfill(12)[:2] if census_block else None
+        return {
+            key: {"national": self.rank(key, value), "state": self.rank(key, value, state) if state else None}
+            for key, value in values.items()
+        }
+
+    def is_stale(self):
+        """
+        Returns True if the file on disk has been replaced since the tables were loaded.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns) != (self._stat.st_ino, self._stat.st_mtime_ns)
+
+
+_tables = None
+_tables_checked_at = 0.0
+_tables_lock = threading.Lock()
+
+
+def get_percentile_tables():
+    """
+    Returns the shared percentile tables, or None if none have been built.
+
+    The file is re-checked every PERCENTILES_RELOAD_INTERVAL seconds and reloaded
+    when it has been replaced.
+
+    Returns:
+        PercentileTables: The tables, or None.
+    """
+    global _tables, _tables_checked_at
+    now = time.monotonic()
+    if now - _tables_checked_at < PERCENTILES_RELOAD_INTERVAL:
+        return _tables
+    with _tables_lock:
+        if now - _tables_checked_at < PERCENTILES_RELOAD_INTERVAL:
+            return _tables
+        _tables_checked_at = now
+        if _tables is None or _tables.is_stale():
+            if os.path.exists(PERCENTILES_PATH):
+                try:
+                    _tables = PercentileTables(PERCENTILES_PATH)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Error loading percentile tables: {e}")
+            else:
+                _tables = None
+    return _tables
+
+
+if __name__ == "__main__":
+    # Usage: python percentiles.py OUT_PATH [walkability_index.csv]
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python percentiles.py OUT_PATH [walkability_index.csv]   (reads the database when no CSV is given)")
+        sys.exit(1)
+    if len(sys.argv) == 3:
+        with open(sys.argv[2], newline="") as f:
+            count = build_percentiles(csv.DictReader(f), sys.argv[1])
+    else:
+        from walkstore import rows_from_db
+        count = build_percentiles(rows_from_db(), sys.argv[1])
+    print(f"Ranked {count} block groups into {sys.argv[1]}")
@@ -0,0 +1,161 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Token buckets live in a local SQLite file so every gunicorn worker on the host shares them
+RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ratelimit.sqlite3"))
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "30"))  # seconds a caller may queue for a token
+
+
+class RateLimitExceeded(Exception):
+    """
+    Raised when no token became available within the caller's maximum wait.
+    """
+
+
+class TokenBucket:
+    """
+    Token bucket shared between processes through a SQLite row.
+
+    Each caller reserves the next free send time inside an IMMEDIATE transaction:
+    the bucket's token count may go negative, and every token owed pushes the next
+    caller's slot back by 1/rate seconds. Callers are therefore served in the order
+    they reserved, each sleeping once until its own slot, which smooths a burst into
+    a steady stream instead of having every waiter wake and retry at the same time.
+    """
+
+    def __init__(self, name, rate, capacity=1, path=RATE_LIMIT_PATH):
+        self.name = name
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self.path = path
+        self._local = threading.local()
+        self.stats = {"acquired": 0, "waited": 0, "rejected": 0}
+        conn = self._db()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS token_buckets (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        conn.execute("INSERT OR IGNORE INTO token_buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                     (name, capacity, time.time()))
+        conn.commit()
+
+    def _db(self):
+        # sqlite3 connections cannot be shared across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def reserve(self, max_wait=RATE_LIMIT_MAX_WAIT):
+        """
+        Reserves the next token, if it is due within max_wait seconds.
+
+        Returns:
+            float: Seconds to wait before using the token (0 if one was available), or
+                   None if nothing was reserved because the wait would exceed max_wait.
+        """
+        conn = self._db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            tokens, updated_at = conn.execute(
+                "SELECT tokens, updated_at FROM token_buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            now = time.time()
+            tokens = min(self.capacity, tokens + max(0.0, now - updated_at) * self.rate) - 1
+            wait = max(0.0, -tokens / self.rate)
+            if wait > max_wait:
+                conn.execute("ROLLBACK")
+                return None
+            conn.execute("UPDATE token_buckets SET tokens = ?, updated_at = ? WHERE name = ?", (tokens, now, self.name))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def acquire(self, max_wait=RATE_LIMIT_MAX_WAIT):
+        """
+        Blocks until this caller's reserved slot comes up.
+
+        Raises:
+            RateLimitExceeded: If the next free slot is more than max_wait seconds away.
+        """
+        wait = self.reserve(max_wait)
+        if wait is None:
+            self.stats["rejected"] += 1
+            raise RateLimitExceeded(f"{self.name} rate limit queue is full")
+        self.stats["acquired"] += 1
+        if wait > 0:
+            self.stats["waited"] += 1
+            time.sleep(wait)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    The first caller runs the function; callers arriving while it is in flight wait
+    for and share its result or exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> [event, result, exception]
+        self.stats = {"executed": 0, "coalesced": 0}
+
+    def do(self, key, function, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = [threading.Event(), None, None]
+                self.stats["executed"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            call[0].wait()
+            if call[2] is not None:
+                raise call[2]
+            return call[1]
+        try:
+            call[1] = function(*args)
+            return call[1]
+        except Exception as e:
+            call[2] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call[0].set()
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(name, rate, capacity=1):
+    """
+    Returns the process's handle on a shared token bucket, creating it on first use.
+
+    Args:
+        name (str): Bucket name shared by all processes (e.g. "nominatim").
+        rate (float): Tokens added per second.
+        capacity (int): Maximum burst size.
+
+    Returns:
+        TokenBucket: The bucket.
+    """
+    bucket = _buckets.get(name)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.get(name)
+            if bucket is None:
+                bucket = _buckets[name] = TokenBucket(name, rate, capacity)
+    return bucket
@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+from mysql.connector import Error
+from db import get_connection
+from walkstore import WALKABILITY_COLUMNS
+
+# How often (seconds) a worker checks whether walkability_titles changed
+REFDATA_TTL = int(os.getenv("REFDATA_TTL", "600"))
+# Touched by refresh_reference_data(); every worker on the host compares its mtime on each request
+REFDATA_STAMP_PATH = os.getenv("REFDATA_STAMP_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "refdata.stamp"))
+
+# Score colour scale per attribute: (low, mid, high) map to red, yellow and green.
+# Attributes not listed use DEFAULT_COLOR_SCALE. The EPA ranked columns and NatWalkInd run from 1 to 20.
+DEFAULT_COLOR_SCALE = (0, 50, 100)
+RANK_COLOR_SCALE = (1, 10.5, 20)
+COLOR_SCALES = {column: RANK_COLOR_SCALE for column in WALKABILITY_COLUMNS}
+
+
+class ReferenceData:
+    """
+    Snapshot of rarely-changing lookup data used on every request.
+
+    Holds the walkability_titles display names, the whitelist of walkability columns
+    that may be used as attributes, and the score colour scales.
+    """
+
+    def __init__(self, titles=None, version=None):
+        self.titles = titles or {}
+        self.attributes = list(WALKABILITY_COLUMNS)
+        self.color_scales = dict(COLOR_SCALES)
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.stamp = _read_stamp()
+
+    def title(self, key):
+        """
+        Returns the display name for an attribute, falling back to a title-cased key.
+        """
+        return self.titles.get(key, key.replace("_", " ").title())
+
+    def is_attribute(self, key):
+        """
+        Returns True if key is a whitelisted walkability column.
+        """
+        return key in self.attributes
+
+    def score_color(self, key, score):
+        """
+        Maps a score to a CSS colour on a red -> yellow -> green scale.
+
+        Args:
+            key (str): The walkability attribute.
+            score (float): The attribute value.
+
+        Returns:
+            str: A CSS hsl() colour.
+        """
+        return _hsl(score, *self.color_scales.get(key, DEFAULT_COLOR_SCALE))
+
+    def percentile_color(self, percentile):
+        """
+        Maps a percentile rank (0-100) to a CSS colour on the same red -> yellow -> green scale.
+        """
+        return _hsl(percentile, *DEFAULT_COLOR_SCALE)
+
+
+def _hsl(score, low, mid, high):
+    score = min(max(score, low), high)
+    if score <= mid:
+        # Transition from red (hue 0) to yellow (hue 60)
+        hue = int((score - low) / (mid - low) * 60)
+    else:
+        # Transition from yellow (hue 60) to green (hue 120)
+        hue = int(60 + (score - mid) / (high - mid) * 60)
+    saturation = 70  # Keep saturation consistent for a rich color
+    lightness = 50  # Keep lightness consistent for a pleasant tone
+    return f"hsl({hue}, {saturation}%, {lightness}%)"
+
+
+def _read_stamp():
+    # One stat() call; None when no refresh has ever been requested
+    try:
+        return os.stat(REFDATA_STAMP_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _fetch_version(cursor):
+    # CHECKSUM TABLE is cheap for a small table and changes whenever any row changes
+    cursor.execute("CHECKSUM TABLE walkability_titles")
+    row = cursor.fetchone()
+    return row["Checksum"] if row else None
+
+
+def _load():
+    with get_connection() as connection:
+        cursor = connection.cursor(dictionary=True)
+        version = _fetch_version(cursor)
+        cursor.execute("SELECT key_name, display_name FROM walkability_titles")
+        titles = {row["key_name"]: row["display_name"] for row in cursor.fetchall()}
+        cursor.close()
+    return ReferenceData(titles, version)
+
+
+_current = None
+_lock = threading.Lock()
+
+
+def load_reference_data():
+    """
+    Loads reference data from the database, keeping the previous snapshot if that fails.
+
+    Called once at startup from web.create_app and again by refresh_reference_data().
+
+    Returns:
+        ReferenceData: The current snapshot.
+    """
+    global _current
+    with _lock:
+        try:
+            _current = _load()
+        except Error as e:
+            print(f"Error loading reference data: {e}")
+            if _current is None:
+                _current = ReferenceData()
+            # don't retry on every request while the database is down
+            _current.loaded_at = time.monotonic()
+            _current.stamp = _read_stamp()
+        return _current
+
+
+def refresh_reference_data():
+    """
+    Explicit refresh hook: reloads reference data here and in every worker on this host.
+
+    Touches REFDATA_STAMP_PATH, which running workers compare on each request, so they
+    reload on their next request instead of waiting out REFDATA_TTL.
+
+    Returns:
+        ReferenceData: The new snapshot.
+    """
+    with open(REFDATA_STAMP_PATH, "a"):
+        pass
+    os.utime(REFDATA_STAMP_PATH)
+    return load_reference_data()
+
+
+def get_reference_data():
+    """
+    Returns the current reference data snapshot.
+
+    A refresh requested through refresh_reference_data() (seen as a newer stamp file)
+    reloads at once. Otherwise, once REFDATA_TTL has passed, a single cheap version
+    query decides whether the snapshot must be reloaded; in between no database work is done.
+
+    Returns:
+        ReferenceData: The current snapshot.
+    """
+    global _current
+    current = _current
+    if current is None:
+        return load_reference_data()
+    if _read_stamp() != current.stamp:
+        with _lock:
+            if _current is not current:
+                return _current  # another thread already reloaded
+        return load_reference_data()
+    if time.monotonic() - current.loaded_at < REFDATA_TTL:
+        return current
+    with _lock:
+        if _current is not current:
+            return _current
+        try:
+            with get_connection() as connection:
+                cursor = connection.cursor(dictionary=True)
+                version = _fetch_version(cursor)
+                cursor.close()
+        except Error as e:
+            print(f"Error checking reference data version: {e}")
+            version = current.version
+        if version == current.version:
+            current.loaded_at = time.monotonic()
+            return current
+    return load_reference_data()
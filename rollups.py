@@ -0,0 +1,223 @@
+import atexit
+import os
+import sys
+from mysql.connector import Error
+from db import get_connection
+from cache import TTLCache
+from counters import CounterBuffer
+
+# Rollups summarize NatWalkInd, the overall walkability score
+ROLLUP_SCORE_COLUMN = "NatWalkInd"
+# Cities need this many scored searches before they appear in the top-k lists
+ROLLUP_MIN_CITY_SEARCHES = int(os.getenv("ROLLUP_MIN_CITY_SEARCHES", "3"))
+ROLLUP_TOP_K_MAX = 100
+
+# Top-k lists are tiny and read on every home page view
+_top_cache = TTLCache(max_size=256, ttl=int(os.getenv("ROLLUP_CACHE_TTL", "60")), name="rollups")
+
+STATE_NAMES = {
+    "01": "Alabama", "02": "Alaska", "04": "Arizona", "05": "Arkansas", "06": "California", "08": "Colorado",
+    "09": "Connecticut", "10": "Delaware", "11": "District of Columbia", "12": "Florida", "13": "Georgia",
+    "15": "Hawaii", "16": "Idaho", "17": "Illinois", "18": "Indiana", "19": "Iowa", "20": "Kansas",
+    "21": "Kentucky", "22": "Louisiana", "23": "Maine", "24": "Maryland", "25": "Massachusetts",
+    "26": "Michigan", "27": "Minnesota", "28": "Mississippi", "29": "Missouri", "30": "Montana",
+    "31": "Nebraska", "32": "Nevada", "33": "New Hampshire", "34": "New Jersey", "35": "New Mexico",
+    "36": "New York", "37": "North Carolina", "38": "North Dakota", "39": "Ohio", "40": "Oklahoma",
+    "41": "Oregon", "42": "Pennsylvania", "44": "Rhode Island", "45": "South Carolina", "46": "South Dakota",
+    "47": "Tennessee", "48": "Texas", "49": "Utah", "50": "Vermont", "51": "Virginia", "53": "Washington",
+    "54": "West Virginia", "55": "Wisconsin", "56": "Wyoming", "60": "American Samoa", "66": "Guam",
+    "69": "Northern Mariana Islands", "72": "Puerto Rico", "78": "U.S. Virgin Islands",
+}
+
+# GEOID prefix length per area level
+AREA_LEVELS = {"state": 2, "county": 5}
+
+# Saves and deletes adjust city_rollups through a write-behind buffer, so they take no rollup row lock
+city_rollup_counters = CounterBuffer("city_rollups", ("city", "state"), ("searches", "scored", "score_sum"))
+atexit.register(city_rollup_counters.flush)
+
+
+def refresh_area_rollups(cursor, source_table="WalkabilityIndex"):
+    """
+    Recomputes the state and county rollups from a walkability table.
+
+    Runs inside the caller's transaction. The dataset loader calls it only after
+    its RENAME TABLE swap, which commits implicitly, so readers can briefly see the
+    new WalkabilityIndex with the previous dataset's rollups until this rebuild commits.
+
+    Args:
+        cursor: An open cursor.
+        source_table (str): The table to summarize.
+    """
+    cursor.execute("DELETE FROM area_rollups")
+    for level, prefix in AREA_LEVELS.items():
+        cursor.execute(f"""
+            INSERT INTO area_rollups (level, area_code, block_groups, scored, score_sum)
+            SELECT %s, LEFT(census_block, {prefix}), COUNT(*), COUNT({ROLLUP_SCORE_COLUMN}),
+                   COALESCE(SUM({ROLLUP_SCORE_COLUMN}), 0)
+            FROM {source_table}
+            GROUP BY LEFT(census_block, {prefix})
+        """, (level,))
+
+
+def refresh_city_rollups(cursor, source_table="WalkabilityIndex"):
+    """
+    Recomputes the per-city rollups of saved searches against a walkability table.
+
+    Callers flush city_rollup_counters before opening their transaction, so deltas
+    for searches the rebuild already counts are not added on top of it afterwards.
+
+    Args:
+        cursor: An open cursor.
+        source_table (str): The table holding the current scores.
+    """
+    cursor.execute("DELETE FROM city_rollups")
+    cursor.execute(f"""
+        INSERT INTO city_rollups (city, state, searches, scored, score_sum)
+        SELECT s.city, s.state, COUNT(*), COUNT(w.{ROLLUP_SCORE_COLUMN}), COALESCE(SUM(w.{ROLLUP_SCORE_COLUMN}), 0)
+        FROM searches AS s
+        LEFT JOIN {source_table} AS w ON w.census_block = s.census_block
+        GROUP BY s.city, s.state
+    """)
+
+
+def refresh_rollups(source_table="WalkabilityIndex"):
+    """
+    Rebuilds every rollup table in one transaction.
+
+    Returns:
+        bool: True on success, False on a database error.
+    """
+    city_rollup_counters.flush()
+    try:
+        with get_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                connection.start_transaction()
+                refresh_area_rollups(cursor, source_table)
+                refresh_city_rollups(cursor, source_table)
+                connection.commit()
+            except Error:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+    except Error as e:
+        print(f"Error refreshing rollups: {str(e)}")
+        return False
+    _top_cache.clear()
+    return True
+
+
+def add_city_searches(searches):
+    """
+    Adds newly saved searches to the city rollups (written behind).
+
+    Args:
+        searches (list): (city, state, score) tuples; score may be None.
+    """
+    _record_city_deltas(searches, 1)
+
+
+def remove_city_searches(searches):
+    """
+    Removes deleted searches from the city rollups (written behind).
+
+    Args:
+        searches (list): (city, state, score) tuples; score may be None.
+    """
+    _record_city_deltas(searches, -1)
+
+
+def _record_city_deltas(searches, sign):
+    # Deletes buffer negative deltas; the flush applies those as clamped UPDATEs, never as new rows
+    for city, state, score in searches:
+        if score is None:
+            city_rollup_counters.add((city, state), sign, 0, 0.0)
+        else:
+            city_rollup_counters.add((city, state), sign, sign, sign * float(score))
+
+
+def top_areas(level="state", k=10):
+    """
+    Returns the most walkable states or counties by average NatWalkInd.
+
+    Served from area_rollups through its (level, avg_score) index, and cached briefly.
+
+    Args:
+        level (str): "state" or "county".
+        k (int): Number of areas to return.
+
+    Returns:
+        list: Dictionaries with area_code, name, block_groups and avg_score, best first.
+    """
+    if level not in AREA_LEVELS:
+        raise ValueError(f"Unknown rollup level: {level}")
+    k = max(1, min(int(k), ROLLUP_TOP_K_MAX))
+    key = ("area", level, k)
+    rows = _top_cache.get(key)
+    if rows is None:
+        rows = _query("""
+            SELECT area_code, block_groups, avg_score FROM area_rollups
+            WHERE level = %s AND avg_score IS NOT NULL
+            ORDER BY avg_score DESC LIMIT %s
+        """, (level, k))
+        if rows is None:
+            _top_cache.set(key, [], ttl=5)  # don't retry on every page view while the database is down
+            return []
+        for row in rows:
+            row["avg_score"] = float(row["avg_score"])
+            state_name = STATE_NAMES.get(row["area_code"][:2], row["area_code"][:2])
+            row["name"] = state_name if level == "state" else f"County {row['area_code'][2:]}, {state_name}"
+        _top_cache.set(key, rows)
+    return rows
+
+
+def top_cities(k=10, min_searches=ROLLUP_MIN_CITY_SEARCHES):
+    """
+    Returns the most walkable cities among saved searches by average NatWalkInd.
+
+    Args:
+        k (int): Number of cities to return.
+        min_searches (int): Minimum number of scored searches for a city to qualify.
+
+    Returns:
+        list: Dictionaries with city, state, searches and avg_score, best first.
+    """
+    k = max(1, min(int(k), ROLLUP_TOP_K_MAX))
+    key = ("city", k, min_searches)
+    rows = _top_cache.get(key)
+    if rows is None:
+        rows = _query("""
+            SELECT city, state, searches, avg_score FROM city_rollups
+            WHERE scored >= %s AND avg_score IS NOT NULL
+            ORDER BY avg_score DESC LIMIT %s
+        """, (min_searches, k))
+        if rows is None:
+            _top_cache.set(key, [], ttl=5)  # don't retry on every page view while the database is down
+            return []
+        for row in rows:
+            row["avg_score"] = float(row["avg_score"])
+        _top_cache.set(key, rows)
+    return rows
+
+
+def _query(query, params):
+    try:
+        with get_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            cursor.close()
+        return rows
+    except Error as e:
+        print(f"Error reading rollups: {str(e)}")
+        return None
+
+
+if __name__ == "__main__":
+    # Usage: python rollups.py refresh
+    if sys.argv[1:] != ["refresh"]:
+        print("Usage: python rollups.py refresh   (rebuilds area_rollups and city_rollups from the database)")
+        sys.exit(1)
+    sys.exit(0 if refresh_rollups() else 1)
@@ -1,5 +1,16 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session
+import io
+import math
+from flask import Blueprint, render_template, request, redirect, url_for, session, Response, stream_with_context, jsonify
+from mysql.connector import Error
 from utils import *
+from batch import read_addresses, lookup_addresses, format_results
+from refdata import get_reference_data, DEFAULT_COLOR_SCALE
+from percentiles import get_percentile_tables
+from nearby import get_nearby_index, NEARBY_MAX_RESULTS, NEARBY_MAX_RADIUS_KM
+from rollups import top_areas, top_cities
+from export import export_saved_searches
+from get_census_block import get_block_group_geoid
+from metrics import timed
 # Define the blueprint for the main routes
 main_bp = Blueprint("main", __name__)
 
@@ -22,7 +33,7 @@ def index():
     # Check if the user is logged in
     if 'user_id' in session and session['user_id'] is not None:
         if mode == "menu":  # Render the logged-in menu
-            return render_template("index.html", mode="menu", message=None, name = grab_name(session.get("user_id")))
+            return render_template("index.html", mode="menu", message=None, name=current_user_name())
         elif mode == "welcome":  # Redirect to the menu if the user is authenticated
             return redirect(url_for("main.index", mode="menu"))
 
@@ -32,8 +43,9 @@ def index():
     elif mode == "register":
         return render_template("index.html", mode="register", message=None)
 
-    # Default to the welcome screen for unauthenticated users
-    return render_template("index.html", mode="welcome", message=None)
+    # Default to the welcome screen for unauthenticated users; the rankings come from the rollup tables
+    return render_template("index.html", mode="welcome", message=None,
+                           top_states=top_areas("state", 5), top_cities=top_cities(5))
 
 @main_bp.route("/choose", methods=["POST"])
 @login_required
@@ -54,6 +66,9 @@ def menu_choice():
     elif choice == "saved_searches":
         return redirect(url_for("main.saved_addresses"))  # Redirect to the saved searches route
 
+    elif choice == "batch":
+        return redirect(url_for("main.addresses_batch"))  # Redirect to the batch upload route
+
     else:
         message = "Unknown choice."
         return render_template("index.html", mode="message", message=message)
@@ -80,13 +95,15 @@ def register():
             result = create_user(username, name, email, password)
 
             if result["success"]:
-                session['user_id'] = result["user_id"]  # Store the user ID in the session
-                name = grab_name(session.get("user_id"))
-                return redirect(url_for("main.index", mode="menu", name=name))
+                # Store the user ID and display name in the session; no need to read back what was just inserted
+                remember_user(result["user_id"], username=username, name=name)
+                return redirect(url_for("main.index", mode="menu"))
             else:
                 # Handle specific error messages returned by create_user
                 message = result["error"]
                 return render_template("index.html", mode="register", message=message)
+        except PasswordPoolBusy as e:
+            return render_template("index.html", mode="register", message=str(e))
         except Exception as e:
             # Handle unexpected exceptions
             message = f"An unexpected error occurred during registration: {str(e)}"
@@ -114,17 +131,17 @@ def login():
             # Validate user credentials using the helper method
             user_id = validate_user_credentials(username, password)
             if user_id:
-                session['user_id'] = user_id  # Store the user ID in the session
-                name = grab_name(session.get("user_id"))
-                return render_template("index.html", mode="menu", name=name)  # Redirect to the menu after successful login
+                remember_user(user_id, username=username)  # Store the user ID and display name in the session
+                return render_template("index.html", mode="menu", name=current_user_name())  # Redirect to the menu after successful login
             else:
                 message = "Invalid username or password."
                 return render_template("index.html", mode="login", message=message)
+        except PasswordPoolBusy as e:
+            return render_template("index.html", mode="login", message=str(e))
         except Exception as e:
             message = f"Error during login: {str(e)}"
             return render_template("index.html", mode="login", message=message)
-    name = grab_name(session.get("user_id"))
-    return render_template("index.html", mode="login", name=name)
+    return render_template("index.html", mode="login", name=current_user_name())
 
 
 @main_bp.route("/logout", methods=["GET"])
@@ -167,12 +184,15 @@ def addresses_lookup():
             return render_template("index.html", mode="lookup", message=message)
 
         user_id = session.get('user_id')
-        walkability = save_search(user_id, street, city, state)
+        # Same geocode pipeline as batch lookups (geocode cache, geoclient.py, offline block group index)
+        with timed("lookup", "geocode"):
+            census_block = get_block_group_geoid(street, city, state)
+        with timed("lookup", "save"):
+            walkability = save_search(user_id, street, city, state, census_block=census_block)
         
-        # Fetch titles from the database using execute_query
-        query = "SELECT key_name, display_name FROM walkability_titles"
-        rows = execute_query(query)
-        titles = {row['key_name']: row['display_name'] for row in rows}
+        # Titles and colour scales come from the process-wide reference data cache
+        reference = get_reference_data()
+        titles = reference.titles
         # Process the walkability dictionary
         processed_walkability = []
         if isinstance(walkability, str):
@@ -183,34 +203,57 @@ def addresses_lookup():
             message = "Unexpected error: Walkability data is not in the correct format."
             return render_template("index.html", mode="lookup", message=message)
 
+        # Percentile ranks come from precomputed tables (percentiles.py); no aggregate queries here
+        with timed("lookup", "percentiles"):
+            tables = get_percentile_tables()
+            ranks = tables.context(census_block, walkability) if tables else {}
         for key, value in walkability.items():
+            if value is None:
+                continue
             score = float(value)  # Convert Decimal to float
-
-            # Calculate background color based on score using HSL
-            if score <= 50:
-                # Transition from red (hue 0) to yellow (hue 60)
-                hue = int((score / 50) * 60)  # Hue transitions from 0 (red) to 60 (yellow)
-            else:
-                # Transition from yellow (hue 60) to green (hue 120)
-                hue = int(60 + ((score - 50) / 50) * 60)  # Hue transitions from 60 (yellow) to 120 (green)
-
-            saturation = 70  # Keep saturation consistent for a rich color
-            lightness = 50  # Keep lightness consistent for a pleasant tone
-
-            # Convert HSL to CSS-compatible format
-            background_color = f"hsl({hue}, {saturation}%, {lightness}%)"
+            rank = ranks.get(key, {})
+            national = rank.get("national")
+            low, _, high = reference.color_scales.get(key, DEFAULT_COLOR_SCALE)
 
             processed_walkability.append({
-                "attribute": titles.get(key, key.replace("_", " ").title()),  # Use title from DB or fallback
+                "attribute": reference.title(key),  # Use title from DB or fallback
                 "score": score,
-                "background_color": background_color
+                "national_percentile": national,
+                "state_percentile": rank.get("state"),
+                # Bar length and colour follow the national percentile when available, else the attribute's own scale
+                "width": national if national is not None else round(100 * (min(max(score, low), high) - low) / (high - low)),
+                "background_color": reference.percentile_color(national) if national is not None else reference.score_color(key, score)
             })
 
-        return render_template("index.html", mode="walkability_display", walkability=processed_walkability, titles=titles, street=street, city=city, state=state)
+        with timed("lookup", "render"):
+            return render_template("index.html", mode="walkability_display", walkability=processed_walkability, titles=titles, street=street, city=city, state=state)
 
     # Render the lookup form
     return render_template("index.html", mode="lookup")
 
+def _saved_address_filters(source):
+    """
+    Reads the saved-address filters from request.args or request.form.
+
+    Args:
+        source (MultiDict): request.args or request.form.
+
+    Returns:
+        tuple: (city_filter, state_filter, sort, attribute_filter) with blank filters normalized to None.
+    """
+    city_filter = source.get("city", None)
+    state_filter = source.get("state", None)
+    # Normalize values
+    if city_filter == "" or city_filter == "None":
+        city_filter = None
+    if state_filter == "" or state_filter == "None":
+        state_filter = None
+    sort = source.get("sorting")
+    attribute_filter = source.get("attribute", "NatWalkInd")
+    if not get_reference_data().is_attribute(attribute_filter):
+        attribute_filter = "NatWalkInd"
+    return city_filter, state_filter, sort, attribute_filter
+
 @main_bp.route("/addresses/user", methods=["GET", "POST"])
 @login_required
 def saved_addresses():
@@ -221,69 +264,188 @@ def saved_addresses():
         None
 
     Returns:
-        str: Renders the index.html template with the filtered addresses or removes selected addresses.
+        str: Renders the index.html template with the first page of filtered addresses or removes selected addresses.
     """
     user_id = session.get('user_id')  # Get the logged-in user's ID
     if not user_id:
         return redirect(url_for("main.index", mode="login"))  # Redirect to login if not authenticated
-        # Handle filtering
-    city_filter = request.args.get("city", None)
-    state_filter = request.args.get("state", None)
-    if city_filter == "" or city_filter == "None":
-        city_filter = None
-    if state_filter == "" or state_filter == "None":
-        state_filter = None
-    sort = request.args.get("sorting")
-    attribute_filter = request.args.get("attribute", "NatWalkInd")
-    # get filtered addresses for the user
-    addresses = get_saved_addresses(user_id, attribute_filter, city_filter, state_filter, sort)
 
-    # get distinct states based on the selected city
-    distinct_states = get_distinct_options(user_id, "state", "city", city_filter)
-
-    # get distinct cities based on the selected state
-    distinct_cities = get_distinct_options(user_id, "city", "state", state_filter)
+    message = None
     if request.method == "POST":
         # Handle address removal
-
-        sort = request.form.get("sorting")
-        attribute_filter = request.form.get("attribute", "NatWalkInd")
+        city_filter, state_filter, sort, attribute_filter = _saved_address_filters(request.form)
         try:
-            selected_addresses = request.form.getlist("addresses")
-            delete_saved_addresses(user_id, selected_addresses)  # Remove selected addresses from the database
-            city_filter = request.form.get("city", None)
-            state_filter = request.form.get("state", None)
-            # Normalize values
-            if city_filter == "" or city_filter == "None":
-                city_filter = None
-            if state_filter == "" or state_filter == "None":
-                state_filter = None
-            print(user_id, attribute_filter, city_filter, state_filter, sort)
-            addresses = get_saved_addresses(user_id, attribute_filter, city_filter, state_filter, sort)
-            print(addresses, user_id, attribute_filter, city_filter, state_filter, sort)
-            return render_template(
-                                    "index.html",
-                                    mode="saved_addresses",
-                                    addresses=addresses,
-                                    distinct_cities=distinct_cities,
-                                    distinct_states=distinct_states,
-                                    city_filter=city_filter,
-                                    state_filter=state_filter,
-                                    sorting=sort,
-                                    attribute_filter=attribute_filter
-                                )
+            selected_ids = request.form.getlist("search_ids")
+            results = delete_saved_addresses(user_id, selected_ids)  # Remove selected addresses from the database
+            if results is None:
+                message = "Could not delete the selected addresses. Please try again."
+            else:
+                deleted = sum(1 for result in results if result["deleted"])
+                missing = len(results) - deleted
+                message = f"Deleted {deleted} address(es)." if results else None
+                if missing:
+                    message += f" {missing} address(es) were already removed."
         except Exception as e:
             message = f"Error removing addresses: {str(e)}"
             return render_template("index.html", mode="message", message=message)
+    else:
+        # Handle filtering
+        city_filter, state_filter, sort, attribute_filter = _saved_address_filters(request.args)
+
+    # get one page of filtered addresses for the user
+    page = get_saved_addresses_page(user_id, attribute_filter, city_filter, state_filter, sort,
+                                    cursor=request.args.get("cursor"))
+
+    # get states narrowed by the selected city and cities narrowed by the selected state (cached per user)
+    facets = get_facets(user_id, city_filter, state_filter)
 
     return render_template(
         "index.html",
         mode="saved_addresses",
-        addresses=addresses,
-        distinct_cities=distinct_cities,
-        distinct_states=distinct_states,
+        addresses=page["addresses"],
+        next_cursor=page["next_cursor"],
+        total=page["total"],
+        distinct_cities=facets["cities"],
+        distinct_states=facets["states"],
         city_filter=city_filter,
         state_filter=state_filter,
         sorting=sort,
-        attribute_filter=attribute_filter
+        attribute_filter=attribute_filter,
+        message=message
     )
+
+@main_bp.route("/addresses/user/page", methods=["GET"])
+@login_required
+def saved_addresses_page():
+    """
+    Returns one page of saved addresses as JSON so the table can load more rows incrementally.
+
+    Args:
+        None
+
+    Returns:
+        Response: JSON with addresses, next_cursor and total.
+    """
+    user_id = session.get('user_id')
+    city_filter, state_filter, sort, attribute_filter = _saved_address_filters(request.args)
+    page = get_saved_addresses_page(user_id, attribute_filter, city_filter, state_filter, sort,
+                                    cursor=request.args.get("cursor"), limit=request.args.get("limit", type=int))
+    for address in page["addresses"]:
+        if address["value"] is not None:
+            address["value"] = float(address["value"])  # Decimal isn't JSON serializable
+    return jsonify(page)
+
+@main_bp.route("/addresses/user/export", methods=["GET"])
+@login_required
+def saved_addresses_export():
+    """
+    Streams the user's saved addresses with all walkability scores as CSV or NDJSON.
+
+    Takes the same city/state/attribute/sorting filters as the saved addresses view,
+    plus format=csv|ndjson and gzip=1.
+
+    Args:
+        None
+
+    Returns:
+        Response: A streamed attachment.
+    """
+    user_id = session.get('user_id')
+    city_filter, state_filter, sort, attribute_filter = _saved_address_filters(request.args)
+    fmt = request.args.get("format", "csv")
+    if fmt not in ("csv", "ndjson"):
+        fmt = "csv"
+    compress = request.args.get("gzip") in ("1", "true", "on")
+    try:
+        chunks = export_saved_searches(user_id, fmt, compress, attribute=attribute_filter,
+                                       city_filter=city_filter, state_filter=state_filter, sort=sort)
+    except Error as e:
+        # Nothing has been sent yet, so the client gets a clear failure instead of an empty or partial file
+        print(f"Error exporting saved searches: {str(e)}")
+        return jsonify({"error": "Export is unavailable right now. Please try again."}), 503
+    filename = f"saved_addresses.{fmt}" + (".gz" if compress else "")
+    mimetype = "application/gzip" if compress else ("text/csv" if fmt == "csv" else "application/x-ndjson")
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
+
+@main_bp.route("/addresses/nearby", methods=["GET"])
+def addresses_nearby():
+    """
+    Returns the nearest block groups that are more walkable than a starting point, as JSON.
+
+    Query args: census_block (or lat and lon), k, radius_km, attribute (default NatWalkInd)
+    and min_score (defaults to the starting block group's own score). Answered from the
+    in-memory nearby index; no database or geocoder calls.
+
+    Args:
+        None
+
+    Returns:
+        Response: JSON with origin and results, or an error with status 400/404/503.
+    """
+    index = get_nearby_index()
+    if index is None:
+        return jsonify({"error": "Nearby search is not available."}), 503
+
+    attribute = request.args.get("attribute", "NatWalkInd")
+    if attribute not in index.columns:
+        return jsonify({"error": f"Unknown attribute: {attribute}"}), 400
+    k = max(1, min(request.args.get("k", 10, type=int), NEARBY_MAX_RESULTS))
+    radius_km = max(0.1, min(request.args.get("radius_km", 5.0, type=float), NEARBY_MAX_RADIUS_KM))
+    min_score = request.args.get("min_score", type=float)
+
+    census_block = request.args.get("census_block")
+    if census_block:
+        origin = index.locate(census_block)
+        if origin is None:
+            return jsonify({"error": "Census block not found."}), 404
+        if min_score is None:
+            min_score = origin["scores"].get(attribute)
+    else:
+        lat = request.args.get("lat", type=float)
+        lon = request.args.get("lon", type=float)
+        if lat is None or lon is None:
+            return jsonify({"error": "Pass census_block, or lat and lon."}), 400
+        # float() accepts "nan" and "inf", which no grid lookup can use
+        if not (math.isfinite(lat) and math.isfinite(lon) and -90 <= lat <= 90 and -180 <= lon <= 180):
+            return jsonify({"error": "lat must be within -90..90 and lon within -180..180."}), 400
+        origin = {"census_block": None, "lat": lat, "lon": lon, "scores": None}
+
+    results = index.nearest(origin["lat"], origin["lon"], k=k, radius_km=radius_km, attribute=attribute,
+                            min_score=min_score, exclude=origin["census_block"])
+    return jsonify({"origin": origin, "attribute": attribute, "min_score": min_score,
+                    "radius_km": radius_km, "results": results})
+
+@main_bp.route("/addresses/batch", methods=["GET", "POST"])
+@login_required
+def addresses_batch():
+    """
+    Handles bulk walkability lookups for an uploaded CSV of addresses.
+
+    Args:
+        None
+
+    Returns:
+        Response: The upload form for GET, or a streamed CSV/NDJSON download of the results.
+    """
+    if request.method == "POST":
+        upload = request.files.get("file")
+        fmt = request.form.get("format", "csv")
+        if fmt not in ("csv", "ndjson"):
+            fmt = "csv"
+        if not upload or not upload.filename:
+            return render_template("index.html", mode="batch", message="Please choose a CSV file to upload.")
+        try:
+            addresses = read_addresses(io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline=""))
+        except (ValueError, UnicodeDecodeError) as e:
+            return render_template("index.html", mode="batch", message=f"Could not read CSV: {str(e)}")
+
+        # Stream rows back as they are resolved instead of buffering the whole batch
+        mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+        response = Response(stream_with_context(format_results(lookup_addresses(addresses), fmt)), mimetype=mimetype)
+        response.headers["Content-Disposition"] = f"attachment; filename=walkability_results.{fmt}"
+        response.headers["X-Total-Addresses"] = str(len(addresses))  # also in every row's total column
+        return response
+
+    return render_template("index.html", mode="batch", message=None)
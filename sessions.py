@@ -0,0 +1,261 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from flask.sessions import SessionInterface, SessionMixin
+
+# Optional: only needed for SESSION_BACKEND=redis (any Redis-compatible server works)
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# "sqlite" shares sessions between the workers on one host; "redis" shares them between hosts
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite")
+SESSION_PATH = os.getenv("SESSION_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions.sqlite3"))
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+# Sliding expiry: an unchanged session's expiry is pushed forward at most once per interval (seconds)
+SESSION_REFRESH_INTERVAL = int(os.getenv("SESSION_REFRESH_INTERVAL", "60"))
+
+
+class SQLiteSessionBackend:
+    """
+    Session records in a local SQLite file, shared by every worker on the host.
+    """
+
+    def __init__(self, path=SESSION_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._db()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)")
+
+    def _db(self):
+        # sqlite3 connections cannot be shared across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, sid):
+        """
+        Returns (data, expires_at) for a live session, or None if it is missing or expired.
+        """
+        row = self._db().execute(
+            "SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?", (sid, time.time())
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def save(self, sid, data, expires_at):
+        self._db().execute(
+            "INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+            (sid, json.dumps(data, separators=(",", ":")), expires_at),
+        )
+
+    def touch(self, sid, expires_at):
+        self._db().execute("UPDATE sessions SET expires_at = ? WHERE id = ?", (expires_at, sid))
+
+    def delete(self, sid):
+        self._db().execute("DELETE FROM sessions WHERE id = ?", (sid,))
+
+    def purge_expired(self):
+        """
+        Deletes every expired session in one statement.
+
+        Returns:
+            int: The number of sessions removed.
+        """
+        return self._db().execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)).rowcount
+
+
+class RedisSessionBackend:
+    """
+    Session records in Redis (or a compatible server), shared across hosts.
+
+    Keys carry a TTL, so the server drops expired sessions itself.
+    """
+
+    def __init__(self, url=SESSION_REDIS_URL, prefix="session:"):
+        if redis is None:
+            raise RuntimeError("SESSION_BACKEND=redis requires the redis package: pip install redis")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def load(self, sid):
+        pipe = self.client.pipeline()
+        pipe.get(self.prefix + sid)
+        pipe.pttl(self.prefix + sid)
+        data, ttl_ms = pipe.execute()
+        if data is None or ttl_ms < 0:
+            return None
+        return json.loads(data), time.time() + ttl_ms / 1000
+
+    def save(self, sid, data, expires_at):
+        ttl_ms = max(1, int((expires_at - time.time()) * 1000))
+        self.client.set(self.prefix + sid, json.dumps(data, separators=(",", ":")), px=ttl_ms)
+
+    def touch(self, sid, expires_at):
+        self.client.pexpire(self.prefix + sid, max(1, int((expires_at - time.time()) * 1000)))
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+    def purge_expired(self):
+        return 0  # Redis expires keys on its own
+
+
+class ServerSession(dict, SessionMixin):
+    """
+    Session whose data is fetched from the backend on first access.
+
+    Requests that never touch the session (static files, health checks, the JSON
+    endpoints) cost no backend round trip.
+    """
+
+    def __init__(self, backend, sid):
+        super().__init__()
+        self.backend = backend
+        self.sid = sid
+        self.expires_at = None
+        self.modified = False
+        self.accessed = False
+        self.replaced_sid = None
+        self._loaded = sid is None
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        record = self.backend.load(self.sid)
+        if record is None:
+            self.sid = None  # unknown or expired: a fresh id is issued if anything is stored
+        else:
+            data, self.expires_at = record
+            dict.update(self, data)
+
+    def regenerate(self):
+        """
+        Moves the session data to a fresh id when the session is saved.
+
+        Called whenever the session's privilege changes (login, registration), so an id
+        planted in the browser beforehand never becomes an authenticated session.
+        The old record is deleted when the new one is written.
+        """
+        self._load()
+        if self.sid is not None:
+            self.replaced_sid = self.sid
+        self.sid = None
+        self.accessed = True
+        self.modified = True
+
+
+def _reader(name):
+    method = getattr(dict, name)
+
+    def wrapper(self, *args, **kwargs):
+        self._load()
+        self.accessed = True
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = name
+    return wrapper
+
+
+def _writer(name):
+    method = getattr(dict, name)
+
+    def wrapper(self, *args, **kwargs):
+        self._load()
+        self.accessed = True
+        self.modified = True
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in ("__getitem__", "__contains__", "__iter__", "__len__", "__repr__", "get", "keys", "values", "items", "copy"):
+    setattr(ServerSession, _name, _reader(_name))
+for _name in ("__setitem__", "__delitem__", "pop", "popitem", "clear", "setdefault", "update"):
+    setattr(ServerSession, _name, _writer(_name))
+
+
+class ServerSessionInterface(SessionInterface):
+    """
+    Flask session interface that keeps session data in a server-side backend.
+
+    The cookie carries only a random session id. Sessions expire after the app's
+    PERMANENT_SESSION_LIFETIME of inactivity (sliding expiry), and clearing a session
+    deletes it from the backend, so logouts take effect on every worker.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def open_session(self, app, request):
+        return ServerSession(self.backend, request.cookies.get(self.get_cookie_name(app)))
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add("Cookie")
+        if not session._loaded:
+            return  # never touched during this request
+        if session.replaced_sid is not None:
+            self.backend.delete(session.replaced_sid)
+
+        if not dict.__len__(session):
+            if session.sid is not None:
+                self.backend.delete(session.sid)
+            if session.modified or session.sid is not None:
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app), httponly=self.get_cookie_httponly(app))
+            return
+
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        now = time.time()
+        expires_at = now + lifetime
+        if session.modified or session.sid is None:
+            if session.sid is None:
+                session.sid = secrets.token_urlsafe(32)
+            self.backend.save(session.sid, dict(dict.items(session)), expires_at)
+        elif session.expires_at is not None and session.expires_at - now > lifetime - SESSION_REFRESH_INTERVAL:
+            return  # refreshed recently; skip the write
+        else:
+            self.backend.touch(session.sid, expires_at)
+
+        response.set_cookie(
+            name, session.sid,
+            expires=datetime.fromtimestamp(expires_at, timezone.utc) if app.config.get("SESSION_PERMANENT", True) else None,
+            httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app),
+        )
+
+
+def create_session_backend(name=SESSION_BACKEND):
+    """
+    Builds the configured session backend.
+
+    Args:
+        name (str): "sqlite" or "redis".
+
+    Returns:
+        The backend instance.
+    """
+    if name == "redis":
+        return RedisSessionBackend()
+    if name == "sqlite":
+        return SQLiteSessionBackend()
+    raise ValueError(f"Unknown SESSION_BACKEND: {name}")
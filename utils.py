@@ -1,11 +1,34 @@
+import base64
+import json
 import os
-from dotenv import load_dotenv
+import time
+from decimal import Decimal, InvalidOperation
 import mysql.connector
 from mysql.connector import Error
-import bcrypt
 from functools import wraps
 from flask import session, redirect, url_for
 from get_census_block import *
+from db import get_connection
+from walkstore import get_walkability_store, WALKABILITY_COLUMNS
+from cache import TTLCache
+from refdata import get_reference_data
+from passwords import get_password_hasher, PasswordPoolBusy
+from rollups import add_city_searches, remove_city_searches, ROLLUP_SCORE_COLUMN
+from counters import record_search, record_deletes
+from metrics import record_query, timed
+
+# Saved addresses are paged; clients may ask for smaller pages but never more than the cap
+SAVED_PAGE_SIZE = int(os.getenv("SAVED_PAGE_SIZE", "50"))
+SAVED_PAGE_SIZE_MAX = int(os.getenv("SAVED_PAGE_SIZE_MAX", "200"))
+
+# Per-user cache of saved address counts, keyed by user_id -> {(city, state): count}
+_saved_count_cache = TTLCache(max_size=10000, ttl=int(os.getenv("SAVED_COUNT_TTL", "60")), name="saved_counts")
+
+# Per-user cache of (state, city, count) rows behind the saved-address filter dropdowns
+_facet_cache = TTLCache(max_size=10000, ttl=int(os.getenv("FACET_CACHE_TTL", "60")), name="facets")
+
+# Per-user display names for sessions that predate the name being stored in the session
+_profile_cache = TTLCache(max_size=10000, ttl=int(os.getenv("PROFILE_CACHE_TTL", "300")), name="profiles")
 
 def login_required(f):
     """
@@ -27,64 +50,49 @@ def login_required(f):
 
 def execute_query(query, params=None):
     """
-    Establishes a connection to the MySQL database.
+    Executes a query on a pooled connection to the MySQL database.
+
+    Pool wait and query time are recorded per normalized statement (metrics.py),
+    and a sample of queries is logged.
 
     Args:
-        host (str): Hostname or IP address of the MySQL server.
-        user (str): Username for the MySQL database.
-        password (str): Password for the MySQL database.
-        database (str): Name of the MySQL database.
+        query (str): The SQL statement to run.
+        params (tuple or list): Optional parameters for the statement.
 
     Returns:
-        mysql.connector.connection_cext.CMySQLConnection: Connection object to the database.
-
-    Raises:
-        mysql.connector.Error: If an error occurs during connection.
+        list: The fetched rows as dictionaries, [] if the query failed,
+              or None if no database connection could be obtained.
     """
+    started = time.perf_counter()
+    acquired = None
+    results = None
     try:
-        # Load environment variables from .env file
-        load_dotenv()
-        host_val = os.getenv("DB_HOST")
-        user_val = os.getenv("DB_USER")
-        password_val = os.getenv("DB_PASSWORD")
-        database_val = os.getenv("DB_NAME")
-
-        # Establish connection to the database
-        connection = mysql.connector.connect(
-            host=host_val,
-            user=user_val,
-            password=password_val,
-            database=database_val
-        )
+        with get_connection() as connection:
+            acquired = time.perf_counter()
+            cursor = connection.cursor(dictionary=True)  # Use dictionary=True for row results as dicts
+            # Execute the query with parameters if provided
+            try:
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+            except Error as e:
+                print(f"Error executing query: {str(e)}")
+                cursor.close()
+                return []
+            # Fetch all results
+            results = cursor.fetchall() if cursor.with_rows else []
+
+            # Commit changes if it's an INSERT/UPDATE/DELETE query
+            connection.commit()
+            cursor.close()
     except Error as e:
         # Print error if connection fails
         print(f"Error connecting to database: {e}")
         return None
-    cursor = connection.cursor(dictionary=True)  # Use dictionary=True for row results as dicts
-            
-    # Execute the query with parameters if provided
-    if params:
-        try:
-            cursor.execute(query, params)
-        except Error as e:
-            print(f"Error executing query: {str(e)}")
-            return []
-    else:
-        try:
-            cursor.execute(query)
-        except Error as e:
-            print(f"Error executing query: {str(e)}")
-            return []
-    # Fetch all results
-    results = cursor.fetchall()
-
-    # Commit changes if it's an INSERT/UPDATE/DELETE query
-    connection.commit()
-
-    # Close the cursor and connection
-    cursor.close()
-    connection.close()
-    print(f"Executed query: {query} with params: {params if params else 'None'}")
+    finally:
+        record_query(query, started, acquired, "ok" if results is not None else "error",
+                     len(results) if results is not None else None)
     return results
 
 def grab_name(user_id):
@@ -98,37 +106,65 @@ def grab_name(user_id):
         String: Name of user
     """
     try:
-        # Load environment variables from .env file
-        load_dotenv()
-        host_val = os.getenv("DB_HOST")
-        user_val = os.getenv("DB_USER")
-        password_val = os.getenv("DB_PASSWORD")
-        database_val = os.getenv("DB_NAME")
-
-        # Establish database connection
-        connection = mysql.connector.connect(
-            host=host_val,
-            user=user_val,
-            password=password_val,
-            database=database_val
-        )
-        cursor = connection.cursor(dictionary=True)  # Use dictionary=True for row results as dicts
-
-        # Call the stored procedure directly
-        cursor.callproc('GetUserName', [user_id])
-
-        for result in cursor.stored_results():
-         rows = result.fetchall()
-        print(rows)
-        # Close the cursor and connection
-        cursor.close()
-        connection.close()
+        with get_connection() as connection:
+            cursor = connection.cursor(dictionary=True)  # Use dictionary=True for row results as dicts
+
+            # Call the stored procedure directly
+            cursor.callproc('GetUserName', [user_id])
+
+            rows = []
+            for result in cursor.stored_results():
+                rows = result.fetchall()
+            # Close the cursor; the connection goes back to the pool
+            cursor.close()
 
         return rows[0]['name'] if rows else None
     except Error as e:
         print(f"Error fetching user name: {str(e)}")
         return None
 
+def remember_user(user_id, username=None, name=None):
+    """
+    Logs a user into the session and stores their display name there.
+
+    The name is loaded once here (with a single GetUserName call when the caller
+    does not already know it), so later page renders need no database work.
+
+    Args:
+        user_id (int): The ID of the user.
+        username (str): The username, if known.
+        name (str): The display name, if known (e.g. right after registration).
+    """
+    if name is None:
+        name = grab_name(user_id)
+    session.regenerate()  # never keep a pre-login session id (session fixation)
+    session['user_id'] = user_id
+    session['name'] = name
+    if username is not None:
+        session['username'] = username
+    _profile_cache.set(user_id, name)
+
+def current_user_name():
+    """
+    Returns the logged-in user's display name without touching the database when possible.
+
+    Returns:
+        str: The display name, or None when nobody is logged in.
+    """
+    user_id = session.get('user_id')
+    if user_id is None:
+        return None
+    name = session.get('name')
+    if name is None:
+        # Session created before names were stored in it: fall back to the short-TTL cache
+        name = _profile_cache.get(user_id)
+        if name is None:
+            name = grab_name(user_id)
+            if name is not None:
+                _profile_cache.set(user_id, name)
+        session['name'] = name
+    return name
+
 def get_walkability_values(census_block):
     """
     Grabs walkability values for the user based on census block.
@@ -141,13 +177,9 @@ def get_walkability_values(census_block):
         dict: A dictionary containing walkability values or an error message.
     """
     try:
-        sql_query = """
-        SELECT intersection_density, transit_access, job_housing_mix, population_employment_density, NatWalkInd FROM WalkabilityIndex WHERE census_block = %s
-        """
-        params = (census_block, )
-        results = execute_query(sql_query, params)
-        if results:
-            return results[0]  # Return the first result as a dictionary
+        result = _lookup_walkability(census_block)
+        if result:
+            return result
         else:
             return {"error": "No walkability data found for the given census block."}
 
@@ -155,6 +187,58 @@ def get_walkability_values(census_block):
         print(f"Error fetching walkability values: {str(e)}")
         return {"error": f"An error occurred: {str(e)}"}
 
+def _lookup_walkability(census_block):
+    """
+    Reads one WalkabilityIndex row, from the in-memory store when installed, else from MySQL.
+
+    Args:
+        census_block (str): The census block identifier.
+
+    Returns:
+        dict: The walkability values, or None if the block has no data.
+    """
+    store = get_walkability_store()
+    if store is not None:
+        values = store.get(census_block)
+        if values is not None:
+            return values
+    # Read through to the database on a store miss (or when no store is installed)
+    sql_query = f"""
+    SELECT {", ".join(WALKABILITY_COLUMNS)} FROM WalkabilityIndex WHERE census_block = %s
+    """
+    results = execute_query(sql_query, (census_block, ))
+    return results[0] if results else None
+
+def get_walkability_values_bulk(census_blocks, chunk_size=500):
+    """
+    Grabs walkability values for many census blocks with one IN (...) query per chunk.
+
+    Args:
+        census_blocks (iterable): Census block identifiers; duplicates are ignored.
+        chunk_size (int): Maximum number of identifiers per query.
+
+    Returns:
+        dict: Census block -> dictionary of walkability values. Blocks with no data are omitted.
+    """
+    blocks = list(dict.fromkeys(str(block) for block in census_blocks if block))
+    values = {}
+    store = get_walkability_store()
+    if store is not None:
+        for block in blocks:
+            row = store.get(block)
+            if row is not None:
+                values[block] = row
+        blocks = [block for block in blocks if block not in values]
+    for start in range(0, len(blocks), chunk_size):
+        chunk = blocks[start:start + chunk_size]
+        placeholders = ", ".join(["%s"] * len(chunk))
+        sql_query = f"""
+        SELECT census_block, {", ".join(WALKABILITY_COLUMNS)} FROM WalkabilityIndex WHERE census_block IN ({placeholders})
+        """
+        for row in execute_query(sql_query, chunk) or []:
+            values[row.pop("census_block")] = row
+    return values
+
 def create_user(username: str, name: str, email: str, password: str):
     """
     Creates a new user in the database.
@@ -171,30 +255,31 @@ def create_user(username: str, name: str, email: str, password: str):
     """
     hashed_password = hash_password(password)
     try:
-        conn = mysql.connector.connect(user=os.getenv("DB_USER"), password=os.getenv("DB_PASSWORD"), host='localhost', database=os.getenv("DB_NAME"))
-        cursor = conn.cursor()
-
-        # Check if the username already exists
-        cursor.execute("SELECT COUNT(*) FROM users WHERE username = %s", (username,))
-        if cursor.fetchone()[0] > 0:
-            return {"success": False, "error": "The username already exists. Please choose a different username."}
-
-        # Check if the email already exists
-        cursor.execute("SELECT COUNT(*) FROM users WHERE email = %s", (email,))
-        if cursor.fetchone()[0] > 0:
-            return {"success": False, "error": "The email address is already registered. Please use a different email."}
-
-        # Insert the new user into the database
-        # Call the stored procedure
-        cursor.callproc('AddUser', [username, name, email, hashed_password])
-        conn.commit()
-        # Fetch the last inserted ID
-        cursor.execute("SELECT LAST_INSERT_ID()")
-        user_id = cursor.fetchone()[0]
-
-        # Close the cursor and connection
-        cursor.close()
-        conn.close()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+
+            # Check if the username already exists
+            cursor.execute("SELECT COUNT(*) FROM users WHERE username = %s", (username,))
+            if cursor.fetchone()[0] > 0:
+                cursor.close()
+                return {"success": False, "error": "The username already exists. Please choose a different username."}
+
+            # Check if the email already exists
+            cursor.execute("SELECT COUNT(*) FROM users WHERE email = %s", (email,))
+            if cursor.fetchone()[0] > 0:
+                cursor.close()
+                return {"success": False, "error": "The email address is already registered. Please use a different email."}
+
+            # Insert the new user into the database
+            # Call the stored procedure
+            cursor.callproc('AddUser', [username, name, email, hashed_password])
+            conn.commit()
+            # Fetch the last inserted ID
+            cursor.execute("SELECT LAST_INSERT_ID()")
+            user_id = cursor.fetchone()[0]
+
+            # Close the cursor; the connection goes back to the pool
+            cursor.close()
         print(f"User created with ID: {user_id}, Username: {username}, Name: {name}, Email: {email}")
         return {"success": True, "user_id": user_id}
 
@@ -217,17 +302,18 @@ def hash_password(plain_password: str) -> bytes:
     """
     Hashes a plain text password using bcrypt.
 
+    The work runs in the password process pool at BCRYPT_ROUNDS (see passwords.py).
+
     Args:
         plain_password (str): The plain text password to be hashed.
 
     Returns:
         bytes: The hashed password.
+
+    Raises:
+        PasswordPoolBusy: If too many password operations are queued, or this one timed out.
     """
-    # Generate a salt for bcrypt hashing
-    salt = bcrypt.gensalt()
-    # Hash the password using bcrypt and the generated salt
-    hashed = bcrypt.hashpw(plain_password.encode('utf-8'), salt)
-    return hashed
+    return get_password_hasher().hash(plain_password)
 
 def validate_user_credentials(username: str, password: str) -> int:
     """
@@ -239,236 +325,356 @@ def validate_user_credentials(username: str, password: str) -> int:
 
     Returns:
         int: The user ID if the credentials are valid, or None if invalid.
+
+    Raises:
+        PasswordPoolBusy: If too many password operations are queued, or this one timed out.
     """
     try:
-        load_dotenv()
-        host_val = os.getenv("DB_HOST")
-        user_val = os.getenv("DB_USER")
-        password_val = os.getenv("DB_PASSWORD")
-        database_val = os.getenv("DB_NAME")
-        # Establish connection to the database
-        connection = mysql.connector.connect(
-            host=host_val,
-            user=user_val,
-            password=password_val,
-            database=database_val
-        )
-        cursor = connection.cursor(dictionary=True)
-        cursor.callproc('GetUserCredentials', [username])
-
-        for result in cursor.stored_results():
-            user_record = result.fetchone()
-            if user_record:
-                hashed_password = user_record["password"]
-                if bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8')):
-                    return user_record["id"]
-        return None
+        with get_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            cursor.callproc('GetUserCredentials', [username])
+
+            user_record = None
+            for result in cursor.stored_results():
+                user_record = result.fetchone() or user_record
+            cursor.close()
+
+        # Verify outside the connection block so the connection is not held during bcrypt
+        if not user_record:
+            return None
+        valid, new_hash = get_password_hasher().check(password, user_record["password"])
+        if not valid:
+            return None
+        if new_hash is not None:
+            # Transparently upgrade hashes made with an older, cheaper cost
+            execute_query("UPDATE users SET password = %s WHERE id = %s", (new_hash.decode("utf-8"), user_record["id"]))
+        return user_record["id"]
+    except PasswordPoolBusy:
+        raise
     except Exception as e:
         print(f"Error validating user credentials: {str(e)}")
         return None
 
-def save_search(user_id, street, city, state):
+def save_search(user_id, street, city, state, census_block=None):
     """
     Saves a search record for a user in the database.
 
+    The duplicate check, search_id allocation and insert run as one transaction on
+    one pooled connection; the meta_data search_count increment and the city rollup
+    update are buffered and written behind (counters.py). The user's row is locked first, so
+    concurrent saves for the same user are serialized and can't pick the same
+    search_id; saving an address the user already has is a no-op.
+
     Args:
-        user_id (int): The ID of the user.
+        user_id (int): The ID of the user, or None for guests (nothing is saved).
         street (str): The street address.
         city (str): The city name.
         state (str): The state name.
+        census_block (str): The block group GEOID if the caller already resolved it
+                            (e.g. the lookup view); geocoded here otherwise.
 
     Returns:
         Val or bool: Walkability index if the search was saved successfully, False otherwise.
     """
-    census_block = get_block_group_geoid(street, city, state)
+    if census_block is None:
+        with timed("save_search", "geocode"):
+            census_block = get_block_group_geoid(street, city, state)
+    if not (isinstance(census_block, int) or (isinstance(census_block, str) and census_block.isdigit())):
+        return f"Error: Could not find census block for address {street, city, state}. Potentially an invalid address."
     try:
-        # Check if the search record already exists for the user
-        query_exists = """
-        SELECT COUNT(*) FROM searches WHERE user_id = %s AND street = %s AND city = %s AND state = %s
-        """
-        params_exists = (user_id, street, city, state)
-        exists = execute_query(query_exists, params_exists)[0]['COUNT(*)']
-        if not (isinstance(census_block, int) or (isinstance(census_block, str) and census_block.isdigit())):
-            return f"Error: Could not find census block for address {street, city, state}. Potentially an invalid address."
-        meta_data_query = """
-
-        """
+        if user_id is None:
+            with timed("save_search", "read"):
+                result = _lookup_walkability(census_block)
+            return result if result else "No walkability data found for the provided address."
+
+        store = get_walkability_store()
+        with get_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            try:
+                connection.start_transaction()
+                # One round trip: lock the user, probe for the address, allocate the next id and read walkability
+                with timed("save_search", "lock"):
+                    cursor.execute(f"""
+                        SELECT
+                            (SELECT search_id FROM searches
+                             WHERE user_id = u.id AND street = %s AND city = %s AND state = %s LIMIT 1) AS existing_id,
+                            (SELECT COALESCE(MAX(search_id), 0) + 1 FROM searches WHERE user_id = u.id) AS next_id,
+                            w.census_block AS walk_block, {", ".join("w." + column for column in WALKABILITY_COLUMNS)}
+                        FROM users AS u
+                        LEFT JOIN WalkabilityIndex AS w ON w.census_block = %s
+                        WHERE u.id = %s
+                        FOR UPDATE OF u
+                    """, (street, city, state, census_block, user_id))
+                    row = cursor.fetchone()
+                if row is None:
+                    connection.rollback()
+                    print(f"Error saving search: user {user_id} does not exist")
+                    return None
 
-        sql_query = """
-        SELECT intersection_density, transit_access, job_housing_mix, population_employment_density, NatWalkInd FROM WalkabilityIndex WHERE census_block = %s
-        """
-        params = (census_block, )
-        results = execute_query(sql_query, params)
-        if results:
-            # If the search does not exist, save it
-            # Get the census block for the address
-            if not exists and user_id is not None:
-                # Generate a new search ID for the user
-                new_search_id = generate_search_id(user_id)
-                try:
-                    load_dotenv()
-                    host_val = os.getenv("DB_HOST")
-                    user_val = os.getenv("DB_USER")
-                    password_val = os.getenv("DB_PASSWORD")
-                    database_val = os.getenv("DB_NAME")
-                    # Establish connection to the database
-                    connection = mysql.connector.connect(
-                        host=host_val,
-                        user=user_val,
-                        password=password_val,
-                        database=database_val
-                    )
-                    cursor = connection.cursor(dictionary=True)
-                    cursor.callproc('SaveSearch', [user_id, new_search_id, street, city, state, census_block])
-                    # Update metadata
-                    meta_data_query = """
-                    INSERT INTO meta_data (street, city, state, search_count)
-                    VALUES (%s, %s, %s, 1)
-                    ON DUPLICATE KEY UPDATE search_count = search_count + 1
-                    """
-                    meta_data_params = (street, city, state)
-                    cursor.execute(meta_data_query, meta_data_params)
+                result = store.get(census_block) if store is not None else None
+                if result is None and row["walk_block"] is not None:
+                    result = {column: row[column] for column in WALKABILITY_COLUMNS}
+                if not result:
+                    connection.rollback()
+                    return "No walkability data found for the provided address."
+
+                if row["existing_id"] is None:
+                    with timed("save_search", "insert"):
+                        # Plain INSERT: the user row lock rules out id and address collisions, so a duplicate
+                        # key here is a real error and must not quietly rewrite another saved search
+                        cursor.execute("""
+                            INSERT INTO searches (user_id, search_id, street, city, state, census_block)
+                            VALUES (%s, %s, %s, %s, %s, %s)
+                        """, (user_id, row["next_id"], street, city, state, census_block))
+                        inserted = True
+                else:
+                    inserted = False
+                with timed("save_search", "commit"):
                     connection.commit()
-                    cursor.close()
-                    connection.close()
-                except Exception as e:
-                    print(f"Error inserting search user credentials: {str(e)}")
-                    return None
-            return results[0]  # Return the first result as a dictionary
-        else:
-            return "No walkability data found for the provided address."
+                if inserted:
+                    # Update metadata and the city rollup only when a new row was actually inserted; both are written behind
+                    record_search(street, city, state)
+                    add_city_searches([(city, state, result.get(ROLLUP_SCORE_COLUMN))])
+                    invalidate_saved_addresses(user_id)
+            except Error as e:
+                connection.rollback()
+                print(f"Error inserting search: {str(e)}")
+                return None
+            finally:
+                cursor.close()
+        return result
     except Exception as e:
         print(f"Error saving search: {str(e)}")
         return False
 
-def generate_search_id(user_id):
+def _valid_attribute(attribute):
+    # Column names can't be bound as parameters, so only whitelisted columns reach the SQL
+    return attribute if get_reference_data().is_attribute(attribute) else "NatWalkInd"
+
+def invalidate_saved_addresses(user_id):
     """
-    Generates a unique search ID for a specific user.
+    Drops cached saved-address data for a user after their searches change.
 
     Args:
         user_id (int): The ID of the user.
-
-    Returns:
-        int: The next search ID for the user.
     """
-    query = "SELECT MAX(search_id) FROM searches WHERE user_id = %s"
-    params = (user_id,)
-    result = execute_query(query, params)
-
-    if result and result[0]['MAX(search_id)'] is not None:
-        return result[0]['MAX(search_id)'] + 1  # Increment the highest search_id for the user
-    else:
-        return 1  # Start with ID 1 if the user has no searches
+    _saved_count_cache.delete(user_id)
+    _facet_cache.delete(user_id)
 
-def get_distinct_options(user_id, column, dependent_column=None, dependent_value=None):
+def get_facets(user_id, city_filter=None, state_filter=None):
     """
-    Fetch distinct values for a column (e.g., city or state) with optional dependent filtering.
+    Returns the city and state filter options for a user's saved addresses, with counts.
+
+    Both lists come from one grouped query that is cached per user until the user's
+    searches change. States are narrowed by the selected city and cities by the selected state.
 
     Args:
         user_id (int): The ID of the user.
-        column (str): The column to fetch distinct values for (e.g., "city" or "state").
-        dependent_column (str): The column to filter by (e.g., "state" or "city").
-        dependent_value (str): The value to filter the dependent column by.
+        city_filter (str): Optional selected city.
+        state_filter (str): Optional selected state.
 
     Returns:
-        list: A list of distinct values for the specified column.
+        dict: {"states": [{"value": ..., "count": ...}], "cities": [{"value": ..., "count": ...}]}, each sorted by value.
     """
-    query = f"SELECT DISTINCT {column} FROM searches WHERE user_id = %s"
-    params = [user_id]
-
-    if dependent_column and dependent_value:
-        query += f" AND {dependent_column} = %s"
-        params.append(dependent_value)
-
-    query += f" ORDER BY {column}"  # Sort results alphabetically
-
-    # Use execute_query to fetch distinct options
-    results = execute_query(query, params)
+    rows = _facet_cache.get(user_id)
+    if rows is None:
+        query = "SELECT state, city, COUNT(*) AS total FROM searches WHERE user_id = %s GROUP BY state, city"
+        rows = execute_query(query, (user_id,))
+        if rows is None:
+            return {"states": [], "cities": []}
+        rows = [(row["state"], row["city"], row["total"]) for row in rows]
+        _facet_cache.set(user_id, rows)
+
+    states = {}
+    cities = {}
+    for state, city, total in rows:
+        if city_filter is None or city == city_filter:
+            states[state] = states.get(state, 0) + total
+        if state_filter is None or state == state_filter:
+            cities[city] = cities.get(city, 0) + total
+    return {
+        "states": [{"value": value, "count": states[value]} for value in sorted(states)],
+        "cities": [{"value": value, "count": cities[value]} for value in sorted(cities)],
+    }
+
+def _encode_cursor(row):
+    payload = json.dumps([str(row["sort_value"]), row["search_id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+def _decode_cursor(cursor):
+    try:
+        value, search_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return Decimal(value), int(search_id)
+    except (ValueError, TypeError, InvalidOperation):
+        return None
 
-    # Extract values from the dictionaries
-    return [row[column] for row in results]
+def count_saved_addresses(user_id, city_filter=None, state_filter=None):
+    """
+    Counts a user's saved addresses that have walkability data, using a short-lived cache.
 
+    Args:
+        user_id (int): The ID of the user.
+        city_filter (str): Optional city filter.
+        state_filter (str): Optional state filter.
 
-def get_saved_addresses(user_id, attribute, city_filter=None, state_filter=None, sort="DESC"):
+    Returns:
+        int: The number of matching saved addresses.
     """
-    Fetch saved addresses for a user with optional filtering and sorting.
+    counts = _saved_count_cache.get(user_id)
+    if counts is None:
+        counts = {}
+    key = (city_filter, state_filter)
+    if key not in counts:
+        query = """
+            SELECT COUNT(*) AS total
+            FROM searches AS s
+            JOIN WalkabilityIndex AS w ON w.census_block = s.census_block
+            WHERE s.user_id = %s
+        """
+        params = [user_id]
+        if city_filter is not None:
+            query += " AND s.city = %s"
+            params.append(city_filter)
+        if state_filter is not None:
+            query += " AND s.state = %s"
+            params.append(state_filter)
+        rows = execute_query(query, params)
+        if not rows:
+            return 0
+        counts = {**counts, key: rows[0]["total"]}
+        _saved_count_cache.set(user_id, counts)
+    return counts[key]
+
+def get_saved_addresses_page(user_id, attribute, city_filter=None, state_filter=None, sort="DESC", cursor=None, limit=None):
+    """
+    Fetch one page of saved addresses using keyset pagination on the sorted attribute.
+
+    Rows are ordered by (attribute, search_id) so the cursor from the last row of a
+    page identifies exactly where the next page starts, without an OFFSET scan.
 
     Args:
         user_id (int): The ID of the user.
+        attribute (str): The walkability column to return and sort by.
         city_filter (str): Optional city filter.
         state_filter (str): Optional state filter.
-        sort_by (str): Sort by "city" or "state".
+        sort (str): "Low" for ascending, anything else for descending.
+        cursor (str): Opaque cursor returned as next_cursor by the previous page.
+        limit (int): Page size, capped at SAVED_PAGE_SIZE_MAX.
 
     Returns:
-        list: A list of saved addresses.
+        dict: {"addresses": [...], "next_cursor": str or None, "total": int}
     """
-    #query = "SELECT street, city, state, census_block FROM searches WHERE user_id = %s"
+    attribute = _valid_attribute(attribute)
+    limit = max(1, min(int(limit or SAVED_PAGE_SIZE), SAVED_PAGE_SIZE_MAX))
+    direction, comparison = ("ASC", ">") if sort == "Low" else ("DESC", "<")
+    # NULL scores sort as -1 so they still get a stable position in the keyset
+    sort_value = f"COALESCE(w.{attribute}, -1)"
+
     query = f"""
-        SELECT s.user_id, s.street, s.city, s.state, w.{attribute} as value
-        FROM WalkabilityIndex AS w
-        JOIN searches AS s ON s.census_block = w.census_block
+        SELECT s.user_id, s.search_id, s.street, s.city, s.state, w.{attribute} AS value, {sort_value} AS sort_value
+        FROM searches AS s
+        JOIN WalkabilityIndex AS w ON w.census_block = s.census_block
         WHERE s.user_id = %s
-    """    
+    """
     params = [user_id]
     if city_filter is not None:
-        query += " AND city = %s"
+        query += " AND s.city = %s"
         params.append(city_filter)
     if state_filter is not None:
-        query += " AND state = %s"
+        query += " AND s.state = %s"
         params.append(state_filter)
-    if sort == "Low":
-        sort="ASC"
-    else:
-        sort="DESC"
-
-    query += f" ORDER BY w.{attribute} {sort}"
-    # Use execute_query to fetch the addresses
-    quer = execute_query(query, params)
-    return quer
-
-def delete_saved_addresses(user_id, addresses):
+    position = _decode_cursor(cursor) if cursor else None
+    if position is not None:
+        query += f" AND ({sort_value}, s.search_id) {comparison} (%s, %s)"
+        params.extend(position)
+    query += f" ORDER BY sort_value {direction}, s.search_id {direction} LIMIT %s"
+    params.append(limit + 1)  # one extra row tells us whether another page exists
+
+    rows = execute_query(query, params) or []
+    next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    addresses = rows[:limit]
+    for row in addresses:
+        row.pop("sort_value", None)
+    return {
+        "addresses": addresses,
+        "next_cursor": next_cursor,
+        "total": count_saved_addresses(user_id, city_filter, state_filter),
+    }
+
+def delete_saved_addresses(user_id, search_ids):
     """
     Deletes saved addresses for a specific user from the database.
 
+    All selected searches are removed in one transaction with a single multi-row
+    DELETE; the city rollup updates and meta_data delete_count increments are
+    buffered and written behind (counters.py).
+
     Args:
         user_id (int): The ID of the user.
-        addresses (list): A list of addresses to delete.
+        search_ids (list): The search_id values of the saved addresses to delete.
 
     Returns:
-        None
+        list: One dictionary per requested search_id with search_id, street, city, state
+              and deleted (bool), or None if the delete failed.
     """
+    ids = []
+    for search_id in search_ids:
+        try:
+            ids.append(int(search_id))
+        except (TypeError, ValueError):
+            print(f"Ignoring invalid search id: {search_id!r}")
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return []
+
+    placeholders = ", ".join(["%s"] * len(ids))
     try:
-        for address in addresses:
-            street, city, state = address.split(", ")
+        with get_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
             try:
-                load_dotenv()
-                host_val = os.getenv("DB_HOST")
-                user_val = os.getenv("DB_USER")
-                password_val = os.getenv("DB_PASSWORD")
-                database_val = os.getenv("DB_NAME")
-                # Establish connection to the database
-                connection = mysql.connector.connect(
-                    host=host_val,
-                    user=user_val,
-                    password=password_val,
-                    database=database_val
-                )
-                cursor = connection.cursor(dictionary=True)
-                cursor.callproc('DeleteSavedAddress', [user_id, street, city, state])
-                # Update metadata to increment delete_count
-                meta_data_query = """
-                INSERT INTO meta_data (street, city, state, delete_count)
-                VALUES (%s, %s, %s, 1)
-                ON DUPLICATE KEY UPDATE delete_count = delete_count + 1
-                """
-                meta_data_params = (street, city, state)
-                cursor.execute(meta_data_query, meta_data_params)
+                connection.start_transaction()
+                cursor.execute(f"""
+                    SELECT s.search_id, s.street, s.city, s.state, w.{ROLLUP_SCORE_COLUMN} AS score
+                    FROM searches AS s
+                    LEFT JOIN WalkabilityIndex AS w ON w.census_block = s.census_block
+                    WHERE s.user_id = %s AND s.search_id IN ({placeholders})
+                    FOR UPDATE OF s
+                """, [user_id] + ids)
+                found = {row["search_id"]: row for row in cursor.fetchall()}
+                if found:
+                    found_placeholders = ", ".join(["%s"] * len(found))
+                    cursor.execute(f"DELETE FROM searches WHERE user_id = %s AND search_id IN ({found_placeholders})",
+                                   [user_id] + list(found))
                 connection.commit()
+            except Error:
+                connection.rollback()
+                raise
+            finally:
                 cursor.close()
-                connection.close()
-            except Exception as e:
-                print(f"Error inserting search user credentials: {str(e)}")
-                return None
-        print(f"Deleted addresses: {addresses}")
-    except Exception as e:
-        print(f"Error deleting saved addresses: {str(e)}")
\ No newline at end of file
+    except Error as e:
+        print(f"Error deleting saved addresses: {str(e)}")
+        return None
+
+    # Count the deletes in meta_data, one entry per distinct address, and take them out of the city rollups
+    # (both written behind)
+    counts = {}
+    for row in found.values():
+        key = (row["street"], row["city"], row["state"])
+        counts[key] = counts.get(key, 0) + 1
+    record_deletes(counts)
+    remove_city_searches([(row["city"], row["state"], row["score"]) for row in found.values()])
+
+    results = []
+    for search_id in ids:
+        row = found.get(search_id)
+        results.append({
+            "search_id": search_id,
+            "street": row["street"] if row else None,
+            "city": row["city"] if row else None,
+            "state": row["state"] if row else None,
+            "deleted": row is not None,
+        })
+    if found:
+        invalidate_saved_addresses(user_id)
+    print(f"Deleted {len(found)} saved addresses for user {user_id}")
+    return results
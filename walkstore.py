@@ -0,0 +1,218 @@
+import csv
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+
+# Columns of WalkabilityIndex returned for a lookup, in display order
+WALKABILITY_COLUMNS = ["intersection_density", "transit_access", "job_housing_mix", "population_employment_density", "NatWalkInd"]
+
+WALKSTORE_PATH = os.getenv("WALKSTORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "walkability.wkst"))
+WALKSTORE_RELOAD_INTERVAL = float(os.getenv("WALKSTORE_RELOAD_INTERVAL", "30"))  # seconds between version checks
+
+_MAGIC = b"WKST"
+_FORMAT_VERSION = 1
+# magic, format version, dataset version, rows, hash slots, columns, length of the column-name block
+_HEADER = struct.Struct("<4sIqIIII")
+_EMPTY = -1
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+
+
+def _slot(key, mask):
+    # Fibonacci hashing of the numeric census block
+    return ((key * _HASH_MULTIPLIER) & 0xFFFFFFFFFFFFFFFF) >> 32 & mask
+
+
+def build_store(rows, out_path, columns=WALKABILITY_COLUMNS, dataset_version=None):
+    """
+    Writes a memory-mappable columnar copy of WalkabilityIndex.
+
+    The file holds the census blocks as 64-bit integers, one float64 array per
+    column (NaN for NULL) and an open-addressing hash table from census block to
+    row number, so lookups are O(1) straight from the mapped pages.
+
+    Args:
+        rows (iterable): Dictionaries with a census_block key and one key per column.
+        out_path (str): Where to write the store.
+        columns (list): Column names to include.
+        dataset_version (int): Version stamp; defaults to the current Unix time.
+
+    Returns:
+        int: The number of rows written.
+    """
+    keys = array("q")
+    data = [array("d") for _ in columns]
+    for row in rows:
+        block = str(row["census_block"]).strip()
+        if not block.isdigit():
+            continue
+        keys.append(int(block))
+        for values, column in zip(data, columns):
+            value = row.get(column)
+            values.append(float(value) if value not in (None, "") else math.nan)
+
+    n_slots = 1
+    while n_slots < 2 * max(len(keys), 1):
+        n_slots *= 2
+    table = array("i", [_EMPTY]) * n_slots
+    mask = n_slots - 1
+    for i, key in enumerate(keys):
+        slot = _slot(key, mask)
+        while table[slot] != _EMPTY and keys[table[slot]] != key:
+            slot = (slot + 1) & mask
+        table[slot] = i  # a duplicate census block keeps its last row
+
+    names = ",".join(columns).encode("ascii")
+    names += b"\0" * (-len(names) % 8)
+    version = int(time.time()) if dataset_version is None else dataset_version
+    tmp_path = out_path + ".tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, version, len(keys), n_slots, len(columns), len(names)))
+        f.write(b"\0" * (-_HEADER.size % 8))
+        f.write(names)
+        keys.tofile(f)
+        for values in data:
+            values.tofile(f)
+        table.tofile(f)
+    # Atomic replace: workers still mapping the old file keep reading it until they reload
+    os.replace(tmp_path, out_path)
+    return len(keys)
+
+
+class WalkabilityStore:
+    """
+    Read-only, memory-mapped WalkabilityIndex built by build_store().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._stat = os.fstat(f.fileno())
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fmt, self.dataset_version, self.n_rows, n_slots, n_columns, names_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or fmt != _FORMAT_VERSION:
+            raise ValueError(f"{path} is not a walkability store (format {_FORMAT_VERSION}).")
+        offset = _HEADER.size + (-_HEADER.size % 8)
+        self.columns = bytes(self._mm[offset:offset + names_len]).rstrip(b"\0").decode("ascii").split(",")
+        offset += names_len
+        view = memoryview(self._mm)
+        self._keys = view[offset:offset + 8 * self.n_rows].cast("q")
+        offset += 8 * self.n_rows
+        self._data = []
+        for _ in range(n_columns):
+            self._data.append(view[offset:offset + 8 * self.n_rows].cast("d"))
+            offset += 8 * self.n_rows
+        self._table = view[offset:offset + 4 * n_slots].cast("i")
+        self._mask = n_slots - 1
+
+    def _row(self, census_block):
+        try:
+            key = int(census_block)
+        except (TypeError, ValueError):
+            return None
+        slot = _slot(key, self._mask)
+        while True:
+            row = self._table[slot]
+            if row == _EMPTY:
+                return None
+            if self._keys[row] == key:
+                return row
+            slot = (slot + 1) & self._mask
+
+    def get(self, census_block):
+        """
+        Looks up the walkability values for one census block.
+
+        Args:
+            census_block (str): The 12-digit block group GEOID.
+
+        Returns:
+            dict: Column name -> value (None for NULL), or None if the block is not in the store.
+        """
+        row = self._row(census_block)
+        if row is None:
+            return None
+        values = {}
+        for column, data in zip(self.columns, self._data):
+            value = data[row]
+            values[column] = None if math.isnan(value) else value
+        return values
+
+    def is_stale(self):
+        """
+        Returns True if the file on disk has been replaced since this store was opened.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns) != (self._stat.st_ino, self._stat.st_mtime_ns)
+
+    def __len__(self):
+        return self.n_rows
+
+
+_store = None
+_store_checked_at = 0.0
+_store_lock = threading.Lock()
+
+
+def get_walkability_store():
+    """
+    Returns the shared walkability store, or None if no store file is installed.
+
+    The file is re-checked every WALKSTORE_RELOAD_INTERVAL seconds and remapped when
+    it has been replaced by a new dataset version.
+
+    Returns:
+        WalkabilityStore: The memory-mapped store, or None.
+    """
+    global _store, _store_checked_at
+    now = time.monotonic()
+    if now - _store_checked_at < WALKSTORE_RELOAD_INTERVAL:
+        return _store
+    with _store_lock:
+        if now - _store_checked_at < WALKSTORE_RELOAD_INTERVAL:
+            return _store
+        _store_checked_at = now
+        if _store is None or _store.is_stale():
+            if os.path.exists(WALKSTORE_PATH):
+                try:
+                    _store = WalkabilityStore(WALKSTORE_PATH)
+                    print(f"Loaded walkability store version {_store.dataset_version} ({len(_store)} rows)")
+                except (OSError, ValueError) as e:
+                    print(f"Error loading walkability store: {e}")
+            else:
+                _store = None
+    return _store
+
+
+def rows_from_db():
+    """
+    Streams every WalkabilityIndex row as a dictionary, for the builders of the derived files.
+    """
+    from db import get_connection
+    with get_connection() as connection:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(f"SELECT census_block, {', '.join(WALKABILITY_COLUMNS)} FROM WalkabilityIndex")
+        for row in cursor:
+            yield row
+        cursor.close()
+
+
+if __name__ == "__main__":
+    # Usage: python walkstore.py OUT_PATH [walkability_index.csv]
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python walkstore.py OUT_PATH [walkability_index.csv]   (reads the database when no CSV is given)")
+        sys.exit(1)
+    if len(sys.argv) == 3:
+        with open(sys.argv[2], newline="") as f:
+            count = build_store(csv.DictReader(f), sys.argv[1])
+    else:
+        count = build_store(rows_from_db(), sys.argv[1])
+    print(f"Wrote {count} rows to {sys.argv[1]}")
@@ -1,5 +1,9 @@
 from flask import Flask
 from routes import main_bp  # Import blueprint from routes.py
+from api import api_bp
+import metrics
+from refdata import load_reference_data, refresh_reference_data
+from sessions import ServerSessionInterface, create_session_backend
 from dotenv import load_dotenv
 import os
 
@@ -15,10 +19,29 @@ def create_app():
     """
     app = Flask(__name__)  # Initialize the Flask app
     app.register_blueprint(main_bp)  # Register the main blueprint for routes
+    app.register_blueprint(api_bp)  # Versioned JSON API under /api/v1
+    metrics.init_app(app)  # Request timing and the Prometheus /metrics endpoint
     app.secret_key = os.getenv('SECRET_KEY')  # Set the secret key for session management
-    app.config['SESSION_TYPE'] = 'filesystem'  # Use filesystem-based sessions
     app.config['SESSION_PERMANENT'] = True  # Make sessions permanent
-    app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # Set session lifetime to 1 hour
+    app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # Expire sessions after 1 hour of inactivity
+    # Keep session data server-side (SQLite or Redis, see sessions.py); the cookie only holds the session id
+    session_backend = create_session_backend()
+    app.session_interface = ServerSessionInterface(session_backend)
+
+    # Load walkability titles and other reference data once, before serving requests
+    load_reference_data()
+
+    @app.cli.command("refresh-reference-data")
+    def refresh_reference_data_command():
+        """Reload walkability_titles in every worker on this host and print the new reference data version."""
+        reference = refresh_reference_data()
+        print(f"Reference data version {reference.version}: {len(reference.titles)} titles")
+
+    @app.cli.command("purge-sessions")
+    def purge_sessions_command():
+        """Delete expired sessions from the session store."""
+        print(f"Purged {session_backend.purge_expired()} expired sessions")
+
     return app  # Return the configured app instance
 
 # Create the Flask application instance